@@ -6,6 +6,7 @@ from bus_management.models import (
     Vehicle, Route, Schedule, Seat, SeatAvailability, 
     Ticket, SpecialReservation, Customer
 )
+from bus_management.stops import matching_stops
 from notifications.models import Notification
 import datetime
 import logging
@@ -236,14 +237,16 @@ def tickets_data(request):
         
         # Apply search filter if provided
         if search_query:
+            # Places are matched on stop names and aliases, then joined on the stop ids
+            stops = matching_stops(search_query)
             tickets_query = tickets_query.filter(
                 Q(customer__username__icontains=search_query) |
                 Q(customer__email__icontains=search_query) |
                 Q(customer__first_name__icontains=search_query) |
                 Q(customer__last_name__icontains=search_query) |
                 Q(schedule__vehicle__name__icontains=search_query) |
-                Q(schedule__route__source__icontains=search_query) |
-                Q(schedule__route__destination__icontains=search_query)
+                Q(schedule__route__origin_stop__in=stops) |
+                Q(schedule__route__destination_stop__in=stops)
             )
         
         # Apply date filters if provided
@@ -0,0 +1,19 @@
+"""
+Celery application for BusManagement.
+
+Periodic jobs are declared in CELERY_BEAT_SCHEDULE (settings.py) and run with:
+
+    celery -A BusManagement worker --beat
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BusManagement.settings')
+
+app = Celery('BusManagement')
+
+# Read every CELERY_* setting from the Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+app.autodiscover_tasks()
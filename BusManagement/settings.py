@@ -161,6 +161,9 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Largest page_size accepted by the keyset paginated listings (see bus_management/pagination.py)
+KEYSET_MAX_PAGE_SIZE = 100
+
 # JWT settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -223,6 +226,131 @@ else:
         },
     }
 
+# The change logs of the in-memory indexes (bus_management/changelog.py) and the seat map
+# snapshots are kept in this cache. Every web process and the Celery worker must share it,
+# so Redis is required as soon as more than one process runs: the local memory fallback
+# only suits a single development server
+if is_redis_available():
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Seat inventory settings
+# 'rows' keeps one SeatAvailability row per seat, 'sparse' only keeps rows for seats
+# that are not AVAILABLE, 'bitmap' packs every seat state of a schedule into a single
+# SeatInventory row (see bus_management/inventory.py)
+SEAT_INVENTORY_BACKEND = 'rows'
+
+# How the rows backend claims a seat: 'locking' takes a SELECT ... FOR UPDATE row lock,
+# 'conditional' uses a single UPDATE ... WHERE status='AVAILABLE' and checks the row count
+BOOKING_STRATEGY = 'locking'
+
+# Maximum number of seats that can be booked in a single group booking
+MAX_SEATS_PER_BOOKING = 10
+
+# Seat holds (see bus_management/holds.py)
+# How long a RESERVED ticket keeps its seat before it is released
+SEAT_HOLD_TTL_SECONDS = 15 * 60
+# 'memory' keeps the expiry index in the web process, 'redis' shares it between processes
+SEAT_HOLD_BACKEND = 'memory'
+SEAT_HOLD_REDIS_URL = 'redis://127.0.0.1:6379/0'
+# Maximum number of expired holds released per sweep
+SEAT_HOLD_SWEEP_BATCH_SIZE = 500
+# Seconds between two sweeps run by Celery beat
+SEAT_HOLD_SWEEP_INTERVAL_SECONDS = 30
+
+# RESERVED tickets are confirmed this long before departure (see bus_management/confirmations.py)
+AUTO_CONFIRM_WINDOW_SECONDS = 30 * 60
+
+# Journey lifecycle (see bus_management/lifecycle.py)
+# Transitions falling in the same bucket are handled in one run
+LIFECYCLE_BUCKET_SECONDS = 60
+LIFECYCLE_MAX_SLEEP_SECONDS = 5 * 60
+# Maximum number of schedules moved per UPDATE
+LIFECYCLE_BATCH_SIZE = 500
+
+# Vehicle occupancy (see bus_management/occupancy.py)
+# Most time windows checked by one /api/vehicles/check-availability/ request
+AVAILABILITY_CHECK_MAX_WINDOWS = 200
+# Fleet timeline (see bus_management/timeline.py): longest window and finest bitmap granularity
+TIMELINE_MAX_DAYS = 31
+TIMELINE_MIN_GRANULARITY_MINUTES = 5
+
+# Timetables (see bus_management/timetables.py)
+# How many days ahead schedules are created from timetable templates
+TIMETABLE_HORIZON_DAYS = 28
+# Schedules inserted per transaction
+TIMETABLE_BATCH_SIZE = 500
+
+# Vehicle auto-assignment for special reservations (see bus_management/assignment.py)
+# Free time around a trip considered when ranking vehicles by fragmentation
+VEHICLE_ASSIGNMENT_HORIZON_HOURS = 24
+# Ranked alternatives returned with an assigned reservation
+VEHICLE_ASSIGNMENT_ALTERNATIVES = 3
+
+# Most trips returned by /api/schedules/search/ (see bus_management/tripsearch.py)
+TRIP_SEARCH_MAX_RESULTS = 100
+# Committed trip search changes remembered for in-memory copies of the index
+TRIP_SEARCH_CHANGE_LOG_SIZE = 1000
+TRIP_SEARCH_CHANGE_LOG_TIMEOUT = 60 * 60
+
+# Connection search across routes (see bus_management/connections.py)
+# Shortest time between arriving on one leg and leaving on the next
+CONNECTION_MIN_TRANSFER_MINUTES = 15
+# Most legs in an itinerary, and most itineraries returned
+CONNECTION_MAX_LEGS = 3
+CONNECTION_MAX_ITINERARIES = 10
+# Seconds before the in-memory index is rebuilt from the database, catching changes missed by the cache
+CONNECTION_INDEX_REFRESH_SECONDS = 5 * 60
+
+# Place autocomplete (see bus_management/autocomplete.py)
+# Most suggestions returned by /api/stops/autocomplete/
+PLACE_AUTOCOMPLETE_MAX_RESULTS = 20
+# Seconds before the in-memory index is rebuilt to pick up new popularity counts
+PLACE_AUTOCOMPLETE_REFRESH_SECONDS = 60 * 60
+# Committed stop changes remembered for the in-memory index
+PLACE_AUTOCOMPLETE_CHANGE_LOG_SIZE = 1000
+PLACE_AUTOCOMPLETE_CHANGE_LOG_TIMEOUT = 60 * 60
+
+# Celery, used for periodic jobs (see BusManagement/celery.py)
+CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'advance-journey-lifecycle': {
+        'task': 'bus_management.tasks.advance_journey_lifecycle',
+        'schedule': LIFECYCLE_BUCKET_SECONDS,
+    },
+    'confirm-reserved-tickets': {
+        'task': 'bus_management.tasks.confirm_reserved_tickets',
+        'schedule': 60,
+    },
+    'sweep-seat-holds': {
+        'task': 'bus_management.tasks.sweep_seat_holds',
+        'schedule': SEAT_HOLD_SWEEP_INTERVAL_SECONDS,
+    },
+    'materialise-timetable-schedules': {
+        'task': 'bus_management.tasks.materialise_timetable_schedules',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Seat map snapshots (see bus_management/seatmaps.py)
+# How long a snapshot and its change log stay cached, and how many changes are kept for deltas
+SEAT_MAP_CACHE_TIMEOUT = 300
+SEAT_MAP_CHANGE_LOG_SIZE = 100
+
+# How long the response to a request sent with an Idempotency-Key is kept for retries
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+
 # Jazzmin settings
 JAZZMIN_SETTINGS = {
     # title of the window (Will default to current_admin_site.site_title if absent or None)
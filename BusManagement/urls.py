@@ -25,6 +25,7 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from . import api
 from bus_management.models import SpecialReservation, Ticket
+from bus_management.stops import matching_stops
 from django.utils import timezone
 from datetime import timedelta
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -87,17 +88,12 @@ def ticket_list_view(request):
         if hasattr(SpecialReservation, 'customer_name'):
             filter_conditions |= Q(customer_name__icontains=search_query)
             
-        # Check if source field exists in the model
-        if hasattr(SpecialReservation, 'source'):
-            filter_conditions |= Q(source__icontains=search_query)
-        elif hasattr(SpecialReservation, 'source_location'):
-            filter_conditions |= Q(source_location__icontains=search_query)
-            
-        # Check if destination field exists in the model
-        if hasattr(SpecialReservation, 'destination'):
-            filter_conditions |= Q(destination__icontains=search_query)
-        elif hasattr(SpecialReservation, 'destination_location'):
-            filter_conditions |= Q(destination_location__icontains=search_query)
+        # Places are matched on stop names and aliases, then joined on the stop ids;
+        # places that are not a known stop are only in the text
+        stops = matching_stops(search_query)
+        filter_conditions |= Q(source_stop__in=stops) | Q(destination_stop__in=stops)
+        filter_conditions |= Q(source_stop__isnull=True, source__icontains=search_query)
+        filter_conditions |= Q(destination_stop__isnull=True, destination__icontains=search_query)
             
         reservations = reservations.filter(filter_conditions)
     
@@ -1,13 +1,21 @@
 from django.contrib import admin
 from .models import (
     Vehicle, Route, Schedule, Seat, Customer, Offer,
-    Ticket, SpecialReservation, SeatAvailability, VehicleType, VehicleSubtype, Dashboard
+    Ticket, SpecialReservation, SeatAvailability, VehicleType, VehicleSubtype, Dashboard,
+    TimetableTemplate, WaitlistEntry, Stop, StopAlias
 )
 from .utils import create_vehicle_with_seats, initialize_seat_availability
+from .inventory import record_status_changes
+from .cancellations import cancel_schedules
+from .booking import BookingService
+from .occupancy import is_overlap_error
+from .timetables import materialise_timetables
+from .stops import matching_stops
 from django.contrib import messages
 from django.utils.html import format_html
 from .forms import TicketAdminForm, SpecialReservationAdminForm  # Import the SpecialReservationAdminForm
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 
 
 @admin.register(VehicleType)
@@ -116,10 +124,40 @@ class VehicleAdmin(admin.ModelAdmin):
             else:
                 messages.success(request, f'Updated seating configuration for vehicle {obj.name}. Now has {expected_capacity} seats.')
 
+class StopSearchMixin:
+    """
+    Match the search term against stop names and aliases through the stop foreign
+    keys in ``stop_search_fields``, instead of icontains on the place names.
+    """
+    stop_search_fields = ()
+    
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip():
+            stops = matching_stops(search_term)
+            condition = Q()
+            for field in self.stop_search_fields:
+                condition |= Q(**{f'{field}__in': stops})
+            results |= queryset.filter(condition)
+        return results, may_have_duplicates
+
+class StopAliasInline(admin.TabularInline):
+    model = StopAlias
+    extra = 1
+    fields = ('name',)
+
+@admin.register(Stop)
+class StopAdmin(admin.ModelAdmin):
+    list_display = ('name', 'latitude', 'longitude')
+    search_fields = ('name', 'aliases__name')
+    inlines = [StopAliasInline]
+
 @admin.register(Route)
-class RouteAdmin(admin.ModelAdmin):
+class RouteAdmin(StopSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'source', 'destination', 'distance_km', 'estimated_duration_minutes')
-    search_fields = ('name', 'source', 'destination')
+    search_fields = ('name',)
+    stop_search_fields = ('origin_stop', 'destination_stop')
+    readonly_fields = ('origin_stop', 'destination_stop')
     
     
 
@@ -132,26 +170,69 @@ class SeatAvailabilityInline(admin.TabularInline):
     can_delete = False
     max_num = 0  # Don't allow adding new availability records manually
 
+@admin.register(TimetableTemplate)
+class TimetableTemplateAdmin(StopSearchMixin, admin.ModelAdmin):
+    list_display = ('__str__', 'route', 'vehicle', 'departure_time', 'days_of_week', 'valid_from', 'valid_until', 'is_active')
+    list_filter = ('is_active', 'route')
+    search_fields = ('name', 'vehicle__name', 'route__name')
+    stop_search_fields = ('route__origin_stop', 'route__destination_stop')
+    actions = ['materialise_selected_timetables']
+    
+    @admin.action(description="Create the upcoming schedules of selected timetables")
+    def materialise_selected_timetables(self, request, queryset):
+        """Materialise the selected templates over the usual horizon, existing departures are kept"""
+        result = materialise_timetables(templates=queryset)
+        messages.success(
+            request,
+            f"Created {result['created']} schedules, {result['existing']} already existed, "
+            f"{result['conflicts']} skipped because the vehicle is taken"
+        )
+
+
 @admin.register(Schedule)
-class ScheduleAdmin(admin.ModelAdmin):
+class ScheduleAdmin(StopSearchMixin, admin.ModelAdmin):
     list_display = ('vehicle', 'route', 'departure_time', 'arrival_time', 'status', 'base_price', 'available_seats')
-    list_filter = ('status', 'vehicle__status')
-    search_fields = ('vehicle__name', 'route__name', 'route__source', 'route__destination')
+    list_filter = ('status', 'vehicle__status', 'timetable')
+    search_fields = ('vehicle__name', 'route__name')
+    stop_search_fields = ('route__origin_stop', 'route__destination_stop')
     date_hierarchy = 'departure_time'
     inlines = [SeatAvailabilityInline]
+    actions = ['cancel_selected_schedules']
     
     # Use the correct JavaScript file for Schedule admin
     class Media:
         js = ('/static/vehicle_management/js/schedule_admin.js',)
     
     def available_seats(self, obj):
-        """Display count of available seats"""
-        count = SeatAvailability.objects.filter(schedule=obj, status='AVAILABLE').count()
-        total = SeatAvailability.objects.filter(schedule=obj).count()
-        return f"{count}/{total} available"
+        """Display count of available seats from the schedule's own counters"""
+        return f"{obj.available_count} available, {obj.booked_count} booked"
     
     available_seats.short_description = "Available Seats"
     
+    @admin.action(description="Cancel selected schedules and their tickets")
+    def cancel_selected_schedules(self, request, queryset):
+        """Cancel the selected schedules with set-based updates instead of saving every ticket"""
+        result = cancel_schedules(list(queryset.values_list('pk', flat=True)))
+        messages.success(
+            request,
+            f"Cancelled {result['schedules']} schedules and {result['tickets']} tickets, "
+            f"Rs. {result['refunded']} to refund"
+        )
+    
+    def save_formset(self, request, form, formset, change):
+        """Keep the schedule seat counters in step with seat statuses edited inline"""
+        if formset.model is not SeatAvailability:
+            return super().save_formset(request, form, formset, change)
+        
+        with transaction.atomic():
+            old_statuses = dict(
+                SeatAvailability.objects.filter(schedule=form.instance).values_list('pk', 'status')
+            )
+            super().save_formset(request, form, formset, change)
+            record_status_changes(form.instance.pk, [
+                (obj.seat_id, old_statuses.get(obj.pk), obj.status) for obj, changed_fields in formset.changed_objects
+            ])
+    
     def get_readonly_fields(self, request, obj=None):
         """Make vehicle field readonly after creation if vehicle is specially reserved"""
         if obj and obj.vehicle.status == 'RESERVED':
@@ -164,7 +245,8 @@ class ScheduleAdmin(admin.ModelAdmin):
         if obj.vehicle:
             is_available, conflict, conflict_type = obj.vehicle.is_available(
                 obj.departure_time, obj.arrival_time,
-                # No need to exclude this schedule since it's not saved yet
+                # An edited schedule must not conflict with itself
+                exclude_schedule_id=obj.pk if change else None
             )
             
             if not is_available and conflict_type == 'special_reservation':
@@ -176,16 +258,37 @@ class ScheduleAdmin(admin.ModelAdmin):
                     f"Cannot save schedule: Vehicle {obj.vehicle.name} is already reserved for a special trip: {conflict_detail}"
                 )
                 return  # Don't save the schedule
+            
+            if not is_available and conflict_type == 'schedule':
+                conflict_detail = (f"{conflict.route.source} to {conflict.route.destination}, "
+                                  f"{conflict.departure_time.strftime('%Y-%m-%d %H:%M')} to "
+                                  f"{conflict.arrival_time.strftime('%Y-%m-%d %H:%M')}")
+                messages.error(
+                    request,
+                    f"Cannot save schedule: Vehicle {obj.vehicle.name} is already scheduled for a regular route: {conflict_detail}"
+                )
+                return  # Don't save the schedule
         
-        # Save the schedule object first
-        super().save_model(request, obj, form, change)
+        # Save the schedule object first, the database refuses it if another
+        # trip took the vehicle since the check above
+        try:
+            with transaction.atomic():
+                super().save_model(request, obj, form, change)
+        except IntegrityError as e:
+            if not is_overlap_error(e):
+                raise
+            messages.error(
+                request,
+                f"Cannot save schedule: Vehicle {obj.vehicle.name} is already in use during this time"
+            )
+            return
         
         # Initialize seat availability if this is a new schedule or the vehicle was changed
         if not change or 'vehicle' in form.changed_data:
             seats_count = initialize_seat_availability(obj)
             
             if not change:
-                messages.success(request, f'Created {seats_count} seat availability records for this schedule')
+                messages.success(request, f'Tracking seat availability for {seats_count} seats on this schedule')
             else:
                 messages.success(request, f'Updated seat availability. Now tracking {seats_count} seats for this schedule')
 
@@ -232,23 +335,30 @@ class OfferAdmin(admin.ModelAdmin):
   
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
+class TicketAdmin(StopSearchMixin, admin.ModelAdmin):
     list_display = ('customer', 'schedule', 'seat', 'status', 'final_price', 'booking_time')
     list_filter = ('status',)
-    search_fields = ('customer__username', 'customer__email', 'schedule__vehicle__name', 'schedule__route__source', 'schedule__route__destination')
+    search_fields = ('customer__username', 'customer__email', 'schedule__vehicle__name')
+    stop_search_fields = ('schedule__route__origin_stop', 'schedule__route__destination_stop')
     date_hierarchy = 'booking_time'
     form = TicketAdminForm  # Reference the imported form class (not as a string)
     
     # Add ticket_admin.js for auto calculations
     class Media:
         js = ('/static/vehicle_management/js/ticket_admin.js',)
+    
+    def save_model(self, request, obj, form, change):
+        """Save through the booking service so the seat follows the ticket status"""
+        BookingService().save_ticket(obj)
 
 @admin.register(SpecialReservation)
-class SpecialReservationAdmin(admin.ModelAdmin):
+class SpecialReservationAdmin(StopSearchMixin, admin.ModelAdmin):
     form = SpecialReservationAdminForm
     list_display = ('customer', 'vehicle', 'source', 'destination', 'departure_time', 'duration_days', 'status', 'final_price', 'is_fully_paid')
     list_filter = ('status', 'is_round_trip', 'duration_days', 'is_fully_paid')
-    search_fields = ('customer__username', 'customer__email', 'source', 'destination', 'vehicle__name')
+    # Places that are not a known stop are only in the text
+    search_fields = ('customer__username', 'customer__email', 'vehicle__name', 'source', 'destination')
+    stop_search_fields = ('source_stop', 'destination_stop')
     date_hierarchy = 'departure_time'
     
     fieldsets = (
@@ -348,7 +458,10 @@ class SpecialReservationAdmin(admin.ModelAdmin):
                 # Save the reservation
                 super().save_model(request, obj, form, change)
         except Exception as e:
-            messages.error(request, f"Error saving reservation: {str(e)}")
+            if is_overlap_error(e):
+                messages.error(request, "Cannot save reservation: Vehicle is already in use during this time")
+            else:
+                messages.error(request, f"Error saving reservation: {str(e)}")
             # If there's an error, revert to the previous status
             if old_status:
                 obj.status = old_status
@@ -359,6 +472,25 @@ class SeatAvailabilityAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     search_fields = ('schedule__vehicle__name', 'seat__row_number', 'seat__seat_group')
     
+    def save_model(self, request, obj, form, change):
+        """Keep the schedule seat counters in step with the edited seat status"""
+        with transaction.atomic():
+            old_status = SeatAvailability.objects.filter(pk=obj.pk).values_list('status', flat=True).first()
+            super().save_model(request, obj, form, change)
+            record_status_changes(obj.schedule_id, [(obj.seat_id, old_status, obj.status)])
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            record_status_changes(obj.schedule_id, [(obj.seat_id, obj.status, None)])
+    
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'schedule', 'priority', 'status', 'created_at', 'promoted_at')
+    list_filter = ('status',)
+    search_fields = ('customer__username', 'customer__email', 'schedule__vehicle__name')
+    readonly_fields = ('ticket', 'promoted_at')
+    
 @admin.register(Dashboard)
 class DashboardAdmin(admin.ModelAdmin):
     """
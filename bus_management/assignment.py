@@ -0,0 +1,77 @@
+"""
+Vehicle auto-assignment for special reservations.
+
+Instead of naming a vehicle, a customer can give the passenger count, the
+trip window and a preferred vehicle subtype. ``rank_vehicles`` reads every
+free vehicle that seats the group with one query: the fleet search of the
+occupancy index, annotated with the end of the trip just before the window
+and the start of the trip just after it. The candidates are then ranked in
+memory:
+
+1. vehicles of the preferred subtype first;
+2. the smallest sufficient capacity, so large vehicles stay free for large
+   groups;
+3. the least fragmentation: the free time left on each side of the trip,
+   capped to ``VEHICLE_ASSIGNMENT_HORIZON_HOURS``. A trip fitted between two
+   others leaves the least unusable gaps, an idle vehicle is kept whole.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from .models import VehicleOccupancy
+from .occupancy import available_vehicles
+
+
+def _horizon():
+    return timedelta(hours=getattr(settings, 'VEHICLE_ASSIGNMENT_HORIZON_HOURS', 24))
+
+
+def rank_vehicles(start_time, end_time, passenger_count, vehicle_subtype=None):
+    """
+    Free vehicles seating ``passenger_count`` during [start_time, end_time),
+    best first. Each vehicle is annotated with ``seat_capacity`` and
+    ``fragmentation``, the free time in minutes left around the trip.
+    """
+    horizon = _horizon()
+    occupancies = VehicleOccupancy.objects.filter(vehicle=OuterRef('pk'))
+    vehicles = available_vehicles(start_time, end_time, min_capacity=passenger_count).annotate(
+        previous_end=Subquery(
+            occupancies.filter(end_time__lte=start_time, end_time__gt=start_time - horizon)
+            .order_by('-end_time').values('end_time')[:1]
+        ),
+        next_start=Subquery(
+            occupancies.filter(start_time__gte=end_time, start_time__lt=end_time + horizon)
+            .order_by('start_time').values('start_time')[:1]
+        )
+    ).select_related('vehicle_subtype')
+
+    ranked = []
+    for vehicle in vehicles:
+        before = start_time - vehicle.previous_end if vehicle.previous_end else horizon
+        after = vehicle.next_start - end_time if vehicle.next_start else horizon
+        vehicle.fragmentation = int((before + after).total_seconds() // 60)
+        ranked.append(vehicle)
+
+    preferred_id = str(getattr(vehicle_subtype, 'pk', vehicle_subtype)) if vehicle_subtype else None
+    ranked.sort(key=lambda vehicle: (
+        preferred_id is not None and str(vehicle.vehicle_subtype_id) != preferred_id,
+        vehicle.seat_capacity,
+        vehicle.fragmentation,
+        vehicle.name,
+    ))
+    return ranked
+
+
+def describe(vehicle):
+    """Summary of a ranked vehicle for API responses"""
+    return {
+        'vehicle_id': str(vehicle.pk),
+        'name': vehicle.name,
+        'registration_number': vehicle.registration_number,
+        'vehicle_subtype': str(vehicle.vehicle_subtype_id),
+        'vehicle_subtype_name': vehicle.vehicle_subtype.name,
+        'capacity': vehicle.seat_capacity,
+        'fragmentation_minutes': vehicle.fragmentation,
+    }
@@ -0,0 +1,175 @@
+"""
+Place autocomplete.
+
+Suggestions for a partly typed place name are answered from memory. Each
+process holds one sorted list of search keys: the normalised name of every
+stop and alias, plus its tail from each later word ("lakeside" finds
+"Pokhara Lakeside"). The keys starting with the typed prefix are found with
+bisect and form one contiguous slice of that list; their stops are ranked by
+popularity, the number of tickets and special reservations starting or ending
+there.
+
+The index is loaded on the first request of the process. Before each lookup it
+compares its version with the stop change log in the cache (see
+bus_management/changelog.py) and reloads only the stops that changed, so a
+lookup with an up-to-date index runs no query. Changes made by other processes
+are only seen this way when all of them share the cache (Redis, see ``CACHES``
+in BusManagement/settings.py); with a per-process cache they wait for the
+periodic rebuild. Popularity moves with every
+booking, it is refreshed by rebuilding the index every
+``PLACE_AUTOCOMPLETE_REFRESH_SECONDS``.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import SpecialReservation, Stop, StopAlias, Ticket
+from .stops import CHANGES, normalise_place, prefix_range
+
+
+def _refresh_seconds():
+    return getattr(settings, 'PLACE_AUTOCOMPLETE_REFRESH_SECONDS', 60 * 60)
+
+
+def search_keys(name):
+    """The normalised name and its tail from each later word"""
+    words = normalise_place(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def load_places(stop_ids=None):
+    """
+    Read stops with their aliases and popularity, all of them or only
+    ``stop_ids``. Returns {stop_id: (name, popularity, [(key, alias or None)])}.
+    """
+    stops = Stop.objects.all()
+    aliases = StopAlias.objects.all()
+    tickets = Ticket.objects.exclude(status='CANCELLED')
+    reservations = SpecialReservation.objects.exclude(status__in=['REJECTED', 'CANCELLED'])
+    if stop_ids is not None:
+        stops = stops.filter(pk__in=stop_ids)
+        aliases = aliases.filter(stop_id__in=stop_ids)
+
+    popularity = {}
+    for queryset, field in (
+        (tickets, 'schedule__route__origin_stop'),
+        (tickets, 'schedule__route__destination_stop'),
+        (reservations, 'source_stop'),
+        (reservations, 'destination_stop'),
+    ):
+        if stop_ids is not None:
+            queryset = queryset.filter(**{f'{field}__in': stop_ids})
+        for stop_id, count in queryset.filter(**{f'{field}__isnull': False}).order_by().values_list(
+            field
+        ).annotate(count=Count('pk')):
+            popularity[str(stop_id)] = popularity.get(str(stop_id), 0) + count
+
+    places = {}
+    for stop_id, name in stops.values_list('pk', 'name'):
+        stop_id = str(stop_id)
+        places[stop_id] = (name, popularity.get(stop_id, 0), [(key, None) for key in search_keys(name)])
+    for stop_id, alias in aliases.values_list('stop_id', 'name'):
+        place = places.get(str(stop_id))
+        if place:
+            place[2].extend((key, alias) for key in search_keys(alias))
+    return places
+
+
+class PlaceIndex:
+    """
+    Search keys sorted in one list, with a parallel list of (stop id, alias).
+    Updates build new lists and swap them in, a lookup keeps the ones it started with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.loaded_at = None
+        self.keys = []
+        self.entries = []
+        self.stops = {}
+
+    def refresh(self):
+        """Bring the index up to date with the stops"""
+        version = CHANGES.version()
+        expired = self.loaded_at is None or time.monotonic() - self.loaded_at > _refresh_seconds()
+        if version == self.version and not expired:
+            return
+
+        with self._lock:
+            expired = self.loaded_at is None or time.monotonic() - self.loaded_at > _refresh_seconds()
+            if version == self.version and not expired:
+                return
+            changed = None if expired else CHANGES.changes_between(self.version, version)
+            if changed is None:
+                self._rebuild(version)
+            else:
+                self._update(version, changed)
+
+    def _rebuild(self, version):
+        places = load_places()
+        rows = sorted(
+            (key, stop_id, alias)
+            for stop_id, (_, _, keys) in places.items()
+            for key, alias in keys
+        )
+        self.stops = {stop_id: (name, popularity) for stop_id, (name, popularity, _) in places.items()}
+        self.keys = [key for key, _, _ in rows]
+        self.entries = [(stop_id, alias) for _, stop_id, alias in rows]
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def _update(self, version, stop_ids):
+        places = load_places(stop_ids)
+        keys, entries = [], []
+        for key, entry in zip(self.keys, self.entries):
+            if entry[0] not in stop_ids:
+                keys.append(key)
+                entries.append(entry)
+        for stop_id, (_, _, place_keys) in places.items():
+            for key, alias in place_keys:
+                position = bisect_right(keys, key)
+                keys.insert(position, key)
+                entries.insert(position, (stop_id, alias))
+
+        stops = {stop_id: place for stop_id, place in self.stops.items() if stop_id not in stop_ids}
+        stops.update({stop_id: (name, popularity) for stop_id, (name, popularity, _) in places.items()})
+        self.keys, self.entries, self.stops = keys, entries, stops
+        self.version = version
+
+    def suggest(self, text, limit=10):
+        """Stops with a name or alias word starting with ``text``, most popular first"""
+        self.refresh()
+        keys, entries, stops = self.keys, self.entries, self.stops
+        prefix = normalise_place(text)
+        if not prefix:
+            return []
+
+        lower, upper = prefix_range(prefix)
+        matches = {}
+        for stop_id, alias in entries[bisect_left(keys, lower):bisect_left(keys, upper)]:
+            # A match on the name wins over one on an alias
+            if stop_id not in matches or alias is None:
+                matches[stop_id] = alias
+
+        ranked = sorted(matches, key=lambda stop_id: (-stops[stop_id][1], stops[stop_id][0]))
+        return [
+            {
+                'id': stop_id,
+                'name': stops[stop_id][0],
+                'alias': matches[stop_id],
+                'popularity': stops[stop_id][1],
+            }
+            for stop_id in ranked[:limit]
+        ]
+
+
+_index = PlaceIndex()
+
+
+def get_place_index():
+    """The place index of this process"""
+    return _index
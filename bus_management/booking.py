@@ -0,0 +1,295 @@
+"""
+Booking service.
+
+Every ticket and seat state change made by the application goes through
+``BookingService``: the REST views, the seat WebSocket consumer, the ticket
+admin and the management commands. A change writes the ticket row and the
+seat state once, inside the caller's transaction, and everything that leaves
+the database (channel broadcasts, seat hold tracking) is deferred with
+``transaction.on_commit`` so a booking that rolls back is never announced.
+
+Tickets saved directly on the model are still kept in step by the
+``update_seat_availability_on_ticket_change`` signal, which calls
+``BookingService.sync_ticket_seat``. Tickets written by the service are marked
+so the signal skips them instead of touching their seat a second time.
+"""
+from decimal import Decimal, ROUND_DOWN
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .holds import get_hold_engine
+from .inventory import get_booking_strategy, get_seat_inventory
+from .models import Offer, Schedule, SeatAvailability, SeatInventory, Ticket
+from .utils import broadcast_seat_status_batch, broadcast_seat_status_update, calculate_offer_discount
+
+
+# Seat status matching each ticket status
+TICKET_SEAT_STATUS = {
+    'RESERVED': 'RESERVED',
+    'CONFIRMED': 'BOOKED',
+    'CANCELLED': 'AVAILABLE',
+    'COMPLETED': 'AVAILABLE',
+}
+
+ACTIVE_TICKET_STATUSES = ('RESERVED', 'CONFIRMED')
+
+# Set on tickets whose seat was already updated, tells the post_save signal to leave them alone
+SEAT_SYNCED_FLAG = '_seat_synced'
+
+
+class BookingError(Exception):
+    """Raised when a booking or ticket change is refused, carries the message for the client"""
+
+    def __init__(self, message, unavailable_seats=None):
+        super().__init__(message)
+        self.message = message
+        self.unavailable_seats = unavailable_seats
+
+
+def save_synced_ticket(ticket, **kwargs):
+    """Save a ticket whose seat state was already written by the caller"""
+    setattr(ticket, SEAT_SYNCED_FLAG, True)
+    ticket.save(**kwargs)
+    return ticket
+
+
+def broadcast_seats_on_commit(schedule_id, seat_ids, status):
+    """Broadcast seat changes once the current transaction commits, one message for several seats"""
+    seat_ids = [str(seat_id) for seat_id in seat_ids]
+    if not seat_ids:
+        return
+    if len(seat_ids) == 1:
+        transaction.on_commit(lambda: broadcast_seat_status_update(str(schedule_id), seat_ids[0], status))
+    else:
+        transaction.on_commit(lambda: broadcast_seat_status_batch(str(schedule_id), seat_ids, status))
+
+
+class BookingService:
+    """Owns ticket and seat state transitions"""
+
+    def __init__(self, inventory=None, hold_engine=None):
+        self.inventory = inventory or get_seat_inventory()
+        self._hold_engine = hold_engine
+
+    @property
+    def hold_engine(self):
+        if self._hold_engine is None:
+            self._hold_engine = get_hold_engine()
+        return self._hold_engine
+
+    def release_expired_holds(self):
+        """Release expired seat holds so their seats can be booked again"""
+        if self.hold_engine.is_due():
+            self.hold_engine.sweep_expired()
+
+    def reserve_seat(self, customer, schedule_id, seat_id, offer_id=None):
+        """Reserve one seat for a customer, returns the RESERVED ticket"""
+        self.release_expired_holds()
+
+        # The conditional strategy skips this check, its claim alone decides the winner
+        if get_booking_strategy() != 'conditional' and Ticket.objects.filter(
+            schedule_id=schedule_id,
+            seat_id=seat_id,
+            status__in=ACTIVE_TICKET_STATUSES
+        ).exists():
+            raise BookingError("This seat is already booked")
+
+        with transaction.atomic():
+            try:
+                if not self.inventory.claim(schedule_id, seat_id):
+                    raise BookingError("This seat is not available")
+            except (SeatAvailability.DoesNotExist, SeatInventory.DoesNotExist):
+                raise BookingError("Seat availability record not found")
+
+            schedule = Schedule.objects.get(id=schedule_id)
+            offer, discount_amount = self._apply_offer(offer_id, schedule.base_price)
+
+            # The seat is already marked RESERVED by the claim
+            ticket = save_synced_ticket(Ticket(
+                customer=customer,
+                schedule=schedule,
+                seat_id=seat_id,
+                base_price=schedule.base_price,
+                discount_amount=discount_amount,
+                final_price=schedule.base_price - discount_amount,
+                offer=offer,
+                status='RESERVED',
+                hold_expires_at=self.hold_engine.expires_at()
+            ))
+
+            self._track_holds([ticket])
+            broadcast_seats_on_commit(schedule_id, [seat_id], 'RESERVED')
+
+        return ticket
+
+    def reserve_seats(self, customer, schedule_id, seat_ids, offer_id=None):
+        """
+        Reserve several seats on one schedule, all or nothing. The coupon is
+        applied once to the whole booking and spread over the tickets.
+
+        Returns (tickets, total_price, discount_amount).
+        """
+        seat_ids = [str(seat_id) for seat_id in seat_ids]
+        if len(set(seat_ids)) != len(seat_ids):
+            raise BookingError("Each seat can only be requested once")
+
+        max_seats = getattr(settings, 'MAX_SEATS_PER_BOOKING', 10)
+        if len(seat_ids) > max_seats:
+            raise BookingError(f"A maximum of {max_seats} seats can be booked at once")
+
+        self.release_expired_holds()
+
+        with transaction.atomic():
+            # Claim every requested seat in one go
+            unavailable = self.inventory.claim_many(schedule_id, seat_ids)
+            if unavailable:
+                raise BookingError("Some of the requested seats are not available", unavailable_seats=unavailable)
+
+            schedule = Schedule.objects.get(id=schedule_id)
+            base_price = schedule.base_price
+            total_price = base_price * len(seat_ids)
+            offer, discount_amount = self._apply_offer(offer_id, total_price)
+
+            # Spread the discount over the tickets, the first one takes the rounding remainder
+            per_ticket_discount = (discount_amount / len(seat_ids)).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+            remainder = discount_amount - per_ticket_discount * len(seat_ids)
+
+            hold_expires_at = self.hold_engine.expires_at()
+            tickets = []
+            for i, seat_id in enumerate(seat_ids):
+                ticket_discount = per_ticket_discount + (remainder if i == 0 else 0)
+                tickets.append(Ticket(
+                    customer=customer,
+                    schedule=schedule,
+                    seat_id=seat_id,
+                    base_price=base_price,
+                    discount_amount=ticket_discount,
+                    final_price=base_price - ticket_discount,
+                    offer=offer,
+                    status='RESERVED',
+                    hold_expires_at=hold_expires_at
+                ))
+
+            # bulk_create skips post_save, the seats were already marked RESERVED by the claim
+            Ticket.objects.bulk_create(tickets)
+
+            self._track_holds(tickets)
+            broadcast_seats_on_commit(schedule_id, seat_ids, 'RESERVED')
+
+        return tickets, total_price, discount_amount
+
+    def cancel_ticket(self, ticket, reason):
+        """Cancel an active ticket, its seat goes to the waitlist or back on sale"""
+        if ticket.status not in ACTIVE_TICKET_STATUSES:
+            raise BookingError(f"Cannot cancel ticket with status '{ticket.status}'")
+
+        with transaction.atomic():
+            now = timezone.now()
+            # Only one of two concurrent cancellations finds the ticket still active
+            cancelled = Ticket.objects.filter(pk=ticket.pk, status__in=ACTIVE_TICKET_STATUSES).update(
+                status='CANCELLED',
+                cancellation_time=now,
+                cancellation_reason=reason,
+                hold_expires_at=None,
+                updated_at=now
+            )
+            if not cancelled:
+                raise BookingError("This ticket is no longer active")
+            ticket.status = 'CANCELLED'
+            ticket.cancellation_time = now
+            ticket.cancellation_reason = reason
+            ticket.hold_expires_at = None
+            ticket.updated_at = now
+
+            try:
+                freed = self.inventory.transition(ticket.schedule_id, ticket.seat_id, 'AVAILABLE')
+            except (SeatAvailability.DoesNotExist, SeatInventory.DoesNotExist):
+                freed = False
+
+            # Hand the freed seat to the first customer on the waitlist, it announces the seat itself
+            from .waitlist import promote_waitlist
+            promoted = promote_waitlist(ticket.schedule_id, [ticket.seat_id], hold_engine=self.hold_engine)
+            if freed and not promoted:
+                broadcast_seats_on_commit(ticket.schedule_id, [ticket.seat_id], 'AVAILABLE')
+
+            self._release_holds([ticket])
+
+        return ticket
+
+    def save_ticket(self, ticket):
+        """
+        Save a ticket edited by hand (admin forms, seed data) and move its seat
+        to the matching status. A ticket moved to another seat frees its old seat.
+        """
+        with transaction.atomic():
+            previous = None
+            if not ticket._state.adding:
+                previous = Ticket.objects.filter(pk=ticket.pk).values_list('schedule_id', 'seat_id', 'status').first()
+
+            save_synced_ticket(ticket)
+
+            if previous:
+                schedule_id, seat_id, status = previous
+                if (schedule_id, seat_id) != (ticket.schedule_id, ticket.seat_id) and status in ACTIVE_TICKET_STATUSES:
+                    self.set_seat_status(schedule_id, seat_id, 'AVAILABLE')
+
+            self.sync_ticket_seat(ticket)
+            if ticket.status != 'RESERVED':
+                self._release_holds([ticket])
+
+        return ticket
+
+    def sync_ticket_seat(self, ticket):
+        """Move the seat of a ticket to the status matching the ticket's status"""
+        seat_status = TICKET_SEAT_STATUS.get(ticket.status)
+        if not seat_status:
+            return False
+        return self.set_seat_status(ticket.schedule_id, ticket.seat_id, seat_status)
+
+    def set_seat_status(self, schedule_id, seat_id, status):
+        """
+        Change the status of one seat. Returns True if it changed, the change is
+        broadcast once the transaction commits.
+        """
+        changed = self.inventory.transition(schedule_id, seat_id, status)
+        if changed:
+            broadcast_seats_on_commit(schedule_id, [seat_id], status)
+        return changed
+
+    def _apply_offer(self, offer_id, amount):
+        """Lock and use a coupon for a purchase amount, returns (offer, discount amount)"""
+        if not offer_id:
+            return None, Decimal('0')
+
+        now = timezone.now()
+        try:
+            offer = Offer.objects.select_for_update().get(
+                id=offer_id,
+                is_active=True,
+                valid_from__lte=now,
+                valid_until__gte=now,
+                min_purchase_amount__lte=amount
+            )
+        except Offer.DoesNotExist:
+            raise BookingError("Invalid or expired coupon")
+
+        if offer.usage_limit and offer.usage_count >= offer.usage_limit:
+            raise BookingError("This coupon has reached its usage limit")
+
+        Offer.objects.filter(pk=offer.pk).update(usage_count=F('usage_count') + 1)
+        return offer, calculate_offer_discount(offer, amount)
+
+    def _track_holds(self, tickets):
+        hold_engine = self.hold_engine
+        transaction.on_commit(lambda: hold_engine.hold(tickets))
+
+    def _release_holds(self, tickets):
+        ticket_ids = [ticket.id for ticket in tickets]
+        transaction.on_commit(lambda: self._drop_holds(ticket_ids))
+
+    def _drop_holds(self, ticket_ids):
+        for ticket_id in ticket_ids:
+            self.hold_engine.release(ticket_id)
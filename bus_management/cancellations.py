@@ -0,0 +1,117 @@
+"""
+Set-based schedule cancellation.
+
+Cancelling the tickets of a schedule one by one fires the ticket signal for
+every ticket: a seat lookup, a save and a WebSocket broadcast per seat.
+``cancel_schedules`` cancels any number of schedules with a fixed number of
+statements instead: one UPDATE for the schedules, one for their tickets
+(recording refunds for paid tickets), one for their waitlists, one DELETE of
+their vehicle occupancy rows and one seat reset through the seat inventory.
+Once the transaction commits, customers are notified with a single batched
+insert and each schedule gets one seat map broadcast.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from .inventory import get_seat_inventory
+from .models import Customer, Schedule, Ticket, WaitlistEntry
+from .occupancy import release_schedules
+from .tripsearch import drop_trips
+from .utils import broadcast_schedule_status_update, broadcast_seat_map_reset
+
+logger = logging.getLogger(__name__)
+
+
+SCHEDULE_CANCELLED_REASON = 'Schedule cancelled by operator'
+
+# Schedules that have not left yet can be cancelled
+CANCELLABLE_STATUSES = ('SCHEDULED', 'DELAYED')
+
+ACTIVE_TICKET_STATUSES = ('RESERVED', 'CONFIRMED')
+
+
+def cancel_schedules(schedule_ids, reason=None):
+    """
+    Cancel schedules together with all their active tickets.
+    Schedules that already departed, completed or were cancelled are skipped.
+    Confirmed tickets get their final price recorded as ``refund_amount``;
+    reserved tickets were never paid and are simply released.
+
+    Returns a dictionary with the number of cancelled schedules and tickets and
+    the total amount to refund.
+    """
+    reason = reason or SCHEDULE_CANCELLED_REASON
+    now = timezone.now()
+
+    with transaction.atomic():
+        schedule_ids = list(
+            Schedule.objects.select_for_update().filter(
+                pk__in=schedule_ids,
+                status__in=CANCELLABLE_STATUSES
+            ).values_list('pk', flat=True)
+        )
+        if not schedule_ids:
+            return {'schedules': 0, 'tickets': 0, 'refunded': Decimal('0')}
+
+        Schedule.objects.filter(pk__in=schedule_ids).update(status='CANCELLED', updated_at=now)
+        release_schedules(schedule_ids)
+        drop_trips(schedule_ids)
+
+        tickets = Ticket.objects.filter(schedule_id__in=schedule_ids, status__in=ACTIVE_TICKET_STATUSES)
+        affected = list(tickets.values_list('schedule_id', 'customer_id').distinct().order_by())
+        refunded = tickets.filter(status='CONFIRMED').aggregate(total=Sum('final_price'))['total'] or Decimal('0')
+
+        # Seat holds of the reserved tickets are dropped by the hold sweeper,
+        # it skips tickets that are no longer RESERVED
+        cancelled = tickets.update(
+            status='CANCELLED',
+            cancellation_time=now,
+            cancellation_reason=reason,
+            hold_expires_at=None,
+            refund_amount=Case(
+                When(status='CONFIRMED', then=F('final_price')),
+                default=None,
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            ),
+            updated_at=now
+        )
+
+        WaitlistEntry.objects.filter(schedule_id__in=schedule_ids, status='WAITING').update(
+            status='CANCELLED',
+            updated_at=now
+        )
+
+        get_seat_inventory().reset_many(schedule_ids)
+        versions = dict(Schedule.objects.filter(pk__in=schedule_ids).values_list('pk', 'seat_map_version'))
+
+        transaction.on_commit(lambda: _announce_cancellation(versions, affected, reason))
+
+    return {'schedules': len(schedule_ids), 'tickets': cancelled, 'refunded': refunded}
+
+
+def _announce_cancellation(versions, affected, reason):
+    """Notify the affected customers in one batch and broadcast each schedule once"""
+    try:
+        from notifications.services import send_notification_batch
+
+        schedules = Schedule.objects.select_related('vehicle', 'route').in_bulk(list(versions))
+        customers = Customer.objects.in_bulk({customer_id for _, customer_id in affected})
+        send_notification_batch('schedule_cancelled', [
+            (
+                customers[customer_id],
+                'Trip cancelled',
+                f"Your trip {schedules[schedule_id]} has been cancelled: {reason}. "
+                f"Confirmed tickets will be refunded."
+            )
+            for schedule_id, customer_id in affected
+        ])
+    except Exception as e:
+        logger.error(f"Error notifying customers about cancelled schedules: {e}")
+
+    for schedule_id, version in versions.items():
+        broadcast_schedule_status_update(str(schedule_id), 'CANCELLED')
+        broadcast_seat_map_reset(str(schedule_id), version, 'AVAILABLE', reason='schedule_cancelled')
@@ -0,0 +1,65 @@
+"""
+Cache change logs for in-memory indexes.
+
+Some lookups are answered from structures held in memory by each process
+(see bus_management/connections.py and bus_management/autocomplete.py). Their
+source tables publish what changed through a ``ChangeLog``: once a
+transaction commits, a version counter in the cache is bumped and the changed
+ids are stored under the new version. A process holding version N compares it
+with the current version, which costs one cache read, and reloads only the ids
+changed since N. When the log no longer covers the gap (evicted, expired or too
+long), it rebuilds from the database instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class ChangeLog:
+    """
+    Versioned log of changed ids. ``name`` namespaces the cache keys, the
+    ``<setting_prefix>_CHANGE_LOG_SIZE`` and ``<setting_prefix>_CHANGE_LOG_TIMEOUT``
+    settings bound how far back a process can catch up.
+    """
+
+    def __init__(self, name, setting_prefix):
+        self.version_key = f'bus_management:{name}:version'
+        self.change_key = f'bus_management:{name}:change:{{}}'
+        self.setting_prefix = setting_prefix
+
+    def _size(self):
+        return getattr(settings, f'{self.setting_prefix}_CHANGE_LOG_SIZE', 1000)
+
+    def _timeout(self):
+        return getattr(settings, f'{self.setting_prefix}_CHANGE_LOG_TIMEOUT', 60 * 60)
+
+    def record(self, ids):
+        """
+        Once the transaction commits, bump the version and log the changed ids
+        under it. ``None`` means that anything may have changed.
+        """
+        ids = None if ids is None else [str(changed_id) for changed_id in ids]
+        transaction.on_commit(lambda: self._publish(ids))
+
+    def _publish(self, ids):
+        cache.add(self.version_key, 0, None)
+        version = cache.incr(self.version_key)
+        if ids is not None:
+            cache.set(self.change_key.format(version), ids, self._timeout())
+
+    def version(self):
+        """Current version, bumped by every committed change"""
+        return cache.get(self.version_key, 0)
+
+    def changes_between(self, since_version, version):
+        """
+        Ids changed after ``since_version`` up to ``version``, or None if the
+        log no longer covers that range.
+        """
+        if not 0 <= since_version <= version or version - since_version > self._size():
+            return None
+        keys = [self.change_key.format(entry_version) for entry_version in range(since_version + 1, version + 1)]
+        log = cache.get_many(keys)
+        if len(log) != len(keys):
+            return None
+        return {changed_id for ids in log.values() for changed_id in ids}
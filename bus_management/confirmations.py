@@ -0,0 +1,80 @@
+"""
+Automatic confirmation of RESERVED tickets shortly before departure.
+
+Tickets still RESERVED within ``AUTO_CONFIRM_WINDOW_SECONDS`` of departure are
+confirmed by a scheduled job (the ``confirm_reserved_tickets`` management
+command) instead of on every schedule save. Due schedules are found with one
+query on the (status, departure_time) index; each schedule is then confirmed
+with one UPDATE for its tickets, one seat transition through the seat
+inventory and a single broadcast listing every seat that changed.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import get_seat_inventory
+from .models import Schedule, Ticket
+from .utils import broadcast_seat_status_batch
+
+
+def _window():
+    return timedelta(seconds=getattr(settings, 'AUTO_CONFIRM_WINDOW_SECONDS', 30 * 60))
+
+
+def due_schedule_ids(now=None):
+    """Return the ids of SCHEDULED schedules inside the confirmation window that still have RESERVED tickets"""
+    now = now or timezone.now()
+    return list(
+        Schedule.objects.filter(
+            status='SCHEDULED',
+            departure_time__lte=now + _window(),
+            tickets__status='RESERVED'
+        ).values_list('pk', flat=True).distinct().order_by()
+    )
+
+
+def confirm_schedule_tickets(schedule_id):
+    """
+    Confirm every RESERVED ticket of a schedule and mark their seats BOOKED.
+    Returns the number of confirmed tickets.
+    """
+    with transaction.atomic():
+        reserved = list(
+            Ticket.objects.select_for_update().filter(
+                schedule_id=schedule_id,
+                schedule__status='SCHEDULED',
+                status='RESERVED'
+            ).values_list('id', 'seat_id')
+        )
+        if not reserved:
+            return 0
+
+        # Their seat holds are dropped by the hold sweeper, it skips tickets that are no longer RESERVED
+        Ticket.objects.filter(id__in=[ticket_id for ticket_id, _ in reserved]).update(
+            status='CONFIRMED',
+            hold_expires_at=None,
+            updated_at=timezone.now()
+        )
+        booked = get_seat_inventory().bulk_transition(
+            schedule_id, [seat_id for _, seat_id in reserved], 'BOOKED', from_statuses=('RESERVED',)
+        )
+
+        transaction.on_commit(lambda: broadcast_seat_status_batch(str(schedule_id), booked, 'BOOKED'))
+
+    return len(reserved)
+
+
+def confirm_due_tickets(now=None):
+    """
+    Confirm the RESERVED tickets of every schedule inside the confirmation window.
+    Returns a dictionary with the number of schedules and tickets confirmed.
+    """
+    schedules = tickets = 0
+    for schedule_id in due_schedule_ids(now):
+        confirmed = confirm_schedule_tickets(schedule_id)
+        if confirmed:
+            schedules += 1
+            tickets += confirmed
+    return {'schedules': schedules, 'tickets': tickets}
@@ -0,0 +1,251 @@
+"""
+Multi-leg connection search.
+
+Every bookable schedule is one connection: it leaves a stop at its departure
+time and reaches another at its arrival time. The connections are read from
+the trip search index (bus_management/tripsearch.py) and held in memory as one
+list sorted by departure time, so journeys via a hub are found with the
+Connection Scan Algorithm without touching the database:
+
+- connections are scanned once, in departure order, from the first one
+  leaving after the requested time (found with bisect);
+- the earliest arrival at every stop is kept per number of legs, so a journey
+  with fewer legs is not lost to a faster one with too many;
+- a leg can be boarded when the previous one arrived at least the minimum
+  transfer time earlier;
+- the scan stops as soon as connections leave after the best arrival found.
+
+Further itineraries are found by scanning again for journeys whose first leg
+leaves after the previous itinerary's.
+
+The in-memory index checks the trip search version in the cache before each
+search. When schedules changed, only the changed entries are reloaded and
+moved in the sorted list; when the change log no longer covers the gap, the
+list is rebuilt from the database. The version is only shared between the web
+processes and the Celery worker when they use the same cache (Redis, see
+``CACHES`` in BusManagement/settings.py), and the list is rebuilt every
+``CONNECTION_INDEX_REFRESH_SECONDS`` in any case, so a change that was not
+seen through the cache is picked up at the latest then.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import TripSearchEntry
+from .stops import normalise_place
+from .tripsearch import CHANGES
+
+logger = logging.getLogger(__name__)
+
+
+Connection = namedtuple('Connection', [
+    'departure_time', 'arrival_time', 'origin', 'destination', 'schedule_id',
+    'origin_name', 'destination_name', 'price', 'seats_left',
+])
+
+ENTRY_FIELDS = (
+    'departure_time', 'arrival_time', 'origin', 'destination', 'schedule_id',
+    'origin_name', 'destination_name', 'price', 'seats_left',
+)
+
+
+def _min_transfer():
+    return timedelta(minutes=getattr(settings, 'CONNECTION_MIN_TRANSFER_MINUTES', 15))
+
+
+def _max_legs():
+    return getattr(settings, 'CONNECTION_MAX_LEGS', 3)
+
+
+def _refresh_seconds():
+    return getattr(settings, 'CONNECTION_INDEX_REFRESH_SECONDS', 5 * 60)
+
+
+def _sort_key(connection):
+    return (connection.departure_time, connection.arrival_time, connection.schedule_id)
+
+
+class ConnectionIndex:
+    """
+    Bookable connections sorted by departure time. A search works on the
+    lists it started with: updates build new lists and swap them in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.loaded_at = None
+        self.connections = []
+        self.departures = []
+        self.stops = {}
+
+    def refresh(self):
+        """Bring the index up to date with the trip search table"""
+        version = CHANGES.version()
+        expired = self.loaded_at is None or time.monotonic() - self.loaded_at > _refresh_seconds()
+        if version == self.version and not expired:
+            return
+
+        with self._lock:
+            expired = self.loaded_at is None or time.monotonic() - self.loaded_at > _refresh_seconds()
+            if version == self.version and not expired:
+                return
+            changed = None if expired else CHANGES.changes_between(self.version, version)
+            if changed is None:
+                self._rebuild(version)
+            else:
+                self._update(version, changed)
+
+    def _rebuild(self, version):
+        connections = sorted(
+            (Connection(*row) for row in TripSearchEntry.objects.values_list(*ENTRY_FIELDS).iterator()),
+            key=_sort_key
+        )
+        self._swap(version, connections)
+        self.loaded_at = time.monotonic()
+        logger.info(f"Connection index rebuilt with {len(connections)} connections at version {version}")
+
+    def _update(self, version, schedule_ids):
+        connections = [
+            connection for connection in self.connections
+            if str(connection.schedule_id) not in schedule_ids
+        ]
+        keys = [_sort_key(connection) for connection in connections]
+        for row in TripSearchEntry.objects.filter(schedule_id__in=schedule_ids).values_list(*ENTRY_FIELDS):
+            connection = Connection(*row)
+            position = bisect_right(keys, _sort_key(connection))
+            keys.insert(position, _sort_key(connection))
+            connections.insert(position, connection)
+        self._swap(version, connections)
+
+    def _swap(self, version, connections):
+        stops = {}
+        for connection in connections:
+            stops[connection.origin] = connection.origin_name
+            stops[connection.destination] = connection.destination_name
+        self.connections = connections
+        self.departures = [connection.departure_time for connection in connections]
+        self.stops = stops
+        self.version = version
+
+    def match_stops(self, name):
+        """Normalised stops named ``name``, or starting with it when none is"""
+        name = normalise_place(name)
+        if not name:
+            return set()
+        if name in self.stops:
+            return {name}
+        return {stop for stop in self.stops if stop.startswith(name)}
+
+    def search(self, origin, destination, departure_after=None, seats=1, min_transfer=None, max_legs=None,
+               limit=3):
+        """
+        Return up to ``limit`` itineraries from ``origin`` to ``destination``
+        leaving after ``departure_after``, earliest arrival first, each a list
+        of connections.
+        """
+        self.refresh()
+        connections, departures = self.connections, self.departures
+        sources = self.match_stops(origin)
+        targets = self.match_stops(destination) - sources
+        if not sources or not targets:
+            return []
+
+        departure_after = departure_after or timezone.now()
+        min_transfer = _min_transfer() if min_transfer is None else min_transfer
+        max_legs = max_legs or _max_legs()
+
+        itineraries = []
+        start = bisect_left(departures, departure_after)
+        while len(itineraries) < limit:
+            legs = self._scan(connections, start, sources, targets, seats, min_transfer, max_legs)
+            if not legs:
+                break
+            itineraries.append(legs)
+            # The next itinerary leaves after this one
+            start = bisect_right(departures, legs[0].departure_time)
+        return itineraries
+
+    @staticmethod
+    def _scan(connections, start, sources, targets, seats, min_transfer, max_legs):
+        """Earliest-arrival connection scan, returns the legs of the best journey"""
+        # arrivals[k][stop]: earliest arrival at stop with k legs, parents[k][stop]: the last leg
+        arrivals = [dict() for _ in range(max_legs + 1)]
+        parents = [dict() for _ in range(max_legs + 1)]
+        best = None
+
+        for connection in connections[start:]:
+            if best is not None and connection.departure_time >= best[0]:
+                break
+            if connection.seats_left < seats:
+                continue
+
+            for legs in range(1, max_legs + 1):
+                if legs == 1:
+                    reachable = connection.origin in sources
+                else:
+                    arrived = arrivals[legs - 1].get(connection.origin)
+                    reachable = arrived is not None and arrived + min_transfer <= connection.departure_time
+                if not reachable:
+                    continue
+                if connection.destination in sources:
+                    continue
+
+                known = arrivals[legs].get(connection.destination)
+                if known is None or connection.arrival_time < known:
+                    arrivals[legs][connection.destination] = connection.arrival_time
+                    parents[legs][connection.destination] = connection
+                    if connection.destination in targets and (
+                        best is None or (connection.arrival_time, legs) < best[:2]
+                    ):
+                        best = (connection.arrival_time, legs, connection.destination)
+
+        if best is None:
+            return []
+
+        _, legs, stop = best
+        journey = []
+        for count in range(legs, 0, -1):
+            connection = parents[count][stop]
+            journey.append(connection)
+            stop = connection.origin
+        return journey[::-1]
+
+
+_index = ConnectionIndex()
+
+
+def get_connection_index():
+    """The connection index of this process"""
+    return _index
+
+
+def describe_itinerary(legs):
+    """Summary of an itinerary for API responses"""
+    return {
+        'departure_time': legs[0].departure_time,
+        'arrival_time': legs[-1].arrival_time,
+        'duration_minutes': int((legs[-1].arrival_time - legs[0].departure_time).total_seconds() // 60),
+        'transfers': len(legs) - 1,
+        # Decimals as strings, like the serializers
+        'total_price': f'{sum(leg.price for leg in legs):.2f}',
+        'seats_left': min(leg.seats_left for leg in legs),
+        'legs': [
+            {
+                'schedule': str(leg.schedule_id),
+                'origin_name': leg.origin_name,
+                'destination_name': leg.destination_name,
+                'departure_time': leg.departure_time,
+                'arrival_time': leg.arrival_time,
+                'price': f'{leg.price:.2f}',
+                'seats_left': leg.seats_left,
+            }
+            for leg in legs
+        ],
+    }
@@ -1,9 +1,12 @@
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
-from .models import Schedule, SeatAvailability, Vehicle
+from .models import Schedule, SeatAvailability, SeatInventory, Vehicle
+from .booking import BookingService
+from .seatmaps import sync_seat_map
 
 
 class VehicleStatusConsumer(AsyncWebsocketConsumer):
@@ -149,13 +152,12 @@ class SeatAvailabilityConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             
-            # Send initial seat availability data
-            seats = await self.get_seat_availability(self.schedule_id)
+            # Send initial seat availability data, clients reconnecting with
+            # ?version=N only get what changed since then
+            known_version = parse_qs(self.scope.get('query_string', b'').decode()).get('version', [None])[0]
+            payload = await self.get_seat_availability(self.schedule_id, known_version)
             await self.accept()
-            await self.send(text_data=json.dumps({
-                'type': 'initial_data',
-                'seats': seats
-            }))
+            await self.send(text_data=json.dumps(payload))
         else:
             await self.close()
     
@@ -173,56 +175,65 @@ class SeatAvailabilityConsumer(AsyncWebsocketConsumer):
         # In a real app, we'd validate if the user has permission to update
         # For this example, we'll proceed without validation
         data = json.loads(text_data)
+        
+        # A client can ask to catch up from the seat map version it holds
+        if data.get('type') == 'sync':
+            payload = await self.get_seat_availability(self.schedule_id, data.get('version'))
+            await self.send(text_data=json.dumps(payload))
+            return
+        
         seat_id = data.get('seat_id')
         status = data.get('status')
         
-        if seat_id and status and self.schedule_id:
-            result = await self.update_seat_availability(self.schedule_id, seat_id, status)
-            if result:
-                await self.channel_layer.group_send(
-                    self.group_name,
-                    {
-                        'type': 'seat_update',
-                        'seat_id': str(seat_id),
-                        'status': status,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
+        # Unknown statuses are ignored, neither inventory backend can store them
+        if status not in dict(SeatAvailability.STATUS_CHOICES):
+            return
+        
+        if seat_id and self.schedule_id:
+            # The booking service broadcasts the change to the group once it is saved
+            await self.update_seat_availability(self.schedule_id, seat_id, status)
     
     @database_sync_to_async
-    def get_seat_availability(self, schedule_id):
-        """Get current seat availability data for a schedule"""
+    def get_seat_availability(self, schedule_id, known_version=None):
+        """Get the seat map snapshot (or the changes since ``known_version``) for a schedule"""
         try:
-            seat_availability = SeatAvailability.objects.filter(schedule_id=schedule_id)
-            return [
-                {
-                    'id': str(sa.id),
-                    'seat_id': str(sa.seat.id),
-                    'seat_number': sa.seat.seat_number,
-                    'status': sa.status,
-                    'seat_type': sa.seat.seat_type
-                }
-                for sa in seat_availability
-            ]
+            known_version = int(known_version) if known_version is not None else None
+        except (TypeError, ValueError):
+            known_version = None
+        
+        try:
+            result = sync_seat_map(schedule_id, known_version)
         except Exception:
-            return []
+            result = None
+        
+        if result is None:
+            return {'type': 'initial_data', 'version': None, 'seats': []}
+        if result['type'] == 'snapshot':
+            result['type'] = 'initial_data'
+        return result
     
     @database_sync_to_async
     def update_seat_availability(self, schedule_id, seat_id, status):
         """Update seat availability status"""
         try:
-            seat_availability = SeatAvailability.objects.get(
-                schedule_id=schedule_id,
-                seat_id=seat_id
-            )
-            seat_availability.status = status
-            seat_availability.save()
-            return True
-        except SeatAvailability.DoesNotExist:
+            return BookingService().set_seat_status(schedule_id, seat_id, status)
+        except (SeatAvailability.DoesNotExist, SeatInventory.DoesNotExist):
             return False
     
     async def seat_update(self, event):
         """
         Send seat availability update to WebSocket.
         """
+        await self.send(text_data=json.dumps(event))
+    
+    async def seat_batch_update(self, event):
+        """
+        Send a status change of several seats to WebSocket in one message.
+        """
+        await self.send(text_data=json.dumps(event))
+    
+    async def seat_map_reset(self, event):
+        """
+        Send a whole-schedule seat change (e.g. a cancelled schedule) to WebSocket.
+        """
         await self.send(text_data=json.dumps(event)) 
\ No newline at end of file
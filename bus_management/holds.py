@@ -0,0 +1,296 @@
+"""
+Seat holds for RESERVED tickets.
+
+A ticket created by a booking keeps its seat RESERVED only for
+``SEAT_HOLD_TTL_SECONDS``. Every hold is added to a time-ordered expiry index
+and a sweeper pops the holds that ran out, cancels their tickets in batches,
+releases the seats in the inventory (or hands them to the schedule's
+waitlist) and broadcasts the change.
+
+Two index backends are available through ``SEAT_HOLD_BACKEND``:
+
+- ``'memory'`` keeps a heap in the current process (default).
+- ``'redis'`` keeps a sorted set in Redis so every process shares one index.
+
+The clock is injectable, tests use ``FakeClock`` to move time forward.
+"""
+import heapq
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import get_seat_inventory
+from .models import Ticket
+
+
+HOLD_EXPIRED_REASON = 'Seat hold expired'
+
+
+class SystemClock:
+    """Clock returning the current time"""
+
+    def now(self):
+        return timezone.now()
+
+
+class FakeClock:
+    """Clock that only moves when told to, for tests"""
+
+    def __init__(self, start=None):
+        self._now = start or timezone.now()
+
+    def now(self):
+        return self._now
+
+    def advance(self, **kwargs):
+        """Move the clock forward, takes the same arguments as timedelta"""
+        self._now += timedelta(**kwargs)
+        return self._now
+
+
+class InMemoryHoldStore:
+    """
+    Expiry index kept in a heap of (expiry timestamp, ticket id).
+    Re-adding or discarding a hold does not touch the heap, stale entries are
+    skipped when they reach the top.
+    """
+
+    in_process = True
+
+    def __init__(self):
+        self._heap = []
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def add(self, ticket_id, expires_at):
+        timestamp = expires_at.timestamp()
+        with self._lock:
+            self._expiry[str(ticket_id)] = timestamp
+            heapq.heappush(self._heap, (timestamp, str(ticket_id)))
+
+    def discard(self, ticket_id):
+        with self._lock:
+            self._expiry.pop(str(ticket_id), None)
+
+    def next_expiry(self):
+        """Return the timestamp of the earliest hold, or None if there are no holds"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now, limit):
+        """Remove and return up to ``limit`` ticket ids whose hold expired at ``now``"""
+        timestamp = now.timestamp()
+        expired = []
+        with self._lock:
+            while self._heap and len(expired) < limit:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > timestamp:
+                    break
+                _, ticket_id = heapq.heappop(self._heap)
+                del self._expiry[ticket_id]
+                expired.append(ticket_id)
+        return expired
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+            self._expiry = {}
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def _drop_stale(self):
+        while self._heap and self._expiry.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+
+class RedisHoldStore:
+    """Expiry index kept in a Redis sorted set scored by expiry timestamp"""
+
+    in_process = False
+
+    KEY = 'bus_management:seat_holds'
+
+    # Read and remove the expired holds in one step so two sweepers never get the same hold
+    POP_EXPIRED_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+end
+return ids
+"""
+
+    def __init__(self, url=None, key=None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or getattr(settings, 'SEAT_HOLD_REDIS_URL', 'redis://127.0.0.1:6379/0'))
+        self._client = client
+        self.key = key or self.KEY
+        self._pop_expired = self._client.register_script(self.POP_EXPIRED_SCRIPT)
+
+    def add(self, ticket_id, expires_at):
+        self._client.zadd(self.key, {str(ticket_id): expires_at.timestamp()})
+
+    def discard(self, ticket_id):
+        self._client.zrem(self.key, str(ticket_id))
+
+    def next_expiry(self):
+        first = self._client.zrange(self.key, 0, 0, withscores=True)
+        return first[0][1] if first else None
+
+    def pop_expired(self, now, limit):
+        ticket_ids = self._pop_expired(keys=[self.key], args=[now.timestamp(), limit])
+        return [
+            ticket_id.decode() if isinstance(ticket_id, bytes) else ticket_id
+            for ticket_id in ticket_ids
+        ]
+
+    def clear(self):
+        self._client.delete(self.key)
+
+    def __len__(self):
+        return self._client.zcard(self.key)
+
+
+class SeatHoldEngine:
+    """Tracks seat holds and releases the ones that expired"""
+
+    def __init__(self, store, clock=None, ttl=None, batch_size=None):
+        self.store = store
+        self.clock = clock or SystemClock()
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SEAT_HOLD_TTL_SECONDS', 15 * 60)
+        self.batch_size = batch_size or getattr(settings, 'SEAT_HOLD_SWEEP_BATCH_SIZE', 500)
+
+    def expires_at(self):
+        """Return the expiry time for a hold starting now, None when holds are disabled"""
+        if not self.ttl:
+            return None
+        return self.clock.now() + timedelta(seconds=self.ttl)
+
+    def hold(self, tickets):
+        """Add the holds of freshly reserved tickets to the expiry index"""
+        for ticket in tickets:
+            if ticket.hold_expires_at:
+                self.store.add(ticket.id, ticket.hold_expires_at)
+
+    def release(self, ticket_id):
+        """Drop a hold from the index, e.g. once its ticket is confirmed"""
+        self.store.discard(ticket_id)
+
+    def load(self):
+        """Rebuild the expiry index from the RESERVED tickets in the database"""
+        self.store.clear()
+        tickets = Ticket.objects.filter(
+            status='RESERVED',
+            hold_expires_at__isnull=False
+        ).only('id', 'hold_expires_at')
+        for ticket in tickets.iterator():
+            self.store.add(ticket.id, ticket.hold_expires_at)
+
+    def is_due(self):
+        """Whether at least one hold in the index has expired"""
+        next_expiry = self.store.next_expiry()
+        return next_expiry is not None and next_expiry <= self.clock.now().timestamp()
+
+    def sweep(self, batch_size=None):
+        """
+        Release one batch of expired holds.
+        The tickets are cancelled with a single UPDATE and their seats are made
+        AVAILABLE with one update per schedule. Holds whose ticket was confirmed
+        or cancelled in the meantime are simply dropped. The freed seats are
+        broadcast once the transaction commits. When the release fails, the
+        popped holds are put back so the next sweep retries them.
+
+        Returns the number of tickets that were cancelled.
+        """
+        now = self.clock.now()
+        ticket_ids = self.store.pop_expired(now, batch_size or self.batch_size)
+        if not ticket_ids:
+            return 0
+
+        try:
+            expired = self._release(ticket_ids, now)
+        except Exception:
+            # Nothing was released, the holds are due again right away
+            for ticket_id in ticket_ids:
+                self.store.add(ticket_id, now)
+            raise
+        return len(expired)
+
+    def _release(self, ticket_ids, now):
+        """
+        Cancel the expired RESERVED tickets among ``ticket_ids`` and free their
+        seats in one transaction. Returns the expired tickets.
+        """
+        with transaction.atomic():
+            expired = list(
+                Ticket.objects.select_for_update().filter(
+                    id__in=ticket_ids,
+                    status='RESERVED',
+                    hold_expires_at__lte=now
+                ).values_list('id', 'schedule_id', 'seat_id')
+            )
+            if not expired:
+                return expired
+
+            Ticket.objects.filter(id__in=[ticket_id for ticket_id, _, _ in expired]).update(
+                status='CANCELLED',
+                cancellation_reason=HOLD_EXPIRED_REASON,
+                hold_expires_at=None,
+                updated_at=timezone.now()
+            )
+
+            seats_by_schedule = {}
+            for _, schedule_id, seat_id in expired:
+                seats_by_schedule.setdefault(schedule_id, []).append(seat_id)
+
+            from .booking import broadcast_seats_on_commit
+            from .waitlist import promote_waitlist
+
+            inventory = get_seat_inventory()
+            for schedule_id, seat_ids in seats_by_schedule.items():
+                freed = inventory.bulk_transition(
+                    schedule_id, seat_ids, 'AVAILABLE', from_statuses=('RESERVED',)
+                )
+                # Waiting customers get the freed seats first, only the rest become available
+                promoted = set(promote_waitlist(schedule_id, freed, hold_engine=self))
+                broadcast_seats_on_commit(
+                    schedule_id, [seat_id for seat_id in freed if str(seat_id) not in promoted], 'AVAILABLE'
+                )
+        return expired
+
+    def sweep_expired(self):
+        """Sweep batches until no expired hold is left, returns the number of cancelled tickets"""
+        total = 0
+        while self.is_due():
+            total += self.sweep()
+        return total
+
+
+SEAT_HOLD_STORES = {
+    'memory': InMemoryHoldStore,
+    'redis': RedisHoldStore,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_hold_engine():
+    """
+    Return the process-wide hold engine for the configured SEAT_HOLD_BACKEND.
+    The in-process index starts empty, so it is filled from the database on first use.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            backend = getattr(settings, 'SEAT_HOLD_BACKEND', 'memory')
+            engine = SeatHoldEngine(SEAT_HOLD_STORES[backend]())
+            if engine.store.in_process:
+                engine.load()
+            _engine = engine
+    return _engine
@@ -0,0 +1,155 @@
+"""
+Idempotency keys for mutating endpoints.
+
+Clients that may retry a request send an ``Idempotency-Key`` header. The first
+request with a key is processed normally and its response is stored; a retry
+with the same key and the same request body gets the stored response back
+without running the view again, so no seat is claimed and no payment is
+recorded twice.
+
+Records expire after ``IDEMPOTENCY_KEY_TTL_SECONDS``. Expired records are
+replaced when their key is reused and can be purged in bulk with the
+``purge_idempotency_keys`` management command.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# How long a key is locked while its first request is running. A request that
+# crashed without storing a response frees its key again after this time.
+PROCESSING_TIMEOUT_SECONDS = 60
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60))
+
+
+def request_owner(request):
+    """Identify who sent a request: the customer in the token, or the authenticated user"""
+    payload = getattr(request.auth, 'payload', None) or {}
+    if payload.get('customer_id'):
+        return f"customer:{payload['customer_id']}"
+    if request.user and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return 'anonymous'
+
+
+def request_fingerprint(request):
+    """Hash the method, path and body of a request"""
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method}\n{request.path}\n{body}".encode()).hexdigest()
+
+
+def _claim_key(scope, owner, key, fingerprint):
+    """
+    Insert the record for a key. Returns (record, created); ``created`` is False
+    when an unexpired record for the key already exists.
+    """
+    now = timezone.now()
+    existing = None
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyRecord.objects.create(
+                    scope=scope,
+                    owner=owner,
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=PROCESSING_TIMEOUT_SECONDS)
+                )
+            return record, True
+        except IntegrityError:
+            existing = IdempotencyRecord.objects.filter(scope=scope, owner=owner, key=key).first()
+            if existing is None:
+                continue
+            if existing.expires_at > now:
+                return existing, False
+            # The old record expired, free the key and try again
+            IdempotencyRecord.objects.filter(pk=existing.pk, expires_at__lte=now).delete()
+    return existing, False
+
+
+def idempotent(scope):
+    """
+    Make a view method honour the Idempotency-Key header.
+
+    Requests without the header are processed as usual. A repeated key returns
+    the stored response (marked with ``Idempotent-Replayed: true``), a key
+    reused with a different request is rejected with 422 and a key whose first
+    request is still running is rejected with 409.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+
+            if len(key) > 255:
+                return Response(
+                    {"error": f"{IDEMPOTENCY_HEADER} must be at most 255 characters"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fingerprint = request_fingerprint(request)
+            record, created = _claim_key(scope, request_owner(request), key, fingerprint)
+
+            if not created:
+                if record is not None and record.fingerprint != fingerprint:
+                    return Response(
+                        {"error": f"This {IDEMPOTENCY_HEADER} was already used for a different request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record is None or record.status_code is None:
+                    return Response(
+                        {"error": f"A request with this {IDEMPOTENCY_HEADER} is still being processed"},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                response = Response(record.response_body, status=record.status_code)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500:
+                # Server errors are not final, let the client retry with the same key
+                record.delete()
+                return response
+
+            IdempotencyRecord.objects.filter(pk=record.pk).update(
+                status_code=response.status_code,
+                response_body=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder)),
+                expires_at=timezone.now() + _ttl()
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_records(batch_size=1000):
+    """Delete expired idempotency records in batches, returns the number deleted"""
+    deleted = 0
+    while True:
+        expired = list(
+            IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size]
+        )
+        if not expired:
+            return deleted
+        deleted += IdempotencyRecord.objects.filter(pk__in=expired).delete()[0]
@@ -0,0 +1,887 @@
+"""
+Seat inventory backends.
+
+Two interchangeable stores keep track of seat states for a schedule:
+
+- ``RowSeatInventory`` uses one SeatAvailability row per seat (the default).
+- ``SparseSeatInventory`` only keeps SeatAvailability rows for seats that are
+  not AVAILABLE. A seat without a row is available, so creating a schedule
+  writes nothing per seat.
+- ``BitmapSeatInventory`` packs all seat states of a schedule into a single
+  SeatInventory row, so a whole seat map is read with one query and no
+  per-seat rows are needed.
+
+The backend is selected with the ``SEAT_INVENTORY_BACKEND`` setting
+(``'rows'``, ``'sparse'`` or ``'bitmap'``). For the rows backend, ``BOOKING_STRATEGY``
+chooses between locking claims and lock-free conditional updates.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .tripsearch import refresh_seats, shift_seats
+from .models import Schedule, Seat, SeatAvailability, SeatInventory
+
+
+# Status codes stored in SeatInventory.states, one byte per seat
+STATUS_CODES = {
+    'AVAILABLE': 0,
+    'RESERVED': 1,
+    'BOOKED': 2,
+    'UNAVAILABLE': 3,
+}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# Seat statuses counted in Schedule.booked_count
+BOOKED_STATUSES = ('RESERVED', 'BOOKED')
+
+# How many times a compare-and-swap update is retried before giving up
+MAX_CAS_RETRIES = 50
+
+# How many times a statement is retried while SQLite reports the table as locked
+LOCKED_RETRIES = 50
+
+
+class SeatInventoryConflict(Exception):
+    """Raised when a seat state could not be updated because of concurrent writers."""
+    pass
+
+
+class _PartialClaim(Exception):
+    """Internal signal used to roll back a group claim that did not match every seat."""
+    pass
+
+
+def retry_when_locked(func, attempts=LOCKED_RETRIES):
+    """
+    Run a single-statement database operation, retrying while the database reports
+    the table as locked. SQLite fails concurrent writers immediately instead of
+    queueing them, other databases wait on the row and never hit this path.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+
+
+def record_status_changes(schedule_id, changes):
+    """
+    Record seat status changes on the schedule.
+    ``changes`` is a list of (seat_id, from_status, to_status) tuples. The
+    available_count / booked_count counters and the seat map version are
+    changed with a single F() update inside the caller's transaction, the
+    seat map cache learns about the change once the transaction commits.
+    """
+    if not changes:
+        return
+
+    available = booked = 0
+    for seat_id, from_status, to_status in changes:
+        available += (to_status == 'AVAILABLE') - (from_status == 'AVAILABLE')
+        booked += (to_status in BOOKED_STATUSES) - (from_status in BOOKED_STATUSES)
+
+    schedules = Schedule.objects.filter(pk=schedule_id)
+    schedules.update(
+        available_count=F('available_count') + available,
+        booked_count=F('booked_count') + booked,
+        seat_map_version=F('seat_map_version') + 1
+    )
+    shift_seats(schedule_id, available)
+    # The row is locked by the update above, so this is the version we just wrote
+    version = schedules.values_list('seat_map_version', flat=True).first()
+
+    from .seatmaps import record_seat_map_change
+    seats = {str(seat_id): to_status or 'AVAILABLE' for seat_id, from_status, to_status in changes}
+    transaction.on_commit(lambda: record_seat_map_change(schedule_id, version, seats))
+
+
+def reset_status_counts(schedule_id, available):
+    """Set the counters of a schedule whose seats are all AVAILABLE and start a new seat map version"""
+    Schedule.objects.filter(pk=schedule_id).update(
+        available_count=available,
+        booked_count=0,
+        seat_map_version=F('seat_map_version') + 1
+    )
+    refresh_seats([schedule_id])
+
+    from .seatmaps import invalidate_seat_map
+    transaction.on_commit(lambda: invalidate_seat_map(schedule_id))
+
+
+def reset_status_counts_many(schedule_ids, available):
+    """
+    Set the counters of several schedules whose seats are all AVAILABLE with one
+    UPDATE. ``available`` is an expression giving the seat total of each schedule.
+    """
+    Schedule.objects.filter(pk__in=schedule_ids).update(
+        available_count=available,
+        booked_count=0,
+        seat_map_version=F('seat_map_version') + 1
+    )
+    refresh_seats(schedule_ids)
+
+    from .seatmaps import invalidate_seat_maps
+    transaction.on_commit(lambda: invalidate_seat_maps(schedule_ids))
+
+
+def vehicle_seat_total():
+    """Expression counting the seats of a schedule's vehicle, for Schedule updates"""
+    seats = Seat.objects.filter(vehicle=OuterRef('vehicle')).order_by().values('vehicle').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(seats, output_field=IntegerField()), 0)
+
+
+def get_booking_strategy():
+    """Return the booking strategy configured by BOOKING_STRATEGY ('locking' or 'conditional')"""
+    return getattr(settings, 'BOOKING_STRATEGY', 'locking')
+
+
+def seat_layout(vehicle):
+    """
+    Return the seats of a vehicle in layout order.
+    Regular rows come first (A before B in each row), followed by the back row
+    from left to right. The position of a seat in this list is its seat index.
+    """
+    return sorted(Seat.objects.filter(vehicle=vehicle), key=seat_layout_key)
+
+
+def seat_layouts(vehicle_ids):
+    """Return {vehicle_id: seats in layout order} for several vehicles with one query"""
+    layouts = {}
+    for seat in Seat.objects.filter(vehicle_id__in=set(vehicle_ids)):
+        layouts.setdefault(seat.vehicle_id, []).append(seat)
+    for seats in layouts.values():
+        seats.sort(key=seat_layout_key)
+    return layouts
+
+
+def seat_layout_key(seat):
+    """Sort key putting seats in layout order"""
+    return (seat.seat_group == 'BACK', seat.row_number, seat.position or 0, seat.seat_group)
+
+
+class RowSeatInventory:
+    """
+    Seat inventory backed by one SeatAvailability row per seat.
+
+    With the default ``'locking'`` booking strategy a claim locks the seat row
+    with SELECT ... FOR UPDATE before changing it. With the ``'conditional'``
+    strategy a claim is a single ``UPDATE ... WHERE status='AVAILABLE'`` and the
+    affected-row count decides the winner, so no lock is taken up front.
+    """
+
+    def __init__(self, strategy=None):
+        self.strategy = strategy or get_booking_strategy()
+
+    def initialize(self, schedule):
+        """
+        Initialize seat availability records for a schedule.
+        Existing records are deleted first to avoid uniqueness constraint violations.
+        """
+        SeatAvailability.objects.filter(schedule=schedule).delete()
+
+        seat_availabilities = [
+            SeatAvailability(schedule=schedule, seat=seat, status='AVAILABLE')
+            for seat in Seat.objects.filter(vehicle=schedule.vehicle)
+        ]
+
+        if seat_availabilities:
+            SeatAvailability.objects.bulk_create(seat_availabilities)
+
+        reset_status_counts(schedule.pk, len(seat_availabilities))
+        return len(seat_availabilities)
+
+    def initialize_many(self, schedules):
+        """
+        Start tracking newly created schedules, which have no rows yet.
+        The seats of every vehicle are read once and all rows are inserted in bulk.
+        """
+        layouts = seat_layouts(schedule.vehicle_id for schedule in schedules)
+        seat_availabilities = [
+            SeatAvailability(schedule=schedule, seat=seat, status='AVAILABLE')
+            for schedule in schedules
+            for seat in layouts.get(schedule.vehicle_id, [])
+        ]
+        SeatAvailability.objects.bulk_create(seat_availabilities, batch_size=1000)
+        reset_status_counts_many([schedule.pk for schedule in schedules], vehicle_seat_total())
+        return len(seat_availabilities)
+
+    def seat_map(self, schedule_id):
+        """Return the status of every seat of a schedule"""
+        seat_availability = SeatAvailability.objects.filter(
+            schedule_id=schedule_id
+        ).select_related('seat')
+        return [
+            {
+                'id': str(sa.id),
+                'seat_id': str(sa.seat.id),
+                'seat_number': sa.seat.seat_number,
+                'status': sa.status,
+                'seat_type': sa.seat.seat_type
+            }
+            for sa in seat_availability
+        ]
+
+    def transition(self, schedule_id, seat_id, to_status, from_statuses=None):
+        """
+        Move a seat to ``to_status``.
+        If ``from_statuses`` is given, the move only happens when the seat is
+        currently in one of those states. The row is locked for the rest of the
+        surrounding transaction.
+
+        Returns True if the seat status changed.
+        Raises SeatAvailability.DoesNotExist if the seat is not tracked.
+        """
+        with transaction.atomic():
+            seat_availability = SeatAvailability.objects.select_for_update().get(
+                schedule_id=schedule_id,
+                seat_id=seat_id
+            )
+
+            if from_statuses is not None and seat_availability.status not in from_statuses:
+                return False
+            if seat_availability.status == to_status:
+                return False
+
+            record_status_changes(schedule_id, [(seat_id, seat_availability.status, to_status)])
+            seat_availability.status = to_status
+            seat_availability.save()
+            return True
+
+    def bulk_transition(self, schedule_id, seat_ids, to_status, from_statuses=None):
+        """
+        Move several seats of a schedule to ``to_status`` with one UPDATE.
+        Seats that are not in ``from_statuses`` (when given), already in
+        ``to_status`` or not tracked are left alone.
+
+        Returns the list of seat ids that changed.
+        """
+        seat_ids = [str(seat_id) for seat_id in seat_ids]
+        with transaction.atomic():
+            rows = SeatAvailability.objects.select_for_update().filter(
+                schedule_id=schedule_id,
+                seat_id__in=seat_ids
+            ).exclude(status=to_status)
+            if from_statuses is not None:
+                rows = rows.filter(status__in=from_statuses)
+
+            changed = list(rows.order_by('seat_id').values_list('pk', 'seat_id', 'status'))
+            if changed:
+                SeatAvailability.objects.filter(
+                    pk__in=[pk for pk, seat_id, status in changed]
+                ).update(status=to_status, updated_at=timezone.now())
+                record_status_changes(schedule_id, [(seat_id, status, to_status) for pk, seat_id, status in changed])
+            return [str(seat_id) for pk, seat_id, status in changed]
+
+    def claim(self, schedule_id, seat_id, to_status='RESERVED'):
+        """Atomically move an AVAILABLE seat to ``to_status``"""
+        if self.strategy == 'conditional':
+            return self._conditional_claim(schedule_id, seat_id, to_status)
+        return self.transition(schedule_id, seat_id, to_status, from_statuses=('AVAILABLE',))
+
+    def _conditional_claim(self, schedule_id, seat_id, to_status):
+        """
+        Claim a seat with one conditional UPDATE and no pre-check or row lock.
+        Only the writer whose UPDATE matches the AVAILABLE row wins.
+        """
+        def update():
+            with transaction.atomic():
+                updated = SeatAvailability.objects.filter(
+                    schedule_id=schedule_id,
+                    seat_id=seat_id,
+                    status='AVAILABLE'
+                ).update(status=to_status, updated_at=timezone.now())
+                if updated:
+                    record_status_changes(schedule_id, [(seat_id, 'AVAILABLE', to_status)])
+                return updated
+
+        if retry_when_locked(update):
+            return True
+
+        # Lost the race or the seat is not tracked, only checked on the failure path
+        tracked = retry_when_locked(
+            lambda: SeatAvailability.objects.filter(schedule_id=schedule_id, seat_id=seat_id).exists()
+        )
+        if not tracked:
+            raise SeatAvailability.DoesNotExist(f"Seat {seat_id} is not tracked for schedule {schedule_id}")
+        return False
+
+    def claim_many(self, schedule_id, seat_ids, to_status='RESERVED'):
+        """
+        Atomically move several AVAILABLE seats to ``to_status``, all or nothing.
+        The requested rows are locked with a single ordered SELECT ... FOR UPDATE
+        so concurrent group bookings always acquire locks in the same order.
+        With the conditional strategy a single conditional UPDATE is used instead.
+
+        Returns the list of seat ids that could not be claimed (empty on success).
+        """
+        seat_ids = [str(seat_id) for seat_id in seat_ids]
+        if self.strategy == 'conditional':
+            return self._conditional_claim_many(schedule_id, seat_ids, to_status)
+
+        with transaction.atomic():
+            rows = SeatAvailability.objects.select_for_update().filter(
+                schedule_id=schedule_id,
+                seat_id__in=seat_ids
+            ).order_by('seat_id')
+            found = {str(row.seat_id): row for row in rows}
+
+            unavailable = [
+                seat_id for seat_id in seat_ids
+                if seat_id not in found or found[seat_id].status != 'AVAILABLE'
+            ]
+            if unavailable:
+                return unavailable
+
+            SeatAvailability.objects.filter(
+                pk__in=[row.pk for row in found.values()]
+            ).update(status=to_status, updated_at=timezone.now())
+            record_status_changes(schedule_id, [(seat_id, 'AVAILABLE', to_status) for seat_id in found])
+            return []
+
+    def _conditional_claim_many(self, schedule_id, seat_ids, to_status):
+        """Claim several seats with one conditional UPDATE, undone unless every seat matched"""
+        try:
+            with transaction.atomic():
+                updated = SeatAvailability.objects.filter(
+                    schedule_id=schedule_id,
+                    seat_id__in=seat_ids,
+                    status='AVAILABLE'
+                ).update(status=to_status, updated_at=timezone.now())
+                if updated != len(seat_ids):
+                    raise _PartialClaim()
+                record_status_changes(schedule_id, [(seat_id, 'AVAILABLE', to_status) for seat_id in seat_ids])
+        except _PartialClaim:
+            available = {
+                str(seat_id) for seat_id in SeatAvailability.objects.filter(
+                    schedule_id=schedule_id,
+                    seat_id__in=seat_ids,
+                    status='AVAILABLE'
+                ).values_list('seat_id', flat=True)
+            }
+            return [seat_id for seat_id in seat_ids if seat_id not in available]
+        return []
+
+    def reset(self, schedule_id):
+        """Mark every seat of a schedule as AVAILABLE"""
+        with transaction.atomic():
+            reset = SeatAvailability.objects.filter(schedule_id=schedule_id).update(status='AVAILABLE')
+            reset_status_counts(schedule_id, SeatAvailability.objects.filter(schedule_id=schedule_id).count())
+        return reset
+
+    def reset_many(self, schedule_ids):
+        """Mark every seat of several schedules as AVAILABLE, one UPDATE for the seats and one for the counters"""
+        rows = SeatAvailability.objects.filter(schedule_id=OuterRef('pk')).order_by().values('schedule').annotate(
+            total=Count('id')
+        ).values('total')
+        with transaction.atomic():
+            reset = SeatAvailability.objects.filter(schedule_id__in=schedule_ids).exclude(
+                status='AVAILABLE'
+            ).update(status='AVAILABLE')
+            reset_status_counts_many(schedule_ids, Coalesce(Subquery(rows, output_field=IntegerField()), 0))
+        return reset
+
+    def status_counts(self, schedule_id):
+        """Return a {status: count} dictionary for a schedule"""
+        return self.status_counts_many([schedule_id]).get(str(schedule_id), {})
+
+    def status_counts_many(self, schedule_ids):
+        """Return {schedule_id: {status: count}} for several schedules with one grouped query"""
+        counts = {}
+        rows = SeatAvailability.objects.filter(
+            schedule_id__in=schedule_ids
+        ).values_list('schedule_id', 'status').annotate(total=Count('id')).order_by()
+        for schedule_id, status, total in rows:
+            counts.setdefault(str(schedule_id), {})[status] = total
+        return counts
+
+
+class SparseSeatInventory:
+    """
+    Seat inventory that only stores SeatAvailability rows for seats that left
+    AVAILABLE. A seat with no row is available, a seat moving back to
+    AVAILABLE has its row deleted. Seat maps merge the vehicle's seats with
+    the few rows that exist.
+
+    Claims insert the row, the (schedule, seat) uniqueness of SeatAvailability
+    decides the winner when two bookings race for the same seat.
+    """
+
+    def initialize(self, schedule):
+        """
+        Start tracking a schedule. Only rows left over from a previous vehicle
+        are removed, no row is written per seat.
+        """
+        SeatAvailability.objects.filter(schedule=schedule).delete()
+        seat_count = Seat.objects.filter(vehicle_id=schedule.vehicle_id).count()
+        reset_status_counts(schedule.pk, seat_count)
+        return seat_count
+
+    def initialize_many(self, schedules):
+        """Start tracking newly created schedules, only their counters are written"""
+        reset_status_counts_many([schedule.pk for schedule in schedules], vehicle_seat_total())
+        seat_counts = dict(
+            Seat.objects.filter(vehicle_id__in={schedule.vehicle_id for schedule in schedules}).values(
+                'vehicle_id'
+            ).annotate(total=Count('id')).values_list('vehicle_id', 'total').order_by()
+        )
+        return sum(seat_counts.get(schedule.vehicle_id, 0) for schedule in schedules)
+
+    def _seats(self, schedule_id, seat_ids=None):
+        """Return the seats of the vehicle running a schedule"""
+        seats = Seat.objects.filter(vehicle__schedules__id=schedule_id)
+        if seat_ids is not None:
+            seats = seats.filter(id__in=seat_ids)
+        return seats
+
+    def _statuses(self, schedule_id, seat_ids=None):
+        """Return {seat_id: status} for the seats of a schedule that have a row"""
+        rows = SeatAvailability.objects.filter(schedule_id=schedule_id)
+        if seat_ids is not None:
+            rows = rows.filter(seat_id__in=seat_ids)
+        return {str(seat_id): status for seat_id, status in rows.values_list('seat_id', 'status')}
+
+    def seat_map(self, schedule_id):
+        """Return the status of every seat of a schedule, seats without a row are AVAILABLE"""
+        rows = {
+            str(row.seat_id): row
+            for row in SeatAvailability.objects.filter(schedule_id=schedule_id)
+        }
+        seat_map = []
+        for seat in sorted(self._seats(schedule_id), key=seat_layout_key):
+            row = rows.get(str(seat.id))
+            seat_map.append({
+                'id': str(row.id) if row else None,
+                'seat_id': str(seat.id),
+                'seat_number': seat.seat_number,
+                'status': row.status if row else 'AVAILABLE',
+                'seat_type': seat.seat_type
+            })
+        return seat_map
+
+    def transition(self, schedule_id, seat_id, to_status, from_statuses=None):
+        """
+        Move a seat to ``to_status``.
+        If ``from_statuses`` is given, the move only happens when the seat is
+        currently in one of those states.
+
+        Returns True if the seat status changed.
+        Raises SeatAvailability.DoesNotExist if the seat is not part of the schedule.
+        """
+        with transaction.atomic():
+            row = SeatAvailability.objects.select_for_update().filter(
+                schedule_id=schedule_id,
+                seat_id=seat_id
+            ).first()
+
+            if row is None:
+                if not self._seats(schedule_id, [seat_id]).exists():
+                    raise SeatAvailability.DoesNotExist(f"Seat {seat_id} is not part of schedule {schedule_id}")
+                if from_statuses is not None and 'AVAILABLE' not in from_statuses:
+                    return False
+                if to_status == 'AVAILABLE':
+                    return False
+                return self._insert(schedule_id, [seat_id], to_status)
+
+            if from_statuses is not None and row.status not in from_statuses:
+                return False
+            if row.status == to_status:
+                return False
+
+            record_status_changes(schedule_id, [(seat_id, row.status, to_status)])
+            if to_status == 'AVAILABLE':
+                row.delete()
+            else:
+                row.status = to_status
+                row.save()
+            return True
+
+    def _insert(self, schedule_id, seat_ids, to_status):
+        """Insert rows for seats that had none, False if another writer got there first"""
+        def insert():
+            with transaction.atomic():
+                SeatAvailability.objects.bulk_create([
+                    SeatAvailability(schedule_id=schedule_id, seat_id=seat_id, status=to_status)
+                    for seat_id in seat_ids
+                ])
+                record_status_changes(schedule_id, [(seat_id, 'AVAILABLE', to_status) for seat_id in seat_ids])
+
+        try:
+            retry_when_locked(insert)
+        except IntegrityError:
+            return False
+        return True
+
+    def bulk_transition(self, schedule_id, seat_ids, to_status, from_statuses=None):
+        """
+        Move several seats of a schedule to ``to_status``.
+        Seats that are not in ``from_statuses`` (when given), already in
+        ``to_status`` or not part of the schedule are left alone.
+
+        Returns the list of seat ids that changed.
+        """
+        seat_ids = [str(seat_id) for seat_id in seat_ids]
+        with transaction.atomic():
+            rows = SeatAvailability.objects.select_for_update().filter(
+                schedule_id=schedule_id,
+                seat_id__in=seat_ids
+            ).exclude(status=to_status)
+            if from_statuses is not None:
+                rows = rows.filter(status__in=from_statuses)
+            found = list(rows.order_by('seat_id').values_list('seat_id', 'status'))
+            changed = [str(seat_id) for seat_id, status in found]
+
+            if changed:
+                changed_rows = SeatAvailability.objects.filter(schedule_id=schedule_id, seat_id__in=changed)
+                if to_status == 'AVAILABLE':
+                    changed_rows.delete()
+                else:
+                    changed_rows.update(status=to_status, updated_at=timezone.now())
+                record_status_changes(schedule_id, [(seat_id, status, to_status) for seat_id, status in found])
+
+            # Seats without a row are AVAILABLE and only need a row when they leave it
+            if to_status != 'AVAILABLE' and (from_statuses is None or 'AVAILABLE' in from_statuses):
+                tracked = set(self._statuses(schedule_id, seat_ids))
+                missing = [
+                    str(seat_id) for seat_id in self._seats(schedule_id, seat_ids).values_list('id', flat=True)
+                    if str(seat_id) not in tracked
+                ]
+                if missing and self._insert(schedule_id, missing, to_status):
+                    changed.extend(missing)
+
+            return changed
+
+    def claim(self, schedule_id, seat_id, to_status='RESERVED'):
+        """
+        Atomically move an AVAILABLE seat to ``to_status`` by inserting its row.
+        Raises SeatAvailability.DoesNotExist if the seat is not part of the schedule.
+        """
+        if not self._seats(schedule_id, [seat_id]).exists():
+            raise SeatAvailability.DoesNotExist(f"Seat {seat_id} is not part of schedule {schedule_id}")
+        return self._insert(schedule_id, [seat_id], to_status)
+
+    def claim_many(self, schedule_id, seat_ids, to_status='RESERVED'):
+        """
+        Atomically move several AVAILABLE seats to ``to_status``, all or nothing,
+        with a single multi-row INSERT.
+
+        Returns the list of seat ids that could not be claimed (empty on success).
+        """
+        seat_ids = [str(seat_id) for seat_id in seat_ids]
+        known = {str(seat_id) for seat_id in self._seats(schedule_id, seat_ids).values_list('id', flat=True)}
+        unknown = [seat_id for seat_id in seat_ids if seat_id not in known]
+        if unknown:
+            return unknown
+
+        for _ in range(MAX_CAS_RETRIES):
+            if self._insert(schedule_id, seat_ids, to_status):
+                return []
+
+            # The rows that blocked the insert may already be gone again, then retry
+            taken = self._statuses(schedule_id, seat_ids)
+            unavailable = [seat_id for seat_id in seat_ids if seat_id in taken]
+            if unavailable:
+                return unavailable
+
+        raise SeatInventoryConflict(f"Could not claim seats on schedule {schedule_id}, please retry")
+
+    def reset(self, schedule_id):
+        """Mark every seat of a schedule as AVAILABLE by dropping its rows"""
+        with transaction.atomic():
+            deleted, _ = SeatAvailability.objects.filter(schedule_id=schedule_id).delete()
+            reset_status_counts(schedule_id, self._seats(schedule_id).count())
+        return deleted
+
+    def reset_many(self, schedule_ids):
+        """Mark every seat of several schedules as AVAILABLE by dropping all their rows at once"""
+        with transaction.atomic():
+            deleted, _ = SeatAvailability.objects.filter(schedule_id__in=schedule_ids).delete()
+            reset_status_counts_many(schedule_ids, vehicle_seat_total())
+        return deleted
+
+    def status_counts(self, schedule_id):
+        """Return a {status: count} dictionary for a schedule"""
+        return self.status_counts_many([schedule_id]).get(str(schedule_id), {})
+
+    def status_counts_many(self, schedule_ids):
+        """
+        Return {schedule_id: {status: count}} for several schedules.
+        Seats without a row are counted as AVAILABLE.
+        """
+        counts = RowSeatInventory().status_counts_many(schedule_ids)
+        seat_totals = Schedule.objects.filter(pk__in=schedule_ids).annotate(
+            seat_total=Count('vehicle__seats')
+        ).values_list('pk', 'seat_total')
+        for schedule_id, seat_total in seat_totals:
+            schedule_counts = counts.setdefault(str(schedule_id), {})
+            available = seat_total - sum(schedule_counts.values())
+            if available:
+                schedule_counts['AVAILABLE'] = available
+        return counts
+
+
+class BitmapSeatInventory:
+    """
+    Seat inventory backed by a single SeatInventory row per schedule.
+    Every state change is a compare-and-swap on the row's version, so no row
+    lock is held and concurrent writers simply retry.
+    """
+
+    def initialize(self, schedule):
+        """Create (or reset) the packed inventory row for a schedule"""
+        layout = [
+            [str(seat.id), seat.seat_number, seat.seat_type]
+            for seat in seat_layout(schedule.vehicle)
+        ]
+        states = bytes(len(layout))  # All seats start as AVAILABLE (code 0)
+
+        inventory, created = SeatInventory.objects.get_or_create(
+            schedule=schedule,
+            defaults={'layout': layout, 'states': states}
+        )
+        if not created:
+            SeatInventory.objects.filter(pk=inventory.pk).update(
+                layout=layout,
+                states=states,
+                version=F('version') + 1,
+                updated_at=timezone.now()
+            )
+
+        reset_status_counts(schedule.pk, len(layout))
+        return len(layout)
+
+    def initialize_many(self, schedules):
+        """Create the packed inventory rows of newly created schedules in bulk"""
+        layouts = {
+            vehicle_id: [[str(seat.id), seat.seat_number, seat.seat_type] for seat in seats]
+            for vehicle_id, seats in seat_layouts(schedule.vehicle_id for schedule in schedules).items()
+        }
+        inventories = [
+            SeatInventory(
+                schedule=schedule,
+                layout=layouts.get(schedule.vehicle_id, []),
+                states=bytes(len(layouts.get(schedule.vehicle_id, [])))
+            )
+            for schedule in schedules
+        ]
+        SeatInventory.objects.bulk_create(inventories, batch_size=500)
+        reset_status_counts_many([schedule.pk for schedule in schedules], vehicle_seat_total())
+        return sum(len(inventory.states) for inventory in inventories)
+
+    def _load(self, schedule_id):
+        """Read the inventory row for a schedule as (layout, states, version)"""
+        row = SeatInventory.objects.filter(schedule_id=schedule_id).values_list(
+            'layout', 'states', 'version'
+        ).first()
+        if row is None:
+            raise SeatInventory.DoesNotExist(f"No seat inventory for schedule {schedule_id}")
+        layout, states, version = row
+        return layout, bytes(states), version
+
+    def _swap(self, schedule_id, version, new_states, changes):
+        """
+        Store new seat states if the row is still at ``version`` and record the
+        status changes on the schedule counters. Returns True if the swap won.
+        """
+        with transaction.atomic():
+            updated = SeatInventory.objects.filter(
+                schedule_id=schedule_id,
+                version=version
+            ).update(
+                states=bytes(new_states),
+                version=version + 1,
+                updated_at=timezone.now()
+            )
+            if updated:
+                record_status_changes(schedule_id, changes)
+            return bool(updated)
+
+    def seat_map(self, schedule_id):
+        """Return the status of every seat of a schedule from a single row"""
+        try:
+            layout, states, version = self._load(schedule_id)
+        except SeatInventory.DoesNotExist:
+            return []
+        return [
+            {
+                'index': index,
+                'seat_id': seat_id,
+                'seat_number': seat_number,
+                'status': STATUS_NAMES[states[index]],
+                'seat_type': seat_type
+            }
+            for index, (seat_id, seat_number, seat_type) in enumerate(layout)
+        ]
+
+    def transition(self, schedule_id, seat_id, to_status, from_statuses=None):
+        """
+        Move a seat to ``to_status`` using a compare-and-swap on the row version.
+        If ``from_statuses`` is given, the move only happens when the seat is
+        currently in one of those states.
+
+        Returns True if the seat status changed.
+        Raises SeatInventory.DoesNotExist if the schedule or seat is not tracked.
+        """
+        seat_id = str(seat_id)
+        for _ in range(MAX_CAS_RETRIES):
+            layout, states, version = self._load(schedule_id)
+
+            index = next((i for i, seat in enumerate(layout) if seat[0] == seat_id), None)
+            if index is None:
+                raise SeatInventory.DoesNotExist(f"Seat {seat_id} is not part of schedule {schedule_id}")
+
+            current_status = STATUS_NAMES[states[index]]
+            if from_statuses is not None and current_status not in from_statuses:
+                return False
+            if current_status == to_status:
+                return False
+
+            new_states = bytearray(states)
+            new_states[index] = STATUS_CODES[to_status]
+
+            updated = self._swap(schedule_id, version, new_states, [(seat_id, current_status, to_status)])
+            if updated:
+                return True
+
+        raise SeatInventoryConflict(f"Could not update seat {seat_id} on schedule {schedule_id}, please retry")
+
+    def bulk_transition(self, schedule_id, seat_ids, to_status, from_statuses=None):
+        """
+        Move several seats of a schedule to ``to_status`` with one compare-and-swap.
+        Seats that are not in ``from_statuses`` (when given), already in
+        ``to_status`` or not part of the schedule are left alone.
+
+        Returns the list of seat ids that changed.
+        """
+        seat_ids = {str(seat_id) for seat_id in seat_ids}
+        for _ in range(MAX_CAS_RETRIES):
+            try:
+                layout, states, version = self._load(schedule_id)
+            except SeatInventory.DoesNotExist:
+                return []
+
+            new_states = bytearray(states)
+            changed = []
+            changes = []
+            for index, seat in enumerate(layout):
+                if seat[0] not in seat_ids:
+                    continue
+                current_status = STATUS_NAMES[states[index]]
+                if from_statuses is not None and current_status not in from_statuses:
+                    continue
+                if current_status == to_status:
+                    continue
+                new_states[index] = STATUS_CODES[to_status]
+                changed.append(seat[0])
+                changes.append((seat[0], current_status, to_status))
+
+            if not changed:
+                return []
+
+            updated = self._swap(schedule_id, version, new_states, changes)
+            if updated:
+                return changed
+
+        raise SeatInventoryConflict(f"Could not update seats on schedule {schedule_id}, please retry")
+
+    def claim(self, schedule_id, seat_id, to_status='RESERVED'):
+        """Atomically move an AVAILABLE seat to ``to_status``"""
+        return self.transition(schedule_id, seat_id, to_status, from_statuses=('AVAILABLE',))
+
+    def claim_many(self, schedule_id, seat_ids, to_status='RESERVED'):
+        """
+        Atomically move several AVAILABLE seats to ``to_status``, all or nothing,
+        with a single compare-and-swap on the inventory row.
+
+        Returns the list of seat ids that could not be claimed (empty on success).
+        """
+        seat_ids = [str(seat_id) for seat_id in seat_ids]
+        for _ in range(MAX_CAS_RETRIES):
+            try:
+                layout, states, version = self._load(schedule_id)
+            except SeatInventory.DoesNotExist:
+                return seat_ids
+
+            indexes = {seat[0]: i for i, seat in enumerate(layout)}
+            unavailable = [
+                seat_id for seat_id in seat_ids
+                if seat_id not in indexes or states[indexes[seat_id]] != STATUS_CODES['AVAILABLE']
+            ]
+            if unavailable:
+                return unavailable
+
+            new_states = bytearray(states)
+            for seat_id in seat_ids:
+                new_states[indexes[seat_id]] = STATUS_CODES[to_status]
+
+            updated = self._swap(schedule_id, version, new_states, [(seat_id, 'AVAILABLE', to_status) for seat_id in seat_ids])
+            if updated:
+                return []
+
+        raise SeatInventoryConflict(f"Could not claim seats on schedule {schedule_id}, please retry")
+
+    def reset(self, schedule_id):
+        """Mark every seat of a schedule as AVAILABLE"""
+        try:
+            layout, states, version = self._load(schedule_id)
+        except SeatInventory.DoesNotExist:
+            return 0
+        with transaction.atomic():
+            SeatInventory.objects.filter(schedule_id=schedule_id).update(
+                states=bytes(len(layout)),
+                version=F('version') + 1,
+                updated_at=timezone.now()
+            )
+            reset_status_counts(schedule_id, len(layout))
+        return len(layout)
+
+    def reset_many(self, schedule_ids):
+        """Mark every seat of several schedules as AVAILABLE, rewriting their packed rows in one bulk update"""
+        now = timezone.now()
+        with transaction.atomic():
+            inventories = list(
+                SeatInventory.objects.select_for_update().filter(
+                    schedule_id__in=schedule_ids
+                ).only('id', 'schedule_id', 'states', 'version')
+            )
+            for inventory in inventories:
+                inventory.states = bytes(len(inventory.states))
+                inventory.version += 1
+                inventory.updated_at = now
+            SeatInventory.objects.bulk_update(inventories, ['states', 'version', 'updated_at'])
+            reset_status_counts_many(schedule_ids, vehicle_seat_total())
+        return sum(len(inventory.states) for inventory in inventories)
+
+    def status_counts(self, schedule_id):
+        """Return a {status: count} dictionary for a schedule"""
+        return self.status_counts_many([schedule_id]).get(str(schedule_id), {})
+
+    def status_counts_many(self, schedule_ids):
+        """Return {schedule_id: {status: count}} for several schedules, one packed row each"""
+        counts = {}
+        rows = SeatInventory.objects.filter(schedule_id__in=schedule_ids).values_list('schedule_id', 'states')
+        for schedule_id, states in rows:
+            schedule_counts = counts.setdefault(str(schedule_id), {})
+            for code in bytes(states):
+                schedule_counts[STATUS_NAMES[code]] = schedule_counts.get(STATUS_NAMES[code], 0) + 1
+        return counts
+
+
+SEAT_INVENTORY_BACKENDS = {
+    'rows': RowSeatInventory,
+    'sparse': SparseSeatInventory,
+    'bitmap': BitmapSeatInventory,
+}
+
+
+def get_seat_inventory():
+    """Return the seat inventory backend configured by SEAT_INVENTORY_BACKEND"""
+    backend = getattr(settings, 'SEAT_INVENTORY_BACKEND', 'rows')
+    return SEAT_INVENTORY_BACKENDS[backend]()
@@ -0,0 +1,180 @@
+"""
+Journey lifecycle.
+
+Schedules move SCHEDULED -> IN_PROGRESS at departure and IN_PROGRESS ->
+COMPLETED at arrival (a SCHEDULED schedule whose arrival already passed goes
+straight to COMPLETED). DELAYED and CANCELLED schedules are left to operators.
+
+Every run only reads the schedules that are due, through range scans on the
+(status, departure_time) and (status, arrival_time) indexes, and moves them in
+chunks of ``LIFECYCLE_BATCH_SIZE`` with one UPDATE per chunk. Completing a
+chunk also completes its CONFIRMED tickets, cancels the RESERVED ones that were
+never confirmed and drops their seat holds, frees its seats and releases its
+vehicles in one step.
+
+Between runs, ``next_wake_up`` looks up the earliest upcoming transition and
+rounds it up to the next ``LIFECYCLE_BUCKET_SECONDS`` boundary, so a
+long-running sweeper sleeps until there is work and handles every transition
+of a time bucket in one pass.
+"""
+import logging
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .holds import get_hold_engine
+from .inventory import get_seat_inventory
+from .models import Schedule, Ticket
+from .occupancy import release_schedules
+from .tripsearch import SEARCHABLE_STATUSES, drop_trips
+from .utils import broadcast_schedule_status_update
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_size():
+    return getattr(settings, 'LIFECYCLE_BATCH_SIZE', 500)
+
+
+def _bucket_seconds():
+    return getattr(settings, 'LIFECYCLE_BUCKET_SECONDS', 60)
+
+
+def _max_sleep_seconds():
+    return getattr(settings, 'LIFECYCLE_MAX_SLEEP_SECONDS', 300)
+
+
+UNCONFIRMED_REASON = 'Journey completed before the ticket was confirmed'
+
+# (from statuses, time field, to status), applied in this order so a schedule
+# whose arrival already passed is completed without departing first
+TRANSITIONS = (
+    (('SCHEDULED', 'IN_PROGRESS'), 'arrival_time', 'COMPLETED'),
+    (('SCHEDULED',), 'departure_time', 'IN_PROGRESS'),
+)
+
+
+def next_transition_time():
+    """Return the time of the earliest pending transition, None if there is nothing left to move"""
+    times = [
+        Schedule.objects.filter(status=status).aggregate(next=Min(time_field))['next']
+        for from_statuses, time_field, to_status in TRANSITIONS
+        for status in from_statuses
+    ]
+    times = [value for value in times if value is not None]
+    return min(times) if times else None
+
+
+def next_wake_up(now=None):
+    """
+    Return when the sweeper should run next: the end of the time bucket holding
+    the earliest pending transition, at most LIFECYCLE_MAX_SLEEP_SECONDS away so
+    schedules created in the meantime are not missed.
+    """
+    now = now or timezone.now()
+    latest = now + timedelta(seconds=_max_sleep_seconds())
+    next_time = next_transition_time()
+    if next_time is None:
+        return latest
+    if next_time <= now:
+        return now
+
+    bucket = _bucket_seconds()
+    bucket_end = math.ceil(next_time.timestamp() / bucket) * bucket
+    return min(now + timedelta(seconds=bucket_end - now.timestamp()), latest)
+
+
+def _move_batch(from_statuses, time_field, to_status, now, batch_size):
+    """Move one chunk of due schedules, returns (moved schedule ids, completed tickets, expired tickets)"""
+    with transaction.atomic():
+        schedule_ids = list(
+            Schedule.objects.select_for_update(skip_locked=True).filter(
+                status__in=from_statuses,
+                **{f'{time_field}__lte': now}
+            ).order_by(time_field).values_list('pk', flat=True)[:batch_size]
+        )
+        if not schedule_ids:
+            return [], 0, 0
+
+        Schedule.objects.filter(pk__in=schedule_ids).update(status=to_status, updated_at=now)
+        if to_status not in SEARCHABLE_STATUSES:
+            drop_trips(schedule_ids)
+
+        tickets = expired = 0
+        if to_status == 'COMPLETED':
+            tickets = Ticket.objects.filter(schedule_id__in=schedule_ids, status='CONFIRMED').update(
+                status='COMPLETED',
+                updated_at=now
+            )
+            # Reservations still on hold can no longer be used, their seats are freed below
+            held_ids = list(
+                Ticket.objects.filter(schedule_id__in=schedule_ids, status='RESERVED').values_list('pk', flat=True)
+            )
+            expired = Ticket.objects.filter(pk__in=held_ids, status='RESERVED').update(
+                status='CANCELLED',
+                cancellation_time=now,
+                cancellation_reason=UNCONFIRMED_REASON,
+                hold_expires_at=None,
+                updated_at=now
+            )
+            get_seat_inventory().reset_many(schedule_ids)
+            release_schedules(schedule_ids)
+            if held_ids:
+                transaction.on_commit(lambda: _drop_holds(held_ids))
+
+        transaction.on_commit(lambda: _broadcast(schedule_ids, to_status))
+
+    return schedule_ids, tickets, expired
+
+
+def _drop_holds(ticket_ids):
+    hold_engine = get_hold_engine()
+    for ticket_id in ticket_ids:
+        hold_engine.release(ticket_id)
+
+
+def _broadcast(schedule_ids, status):
+    for schedule_id in schedule_ids:
+        broadcast_schedule_status_update(str(schedule_id), status)
+
+
+def advance_lifecycle(now=None, batch_size=None):
+    """
+    Apply every transition that is due at ``now``.
+    Returns a metrics summary of the run.
+    """
+    started_at = time.monotonic()
+    now = now or timezone.now()
+    batch_size = batch_size or _batch_size()
+
+    next_time = next_transition_time()
+    metrics = {
+        'in_progress': 0,
+        'completed': 0,
+        'tickets_completed': 0,
+        'tickets_expired': 0,
+        'batches': 0,
+        # How late the oldest transition of this run was handled
+        'lag_seconds': max((now - next_time).total_seconds(), 0) if next_time and next_time <= now else 0,
+    }
+
+    if next_time is not None and next_time <= now:
+        for from_statuses, time_field, to_status in TRANSITIONS:
+            while True:
+                schedule_ids, tickets, expired = _move_batch(from_statuses, time_field, to_status, now, batch_size)
+                if not schedule_ids:
+                    break
+                metrics['batches'] += 1
+                metrics[to_status.lower()] += len(schedule_ids)
+                metrics['tickets_completed'] += tickets
+                metrics['tickets_expired'] += expired
+
+    metrics['duration_ms'] = round((time.monotonic() - started_at) * 1000, 1)
+    if metrics['batches']:
+        logger.info(f"Journey lifecycle run: {metrics}")
+    return metrics
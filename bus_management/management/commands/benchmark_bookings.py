@@ -0,0 +1,282 @@
+import json
+import multiprocessing
+import random
+import subprocess
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from bus_management.inventory import BOOKED_STATUSES, get_booking_strategy, get_seat_inventory
+from bus_management.models import Customer, Route, Schedule, Ticket, VehicleSubtype, VehicleType
+from bus_management.utils import create_vehicle_with_seats, initialize_seat_availability
+from bus_management.views import TicketViewSet
+
+
+# Errors returned when another booking won the seat
+CONFLICT_MESSAGES = ('This seat is already booked', 'This seat is not available')
+
+ACTIVE_TICKET_STATUSES = ('RESERVED', 'CONFIRMED')
+
+
+class LockTimer:
+    """Database execute wrapper adding up the time spent in row-locking statements"""
+
+    def __init__(self):
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().upper()
+        if 'FOR UPDATE' not in statement and not statement.startswith('UPDATE'):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def book(job):
+    """
+    Send one booking request to TicketViewSet.create, returns
+    (latency seconds, lock wait seconds, outcome).
+    """
+    schedule_id, seat_id, user_id, token = job
+    request = APIRequestFactory().post(
+        '/api/tickets/', {'schedule': schedule_id, 'seat': seat_id}, format='json'
+    )
+    force_authenticate(request, user=User(pk=user_id), token=AccessToken(token, verify=False))
+    view = TicketViewSet.as_view({'post': 'create'})
+
+    timer = LockTimer()
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(timer):
+            response = view(request)
+        latency = time.perf_counter() - started
+    finally:
+        # What the request_finished signal does after a real request
+        close_old_connections()
+
+    if response.status_code == 201:
+        outcome = 'booked'
+    else:
+        error = str(response.data.get('error', '')) if isinstance(response.data, dict) else ''
+        if error in CONFLICT_MESSAGES:
+            outcome = 'conflict'
+        elif 'locked' in error:
+            outcome = 'lock_timeout'
+        else:
+            outcome = 'error'
+    return latency, timer.seconds, outcome
+
+
+def _close_connections():
+    # Forked workers must not share the parent's database connection
+    connections.close_all()
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds"""
+    if not seconds:
+        return {}
+    millis = [value * 1000 for value in seconds]
+    return {
+        'mean': round(sum(millis) / len(millis), 3),
+        'p50': round(percentile(millis, 50), 3),
+        'p95': round(percentile(millis, 95), 3),
+        'p99': round(percentile(millis, 99), 3),
+        'max': round(max(millis), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark concurrent bookings on one departure: seeds a schedule, sends booking '
+        'requests to TicketViewSet.create from many threads or processes and reports latency, '
+        'throughput, conflicts and double-booking violations as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='Number of customers sending one booking each')
+        parser.add_argument('--seats', type=int, default=35, help='Vehicle capacity of the seeded schedule')
+        parser.add_argument('--hot-seats', type=int, help='Only request the first N seats, to raise contention')
+        parser.add_argument('--workers', type=int, default=50, help='Number of concurrent threads or processes')
+        parser.add_argument('--processes', action='store_true', help='Use processes instead of threads')
+        parser.add_argument('--seed', type=int, help='Random seed for the seat choice')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data after the run')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['workers'] < 1:
+            raise CommandError('--users and --workers must be positive')
+
+        rng = random.Random(options['seed'])
+        schedule, customers = self.seed(options['users'], options['seats'])
+        try:
+            seat_ids = [str(seat.id) for seat in schedule.vehicle.seats.order_by('row_number', 'seat_group', 'position')]
+            if options['hot_seats']:
+                seat_ids = seat_ids[:options['hot_seats']]
+
+            jobs = [
+                (str(schedule.id), rng.choice(seat_ids), user.pk, token)
+                for user, token in customers
+            ]
+
+            started = time.perf_counter()
+            if options['processes']:
+                try:
+                    context = multiprocessing.get_context('fork')
+                except ValueError:
+                    raise CommandError('--processes needs a platform that supports fork')
+                _close_connections()
+                with ProcessPoolExecutor(options['workers'], mp_context=context, initializer=_close_connections) as pool:
+                    results = list(pool.map(book, jobs))
+            else:
+                with ThreadPoolExecutor(options['workers']) as pool:
+                    results = list(pool.map(book, jobs))
+            elapsed = time.perf_counter() - started
+
+            report = self.report(schedule, results, elapsed, options)
+        finally:
+            if not options['keep']:
+                self.cleanup(schedule, customers)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"{report['requests']} requests, {report['throughput_rps']} req/s, "
+                f"p99 {report['latency_ms'].get('p99')}ms, {report['violations']['total']} violation(s). "
+                f"Results written to {options['output']}"
+            ))
+        else:
+            self.stdout.write(output)
+
+    def seed(self, users, seats):
+        """Create a schedule and ``users`` customers with access tokens"""
+        tag = uuid.uuid4().hex[:8]
+        vehicle_type = VehicleType.objects.create(name=f'Benchmark {tag}')
+        subtype = VehicleSubtype.objects.create(
+            name=f'Benchmark {tag}', vehicle_type=vehicle_type, rate_per_km=2, min_price=100,
+            subtype_code=f'BENCH-{tag}'
+        )
+        vehicle = create_vehicle_with_seats(f'Benchmark {tag}', f'BENCH-{tag}', seats, subtype)
+        route = Route.objects.create(
+            name=f'Benchmark {tag}', source='Benchmark', destination=tag,
+            distance_km=100, estimated_duration_minutes=180
+        )
+        departure = timezone.now() + timedelta(days=1)
+        schedule = Schedule.objects.create(
+            vehicle=vehicle, route=route,
+            departure_time=departure, arrival_time=departure + timedelta(hours=3)
+        )
+        initialize_seat_availability(schedule)
+
+        accounts = Customer.objects.bulk_create([
+            Customer(
+                username=f'bench-{tag}-{i}', email=f'bench-{tag}-{i}@example.com',
+                first_name='Benchmark', last_name=str(i), phone_number='0000000000', password='!'
+            )
+            for i in range(users)
+        ])
+        User.objects.bulk_create([User(username=f'bench-{tag}-{i}') for i in range(users)])
+        # bulk_create does not set primary keys on every database, read the logins back
+        logins = list(User.objects.filter(username__startswith=f'bench-{tag}-').order_by('pk'))
+        customers = []
+        for login, account in zip(logins, accounts):
+            token = RefreshToken.for_user(login)
+            token['customer_id'] = str(account.id)
+            customers.append((login, str(token.access_token)))
+        return schedule, customers
+
+    def report(self, schedule, results, elapsed, options):
+        outcomes = {}
+        for _, _, outcome in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        requests = len(results)
+
+        return {
+            'config': {
+                'users': options['users'],
+                'seats': options['seats'],
+                'hot_seats': options['hot_seats'],
+                'workers': options['workers'],
+                'mode': 'processes' if options['processes'] else 'threads',
+                'database': connection.vendor,
+                'seat_inventory_backend': getattr(settings, 'SEAT_INVENTORY_BACKEND', 'rows'),
+                'booking_strategy': get_booking_strategy(),
+            },
+            'commit': self.current_commit(),
+            'requests': requests,
+            'outcomes': outcomes,
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_rps': round(requests / elapsed, 1) if elapsed else None,
+            'latency_ms': summarize([latency for latency, _, _ in results]),
+            # Time spent in row-locking statements (SELECT ... FOR UPDATE and UPDATE)
+            'lock_wait_ms': summarize([lock_wait for _, lock_wait, _ in results]),
+            'conflict_rate': round(outcomes.get('conflict', 0) / requests, 4),
+            'lock_timeout_rate': round(outcomes.get('lock_timeout', 0) / requests, 4),
+            'error_rate': round(outcomes.get('error', 0) / requests, 4),
+            'violations': self.violations(schedule),
+        }
+
+    def violations(self, schedule):
+        """Check the booked schedule for double bookings and seat/ticket/counter mismatches"""
+        active = Ticket.objects.filter(schedule=schedule, status__in=ACTIVE_TICKET_STATUSES)
+        double_booked = active.values('seat').annotate(tickets=Count('id')).filter(tickets__gt=1).count()
+
+        ticket_seats = set(str(seat_id) for seat_id in active.values_list('seat_id', flat=True))
+        taken_seats = {
+            str(seat['seat_id']) for seat in get_seat_inventory().seat_map(schedule.id)
+            if seat['status'] in BOOKED_STATUSES
+        }
+
+        schedule.refresh_from_db()
+        violations = {
+            'double_booked_seats': double_booked,
+            # Seats marked taken without an active ticket, and tickets on seats still for sale
+            'seats_without_ticket': len(taken_seats - ticket_seats),
+            'tickets_without_seat': len(ticket_seats - taken_seats),
+            'counter_drift': abs(schedule.booked_count - len(taken_seats)),
+        }
+        violations['total'] = sum(violations.values())
+        return violations
+
+    def cleanup(self, schedule, customers):
+        vehicle = schedule.vehicle
+        route = schedule.route
+        subtype = vehicle.vehicle_subtype
+        schedule.delete()
+        vehicle.delete()
+        route.delete()
+        subtype.vehicle_type.delete()
+        Customer.objects.filter(username__in=[user.username for user, _ in customers]).delete()
+        User.objects.filter(pk__in=[user.pk for user, _ in customers]).delete()
+
+    def current_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bus_management.confirmations import confirm_due_tickets
+
+
+class Command(BaseCommand):
+    help = 'Confirm RESERVED tickets of schedules that depart within AUTO_CONFIRM_WINDOW_SECONDS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep confirming until interrupted')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            result = confirm_due_tickets()
+            if result['tickets']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Confirmed {result['tickets']} ticket(s) on {result['schedules']} schedule(s)"
+                ))
+            elif not options['loop']:
+                self.stdout.write('No tickets to confirm')
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError
 from bus_management.models import Bus, Schedule, Seat, SeatAvailability
+from bus_management.booking import BookingService
 import uuid
 
 class Command(BaseCommand):
@@ -174,8 +175,8 @@ class Command(BaseCommand):
             )
             
             old_status = seat_availability.status
-            seat_availability.status = status
-            seat_availability.save()
+            # Goes through the booking service so the schedule counters and seat map follow
+            BookingService().set_seat_status(schedule_id, seat_id, status)
             
             self.stdout.write(
                 self.style.SUCCESS(f"Updated seat {seat_availability.seat.seat_number} status from {old_status} to {status}")
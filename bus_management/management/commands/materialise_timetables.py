@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bus_management.timetables import materialise_timetables
+
+
+class Command(BaseCommand):
+    help = 'Create the schedules of active timetable templates for the coming days, safe to re-run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First day to materialise (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--days', type=int, help='Number of days to materialise, defaults to TIMETABLE_HORIZON_DAYS')
+
+    def handle(self, *args, **options):
+        start_date = None
+        if options['start_date']:
+            try:
+                start_date = date.fromisoformat(options['start_date'])
+            except ValueError:
+                raise CommandError('--start-date must be a date in YYYY-MM-DD format')
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be positive')
+
+        result = materialise_timetables(start_date=start_date, days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} schedule(s), {result['existing']} already existed, "
+            f"{result['conflicts']} skipped because the vehicle is taken"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bus_management.idempotency import purge_expired_records
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses that have expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of records deleted per batch')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_records(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency record(s)'))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bus_management.inventory import BOOKED_STATUSES, get_seat_inventory
+from bus_management.models import Schedule
+from bus_management.tripsearch import refresh_seats
+
+
+class Command(BaseCommand):
+    help = 'Recompute Schedule.available_count / booked_count from the seat inventory and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='append', dest='schedules', help='Only check this schedule ID (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of schedules checked per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+
+    def handle(self, *args, **options):
+        inventory = get_seat_inventory()
+        batch_size = options['batch_size']
+        checked = repaired = 0
+        last_pk = None
+
+        while True:
+            schedules = Schedule.objects.order_by('pk')
+            if options['schedules']:
+                schedules = schedules.filter(pk__in=options['schedules'])
+            if last_pk is not None:
+                schedules = schedules.filter(pk__gt=last_pk)
+
+            with transaction.atomic():
+                # Lock the batch first so bookings that commit meanwhile apply their deltas on top of the repair
+                batch = list(
+                    schedules.select_for_update().only('pk', 'available_count', 'booked_count')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                counts = inventory.status_counts_many([schedule.pk for schedule in batch])
+                drifted = []
+                for schedule in batch:
+                    schedule_counts = counts.get(str(schedule.pk), {})
+                    available = schedule_counts.get('AVAILABLE', 0)
+                    booked = sum(schedule_counts.get(status, 0) for status in BOOKED_STATUSES)
+                    if (schedule.available_count, schedule.booked_count) != (available, booked):
+                        self.stdout.write(
+                            f'{schedule.pk}: available {schedule.available_count} -> {available}, '
+                            f'booked {schedule.booked_count} -> {booked}'
+                        )
+                        schedule.available_count = available
+                        schedule.booked_count = booked
+                        drifted.append(schedule)
+
+                if drifted and not options['dry_run']:
+                    Schedule.objects.bulk_update(drifted, ['available_count', 'booked_count'])
+                    refresh_seats([schedule.pk for schedule in drifted])
+
+            checked += len(batch)
+            repaired += len(drifted)
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} schedules. {verb} {repaired} with drifted seat counts'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bus_management.lifecycle import advance_lifecycle, next_wake_up
+
+
+class Command(BaseCommand):
+    help = 'Move schedules to IN_PROGRESS at departure and to COMPLETED at arrival'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, sleeping until the next transition is due')
+        parser.add_argument('--batch-size', type=int, help='Maximum number of schedules moved per update')
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = advance_lifecycle(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"{metrics['in_progress']} departed, {metrics['completed']} completed, "
+                f"{metrics['tickets_completed']} ticket(s) completed, {metrics['tickets_expired']} unconfirmed "
+                f"ticket(s) cancelled in {metrics['batches']} batch(es), "
+                f"lag {metrics['lag_seconds']:.0f}s, {metrics['duration_ms']}ms"
+            )
+
+            if not options['loop']:
+                break
+
+            wake_up = next_wake_up()
+            time.sleep(max((wake_up - timezone.now()).total_seconds(), 0))
@@ -9,6 +9,7 @@ from bus_management.models import (
     Ticket, SpecialReservation, SeatAvailability, BusType, VehicleType, VehicleSubtype
 )
 from bus_management.utils import initialize_seat_availability, create_bus_with_seats, create_vehicle_with_seats
+from bus_management.booking import BookingService
 
 
 class Command(BaseCommand):
@@ -344,8 +345,8 @@ class Command(BaseCommand):
             
             final_price = base_price - discount_amount
             
-            # Create the ticket
-            ticket = Ticket.objects.create(
+            # Create the ticket, the booking service moves its seat to the matching status
+            BookingService().save_ticket(Ticket(
                 customer=customer,
                 schedule=schedule,
                 seat=seat,
@@ -354,12 +355,7 @@ class Command(BaseCommand):
                 final_price=final_price,
                 offer=offer,
                 status=random.choice(['RESERVED', 'CONFIRMED', 'CANCELLED', 'COMPLETED'])
-            )
-            
-            # Update seat availability
-            if ticket.status in ['RESERVED', 'CONFIRMED']:
-                seat_availability.status = 'BOOKED'
-                seat_availability.save()
+            ))
         
         self.stdout.write(self.style.SUCCESS('Created sample tickets'))
     
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bus_management.holds import get_hold_engine
+
+
+class Command(BaseCommand):
+    help = 'Release seats held by RESERVED tickets whose hold has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping until interrupted')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between sweeps with --loop')
+        parser.add_argument('--batch-size', type=int, help='Maximum number of holds released per batch')
+
+    def handle(self, *args, **options):
+        engine = get_hold_engine()
+        if options['batch_size']:
+            engine.batch_size = options['batch_size']
+
+        while True:
+            # The in-process index only knows holds made by this process, rebuild it from the database
+            if engine.store.in_process:
+                engine.load()
+
+            released = engine.sweep_expired()
+            if released:
+                self.stdout.write(self.style.SUCCESS(f'Released {released} expired seat hold(s)'))
+            elif not options['loop']:
+                self.stdout.write('No expired seat holds')
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0005_route_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('layout', models.JSONField(default=list)),
+                ('states', models.BinaryField(default=bytes)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('schedule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_inventory', to='bus_management.schedule')),
+            ],
+            options={
+                'verbose_name': 'Seat Inventory',
+                'verbose_name_plural': 'Seat Inventories',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0006_seatinventory'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='ticket',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['RESERVED', 'CONFIRMED'])), fields=('schedule', 'seat'), name='unique_active_ticket_per_seat'),
+        ),
+    ]
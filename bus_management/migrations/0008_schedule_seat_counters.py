@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_seat_counters(apps, schema_editor):
+    """Fill the new counters from the existing SeatAvailability rows"""
+    Schedule = apps.get_model('bus_management', 'Schedule')
+    SeatAvailability = apps.get_model('bus_management', 'SeatAvailability')
+
+    counts = SeatAvailability.objects.values('schedule_id').annotate(
+        available=Count('id', filter=Q(status='AVAILABLE')),
+        booked=Count('id', filter=Q(status__in=['RESERVED', 'BOOKED']))
+    ).order_by()
+    for row in counts:
+        Schedule.objects.filter(pk=row['schedule_id']).update(
+            available_count=row['available'],
+            booked_count=row['booked']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0007_ticket_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='available_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='booked_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_seat_counters, migrations.RunPython.noop),
+    ]
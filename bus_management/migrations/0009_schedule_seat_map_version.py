@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0008_schedule_seat_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='seat_map_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
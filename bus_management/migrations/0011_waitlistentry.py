@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0010_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('priority', models.PositiveSmallIntegerField(default=0, help_text='Higher priority entries are promoted first')),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('PROMOTED', 'Promoted'), ('CANCELLED', 'Cancelled')], default='WAITING', max_length=20)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='bus_management.customer')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='bus_management.schedule')),
+                ('ticket', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='bus_management.ticket')),
+            ],
+            options={
+                'verbose_name': 'Waitlist Entry',
+                'verbose_name_plural': 'Waitlist Entries',
+                'indexes': [models.Index(fields=['schedule', 'status', '-priority', 'created_at'], name='waitlist_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='waitlistentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'WAITING')), fields=('schedule', 'customer'), name='unique_waiting_entry_per_customer'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0011_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='refund_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
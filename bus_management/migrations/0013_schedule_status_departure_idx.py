@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0012_ticket_refund_amount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['status', 'departure_time'], name='schedule_status_departure_idx'),
+        ),
+    ]
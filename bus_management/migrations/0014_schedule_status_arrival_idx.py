@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0013_schedule_status_departure_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['status', 'arrival_time'], name='schedule_status_arrival_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def fill_occupancies(apps, schema_editor):
+    """Index the schedules and special reservations that currently hold a vehicle"""
+    Schedule = apps.get_model('bus_management', 'Schedule')
+    SpecialReservation = apps.get_model('bus_management', 'SpecialReservation')
+    VehicleOccupancy = apps.get_model('bus_management', 'VehicleOccupancy')
+
+    VehicleOccupancy.objects.bulk_create([
+        VehicleOccupancy(
+            vehicle_id=schedule.vehicle_id,
+            start_time=schedule.departure_time,
+            end_time=schedule.arrival_time,
+            schedule_id=schedule.pk
+        )
+        for schedule in Schedule.objects.filter(status__in=['SCHEDULED', 'DELAYED', 'IN_PROGRESS']).iterator()
+    ], batch_size=500)
+    VehicleOccupancy.objects.bulk_create([
+        VehicleOccupancy(
+            vehicle_id=reservation.vehicle_id,
+            start_time=reservation.departure_time,
+            end_time=(
+                reservation.return_time
+                if reservation.is_round_trip and reservation.return_time
+                else reservation.estimated_arrival_time
+            ),
+            special_reservation_id=reservation.pk
+        )
+        for reservation in SpecialReservation.objects.filter(status__in=['REQUESTED', 'APPROVED']).iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0014_schedule_status_arrival_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleOccupancy',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('schedule', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='bus_management.schedule')),
+                ('special_reservation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='bus_management.specialreservation')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancies', to='bus_management.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Vehicle Occupancy',
+                'verbose_name_plural': 'Vehicle Occupancies',
+                'indexes': [models.Index(fields=['vehicle', 'start_time', 'end_time'], name='occupancy_vehicle_window_idx')],
+            },
+        ),
+        migrations.RunPython(fill_occupancies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations
+
+
+CONSTRAINT = 'occupancy_no_overlap'
+TABLE = 'bus_management_vehicleoccupancy'
+
+# SQLite runs one writer at a time, so checking for an overlapping row before
+# each write is as safe as the PostgreSQL constraint
+SQLITE_TRIGGER = f"""
+CREATE TRIGGER {CONSTRAINT}_{{event}}
+BEFORE {{event}} ON {TABLE}
+WHEN EXISTS (
+    SELECT 1 FROM {TABLE}
+    WHERE vehicle_id = NEW.vehicle_id
+      AND id != NEW.id
+      AND start_time < NEW.end_time
+      AND end_time > NEW.start_time
+)
+BEGIN
+    SELECT RAISE(ABORT, '{CONSTRAINT}: vehicle is already taken during this time');
+END
+"""
+
+
+def check_overlaps(apps):
+    """
+    Drop the occupancies of records that no longer hold their vehicle, then
+    stop with the list of the remaining overlaps: the constraint cannot be added
+    while they exist, and which trip keeps the vehicle is for a person to decide.
+    """
+    VehicleOccupancy = apps.get_model('bus_management', 'VehicleOccupancy')
+    VehicleOccupancy.objects.filter(schedule__isnull=False).exclude(
+        schedule__status__in=['SCHEDULED', 'DELAYED', 'IN_PROGRESS']
+    ).delete()
+    VehicleOccupancy.objects.filter(special_reservation__isnull=False).exclude(
+        special_reservation__status__in=['REQUESTED', 'APPROVED']
+    ).delete()
+
+    def describe(occupancy):
+        if occupancy.schedule_id:
+            return f'schedule {occupancy.schedule_id}'
+        return f'special reservation {occupancy.special_reservation_id}'
+
+    overlaps = []
+    vehicle_id, latest = None, None
+    # In start order, a trip overlaps the one ending last among those before it on the same vehicle
+    for occupancy in VehicleOccupancy.objects.order_by('vehicle_id', 'start_time', 'end_time').iterator():
+        if occupancy.vehicle_id != vehicle_id:
+            vehicle_id, latest = occupancy.vehicle_id, occupancy
+            continue
+        if occupancy.start_time < latest.end_time:
+            overlaps.append(
+                f'vehicle {vehicle_id}: {describe(latest)} and {describe(occupancy)} '
+                f'overlap from {occupancy.start_time.isoformat()}'
+            )
+        if occupancy.end_time > latest.end_time:
+            latest = occupancy
+    if overlaps:
+        raise RuntimeError(
+            'These trips share a vehicle at the same time, reassign or cancel one of each pair '
+            'and run the migration again:\n' + '\n'.join(overlaps)
+        )
+
+
+def add_constraint(apps, schema_editor):
+    check_overlaps(apps)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # btree_gist provides the = operator on vehicle_id inside a GiST index
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        schema_editor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {CONSTRAINT} EXCLUDE USING gist "
+            f"(vehicle_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)"
+        )
+    elif vendor == 'sqlite':
+        for event in ('INSERT', 'UPDATE'):
+            schema_editor.execute(SQLITE_TRIGGER.format(event=event))
+
+
+def remove_constraint(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {CONSTRAINT}')
+    elif vendor == 'sqlite':
+        for event in ('INSERT', 'UPDATE'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {CONSTRAINT}_{event}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0015_vehicleoccupancy'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_constraint, remove_constraint),
+    ]
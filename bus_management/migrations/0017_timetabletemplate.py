@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0016_occupancy_no_overlap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableTemplate',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('departure_time', models.TimeField(help_text='Local departure time')),
+                ('days_of_week', models.CharField(default='0,1,2,3,4,5,6', help_text='Comma-separated days the trip runs, 0=Monday to 6=Sunday', max_length=20)),
+                ('valid_from', models.DateField()),
+                ('valid_until', models.DateField(blank=True, help_text='Leave empty to run until further notice', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Timetable Template',
+                'verbose_name_plural': 'Timetable Templates',
+            },
+        ),
+        migrations.AddField(
+            model_name='timetabletemplate',
+            name='route',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timetables', to='bus_management.route'),
+        ),
+        migrations.AddField(
+            model_name='timetabletemplate',
+            name='vehicle',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timetables', to='bus_management.vehicle'),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='timetable',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='schedules', to='bus_management.timetabletemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='schedule',
+            constraint=models.UniqueConstraint(fields=('timetable', 'departure_time'), name='schedule_timetable_departure_uniq'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import unicodedata
+
+from django.utils import timezone
+
+
+TABLE = 'bus_management_tripsearchentry'
+
+
+def normalise_place(name):
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+def fill_entries(apps, schema_editor):
+    """Index the schedules that can currently be booked"""
+    Schedule = apps.get_model('bus_management', 'Schedule')
+    TripSearchEntry = apps.get_model('bus_management', 'TripSearchEntry')
+
+    TripSearchEntry.objects.bulk_create([
+        TripSearchEntry(
+            schedule_id=schedule.pk,
+            route_id=schedule.route_id,
+            origin=normalise_place(schedule.route.source),
+            destination=normalise_place(schedule.route.destination),
+            origin_name=schedule.route.source,
+            destination_name=schedule.route.destination,
+            departure_date=timezone.localdate(schedule.departure_time),
+            departure_time=schedule.departure_time,
+            arrival_time=schedule.arrival_time,
+            seats_left=schedule.available_count,
+            price=schedule.base_price
+        )
+        for schedule in Schedule.objects.filter(status='SCHEDULED').select_related('route').iterator()
+    ], batch_size=500)
+
+
+def add_trigram_indexes(apps, schema_editor):
+    # Substring searches (LIKE '%...%') on PostgreSQL, other databases scan
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in ('origin', 'destination'):
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS trip_search_{column}_trgm ON {TABLE} USING gin ({column} gin_trgm_ops)'
+            )
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for column in ('origin', 'destination'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS trip_search_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0017_timetabletemplate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSearchEntry',
+            fields=[
+                ('schedule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='bus_management.schedule')),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('origin_name', models.CharField(max_length=100)),
+                ('destination_name', models.CharField(max_length=100)),
+                ('departure_date', models.DateField()),
+                ('departure_time', models.DateTimeField()),
+                ('arrival_time', models.DateTimeField()),
+                ('seats_left', models.IntegerField(default=0)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='bus_management.route')),
+            ],
+            options={
+                'verbose_name': 'Trip Search Entry',
+                'verbose_name_plural': 'Trip Search Entries',
+                'indexes': [models.Index(fields=['origin', 'destination', 'departure_date', 'departure_time'], name='trip_search_idx')],
+            },
+        ),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+        migrations.RunPython(fill_entries, migrations.RunPython.noop),
+    ]
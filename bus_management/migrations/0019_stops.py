@@ -0,0 +1,120 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import unicodedata
+import uuid
+from collections import Counter
+
+
+def normalise_place(name):
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+def deduplicate_places(apps, schema_editor):
+    """
+    Create one stop per route place name, spellings that only differ by case,
+    accents or spaces being the same place, and point routes at them. The most
+    used spelling becomes the canonical name. Reservations are linked to the
+    stops naming the same place, their text is kept.
+    """
+    Route = apps.get_model('bus_management', 'Route')
+    SpecialReservation = apps.get_model('bus_management', 'SpecialReservation')
+    Stop = apps.get_model('bus_management', 'Stop')
+    TripSearchEntry = apps.get_model('bus_management', 'TripSearchEntry')
+
+    spellings = {}
+    for source, destination in Route.objects.values_list('source', 'destination').iterator():
+        for name in (source, destination):
+            normalised = normalise_place(name)
+            if normalised:
+                spellings.setdefault(normalised, Counter())[name] += 1
+
+    for normalised, counts in spellings.items():
+        name = min(counts.items(), key=lambda item: (-item[1], item[0]))[0]
+        stop = Stop.objects.create(name=' '.join(name.split()), normalised_name=normalised)
+        for spelling in counts:
+            Route.objects.filter(source=spelling).update(source=stop.name, origin_stop=stop)
+            Route.objects.filter(destination=spelling).update(destination=stop.name, destination_stop=stop)
+            TripSearchEntry.objects.filter(origin_name=spelling).update(origin_name=stop.name)
+            TripSearchEntry.objects.filter(destination_name=spelling).update(destination_name=stop.name)
+
+    stops = dict(Stop.objects.values_list('normalised_name', 'pk'))
+    reservations = SpecialReservation.objects.values_list('pk', 'source', 'destination')
+    for pk, source, destination in reservations.iterator():
+        source_stop, destination_stop = stops.get(normalise_place(source)), stops.get(normalise_place(destination))
+        if source_stop or destination_stop:
+            SpecialReservation.objects.filter(pk=pk).update(
+                source_stop_id=source_stop, destination_stop_id=destination_stop
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0018_tripsearchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stop',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('normalised_name', models.CharField(editable=False, max_length=100, unique=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stop',
+                'verbose_name_plural': 'Stops',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StopAlias',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('normalised_name', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Stop Alias',
+                'verbose_name_plural': 'Stop Aliases',
+            },
+        ),
+        migrations.AddField(
+            model_name='stopalias',
+            name='stop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='bus_management.stop'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='destination_stop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='arriving_routes', to='bus_management.stop'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='origin_stop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='departing_routes', to='bus_management.stop'),
+        ),
+        migrations.AddField(
+            model_name='specialreservation',
+            name='destination_stop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations_to', to='bus_management.stop'),
+        ),
+        migrations.AddField(
+            model_name='specialreservation',
+            name='source_stop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations_from', to='bus_management.stop'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['origin_stop', 'destination_stop'], name='route_stops_idx'),
+        ),
+        migrations.RunPython(deduplicate_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bus_management', '0019_stops'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='schedule',
+            name='schedule_status_departure_idx',
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['status', 'departure_time', 'id'], name='schedule_status_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='specialreservation',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='reservation_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['customer', 'booking_time', 'id'], name='ticket_customer_booking_idx'),
+        ),
+    ]
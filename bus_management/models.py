@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
 from django.contrib.auth.hashers import make_password, check_password
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 class VehicleType(models.Model):
@@ -107,7 +108,7 @@ class Vehicle(models.Model):
         back_row_seats = 5 if self.has_back_row else 0
         return regular_seats + back_row_seats
     
-    def is_available(self, start_time, end_time, exclude_reservation_id=None):
+    def is_available(self, start_time, end_time, exclude_reservation_id=None, exclude_schedule_id=None):
         """
         Check if the vehicle is available during the specified time period
         
@@ -116,6 +117,8 @@ class Vehicle(models.Model):
             end_time: Datetime for the end of the period to check
             exclude_reservation_id: Optional ID of a reservation to exclude from the check
                                     (useful when updating an existing reservation)
+            exclude_schedule_id: Optional ID of a schedule to exclude from the check
+                                 (useful when updating an existing schedule)
         
         Returns:
             tuple: (is_available, conflicting_item, conflict_type)
@@ -126,42 +129,16 @@ class Vehicle(models.Model):
         if self.status in ['MAINTENANCE', 'INACTIVE']:
             return False, None, 'vehicle_status'
         
-        # Check for conflicts with regular schedules
-        from django.db.models import Q
+        # One overlap query on the occupancy index (see bus_management/occupancy.py)
+        from .occupancy import find_conflict
         
-        # Schedule conflicts occur if:
-        # 1. The schedule's departure time is between our start and end times, OR
-        # 2. The schedule's arrival time is between our start and end times, OR
-        # 3. Our start time is between the schedule's departure and arrival times
-        schedule_conflicts = self.schedules.filter(
-            Q(status__in=['SCHEDULED', 'DELAYED', 'IN_PROGRESS']) &
-            (
-                (Q(departure_time__gte=start_time) & Q(departure_time__lt=end_time)) |
-                (Q(arrival_time__gt=start_time) & Q(arrival_time__lte=end_time)) |
-                (Q(departure_time__lte=start_time) & Q(arrival_time__gte=end_time))
-            )
+        conflict = find_conflict(
+            self, start_time, end_time,
+            exclude_schedule_id=exclude_schedule_id,
+            exclude_reservation_id=exclude_reservation_id
         )
-        
-        if schedule_conflicts.exists():
-            return False, schedule_conflicts.first(), 'schedule'
-        
-        # Check for conflicts with special reservations
-        special_reservation_query = Q(
-            status__in=['REQUESTED', 'APPROVED', 'IN_PROGRESS']
-        ) & (
-            (Q(departure_time__gte=start_time) & Q(departure_time__lt=end_time)) |
-            (Q(estimated_arrival_time__gt=start_time) & Q(estimated_arrival_time__lte=end_time)) |
-            (Q(departure_time__lte=start_time) & Q(estimated_arrival_time__gte=end_time))
-        )
-        
-        # Exclude the current reservation if provided
-        if exclude_reservation_id:
-            special_reservation_query &= ~Q(id=exclude_reservation_id)
-            
-        special_conflicts = self.special_reservations.filter(special_reservation_query)
-        
-        if special_conflicts.exists():
-            return False, special_conflicts.first(), 'special_reservation'
+        if conflict:
+            return False, conflict.source, conflict.conflict_type
             
         return True, None, None
     
@@ -173,12 +150,74 @@ class Vehicle(models.Model):
         verbose_name_plural = 'Vehicles'
         ordering = ['name']
 
+class Stop(models.Model):
+    """Model representing a place served by routes, with its canonical name and coordinates."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100)
+    # Lower case name without accents and repeated spaces, set on save (see bus_management/stops.py)
+    normalised_name = models.CharField(max_length=100, unique=True, editable=False)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def has_coordinates(self):
+        return self.latitude is not None and self.longitude is not None
+    
+    def distance_km_to(self, other):
+        """Great-circle distance to another stop in km, None without coordinates"""
+        from .stops import haversine_km
+        if not (self.has_coordinates and other.has_coordinates):
+            return None
+        return haversine_km(self.latitude, self.longitude, other.latitude, other.longitude)
+    
+    def save(self, *args, **kwargs):
+        from .stops import normalise_place
+        self.name = ' '.join(self.name.split())
+        self.normalised_name = normalise_place(self.name)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return self.name
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Stop'
+        verbose_name_plural = 'Stops'
+
+class StopAlias(models.Model):
+    """Another spelling or name of a stop (e.g. KTM for Kathmandu)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name='aliases')
+    name = models.CharField(max_length=100)
+    normalised_name = models.CharField(max_length=100, unique=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        from .stops import normalise_place
+        self.normalised_name = normalise_place(self.name)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.name} ({self.stop})"
+    
+    class Meta:
+        verbose_name = 'Stop Alias'
+        verbose_name_plural = 'Stop Aliases'
+
 class Route(models.Model):
     """Model representing a vehicle route."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
     source = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    # Set from source and destination on save (see bus_management/stops.py)
+    origin_stop = models.ForeignKey(
+        Stop, on_delete=models.PROTECT, null=True, blank=True, related_name='departing_routes'
+    )
+    destination_stop = models.ForeignKey(
+        Stop, on_delete=models.PROTECT, null=True, blank=True, related_name='arriving_routes'
+    )
     distance_km = models.DecimalField(max_digits=8, decimal_places=2)
     estimated_duration_minutes = models.PositiveIntegerField()
     is_active = models.BooleanField(default=True)
@@ -189,9 +228,61 @@ class Route(models.Model):
         return f"{self.source} to {self.destination}"
 
     class Meta:
+        indexes = [
+            models.Index(fields=['origin_stop', 'destination_stop'], name='route_stops_idx'),
+        ]
         verbose_name = 'Route'
         verbose_name_plural = 'Routes'
 
+class TimetableTemplate(models.Model):
+    """Recurring departure of a vehicle on a route, materialised into schedules ahead of time."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100, blank=True)
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='timetables')
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='timetables')
+    
+    departure_time = models.TimeField(help_text="Local departure time")
+    days_of_week = models.CharField(
+        max_length=20, default='0,1,2,3,4,5,6',
+        help_text="Comma-separated days the trip runs, 0=Monday to 6=Sunday"
+    )
+    valid_from = models.DateField()
+    valid_until = models.DateField(null=True, blank=True, help_text="Leave empty to run until further notice")
+    is_active = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def weekdays(self):
+        """Days the trip runs, as a set of date.weekday() values"""
+        return {int(day) for day in self.days_of_week.split(',') if day.strip()}
+    
+    def runs_on(self, day):
+        """Whether the trip runs on a date"""
+        if day < self.valid_from or (self.valid_until and day > self.valid_until):
+            return False
+        return day.weekday() in self.weekdays
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        try:
+            weekdays = self.weekdays
+        except ValueError:
+            weekdays = None
+        if not weekdays or not weekdays <= set(range(7)):
+            raise ValidationError({'days_of_week': "Use comma-separated numbers from 0 (Monday) to 6 (Sunday)"})
+        if self.valid_until and self.valid_until < self.valid_from:
+            raise ValidationError({'valid_until': "Must not be before valid_from"})
+    
+    def __str__(self):
+        return self.name or f"{self.route} at {self.departure_time.strftime('%H:%M')} ({self.vehicle.name})"
+    
+    class Meta:
+        verbose_name = 'Timetable Template'
+        verbose_name_plural = 'Timetable Templates'
+
+
 class Schedule(models.Model):
     """Model representing a scheduled journey for a vehicle on a route."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -213,17 +304,34 @@ class Schedule(models.Model):
     
     base_price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    # Set on schedules generated from a timetable (see bus_management/timetables.py)
+    timetable = models.ForeignKey(
+        'TimetableTemplate', on_delete=models.SET_NULL, null=True, blank=True, related_name='schedules'
+    )
+    
+    # Seat load, kept up to date by the seat inventory (see bus_management/inventory.py)
+    available_count = models.IntegerField(default=0, editable=False)
+    booked_count = models.IntegerField(default=0, editable=False)
+    # Bumped on every seat change, identifies seat map snapshots (see bus_management/seatmaps.py)
+    seat_map_version = models.PositiveBigIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    COUNTER_FIELDS = ('available_count', 'booked_count', 'seat_map_version')
+    
     def calculate_base_price(self):
         """Calculate base price based on distance and rate_per_km"""
-        vehicle_subtype = self.vehicle.vehicle_subtype
-        if not vehicle_subtype or not self.route:
+        return self.price_for(self.route, self.vehicle.vehicle_subtype)
+    
+    @staticmethod
+    def price_for(route, vehicle_subtype):
+        """Base price of a trip on a route with a vehicle subtype"""
+        if not vehicle_subtype or not route:
             return 0
         
         # Base calculation: Distance * Rate per km
-        calculated_price = self.route.distance_km * vehicle_subtype.rate_per_km
+        calculated_price = route.distance_km * vehicle_subtype.rate_per_km
         
         # Ensure minimum price is respected
         return max(calculated_price, vehicle_subtype.min_price)
@@ -231,11 +339,32 @@ class Schedule(models.Model):
     def save(self, *args, **kwargs):
         """Auto-set base price before saving"""
         self.base_price = self.calculate_base_price()
-        super().save(*args, **kwargs)
+        
+        # The seat counters are changed with F() updates while bookings happen,
+        # never write a possibly stale copy back when saving an existing schedule
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        # The post_save signal writes the vehicle occupancy row, which the database
+        # refuses when it overlaps another trip: keep both writes in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     def __str__(self):
         return f"{self.vehicle.name} - {self.route.source} to {self.route.destination} on {self.departure_time.strftime('%Y-%m-%d %H:%M')}"
     
     class Meta:
+        indexes = [
+            # Time-window scans of the confirmation and lifecycle jobs, and keyset
+            # pages of upcoming schedules (see bus_management/pagination.py)
+            models.Index(fields=['status', 'departure_time', 'id'], name='schedule_status_departure_idx'),
+            models.Index(fields=['status', 'arrival_time'], name='schedule_status_arrival_idx'),
+        ]
+        constraints = [
+            # A timetable departs once per departure time, makes materialisation idempotent
+            models.UniqueConstraint(fields=['timetable', 'departure_time'], name='schedule_timetable_departure_uniq'),
+        ]
         verbose_name = 'Schedule'
         verbose_name_plural = 'Schedules'
 
@@ -392,12 +521,28 @@ class Ticket(models.Model):
     booking_time = models.DateTimeField(auto_now_add=True)
     cancellation_time = models.DateTimeField(null=True, blank=True)
     cancellation_reason = models.TextField(null=True, blank=True)
+    # Amount owed back to the customer when a paid ticket is cancelled by the operator
+    refund_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    
+    # When a RESERVED ticket's seat hold runs out (see bus_management/holds.py)
+    hold_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ('schedule', 'seat')
+        indexes = [
+            # Keyset pages of a customer's tickets (see bus_management/pagination.py)
+            models.Index(fields=['customer', 'booking_time', 'id'], name='ticket_customer_booking_idx'),
+        ]
+        # Only one active ticket per seat, cancelled tickets don't block re-booking
+        constraints = [
+            models.UniqueConstraint(
+                fields=['schedule', 'seat'],
+                condition=models.Q(status__in=['RESERVED', 'CONFIRMED']),
+                name='unique_active_ticket_per_seat'
+            ),
+        ]
         verbose_name = 'Ticket'
         verbose_name_plural = 'Tickets'
     
@@ -413,6 +558,13 @@ class SpecialReservation(models.Model):
     # Custom journey details
     source = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    # Set from source and destination on save (see bus_management/stops.py)
+    source_stop = models.ForeignKey(
+        Stop, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations_from'
+    )
+    destination_stop = models.ForeignKey(
+        Stop, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations_to'
+    )
     distance_km = models.DecimalField(max_digits=8, decimal_places=2)
     
     # Duration fields
@@ -462,6 +614,10 @@ class SpecialReservation(models.Model):
         return f"Special Reservation: {self.source} to {self.destination} on {self.departure_time.strftime('%Y-%m-%d %H:%M')}"
     
     class Meta:
+        indexes = [
+            # Keyset pages of a customer's reservations (see bus_management/pagination.py)
+            models.Index(fields=['customer', 'created_at', 'id'], name='reservation_customer_idx'),
+        ]
         verbose_name = 'Special Reservation'
         verbose_name_plural = 'Special Reservations'
         
@@ -515,7 +671,88 @@ class SpecialReservation(models.Model):
     def save(self, *args, **kwargs):
         """Update pricing before saving"""
         self.final_price = self.calculate_price()
-        super().save(*args, **kwargs)
+        # Saved together with its vehicle occupancy row, see Schedule.save
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class VehicleOccupancy(models.Model):
+    """
+    Time window during which a vehicle is taken, by a schedule or a special reservation.
+    Kept in step with schedules and reservations by bus_management/occupancy.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='occupancies')
+
+    # Half-open window [start_time, end_time)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+
+    # Exactly one of these is set
+    schedule = models.OneToOneField(
+        Schedule, on_delete=models.CASCADE, null=True, blank=True, related_name='occupancy'
+    )
+    special_reservation = models.OneToOneField(
+        SpecialReservation, on_delete=models.CASCADE, null=True, blank=True, related_name='occupancy'
+    )
+
+    @property
+    def conflict_type(self):
+        return 'schedule' if self.schedule_id else 'special_reservation'
+
+    @property
+    def source(self):
+        """The schedule or special reservation taking the vehicle"""
+        return self.schedule if self.schedule_id else self.special_reservation
+
+    def __str__(self):
+        return f"{self.vehicle} busy {self.start_time:%Y-%m-%d %H:%M} to {self.end_time:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        indexes = [
+            # Overlap checks: vehicle equality, then a range scan on start_time
+            models.Index(fields=['vehicle', 'start_time', 'end_time'], name='occupancy_vehicle_window_idx'),
+        ]
+        verbose_name = 'Vehicle Occupancy'
+        verbose_name_plural = 'Vehicle Occupancies'
+
+
+class TripSearchEntry(models.Model):
+    """
+    Denormalised copy of a bookable schedule for trip searches by origin,
+    destination and date. Kept in step with schedules by bus_management/tripsearch.py.
+    """
+    schedule = models.OneToOneField(
+        Schedule, on_delete=models.CASCADE, primary_key=True, related_name='search_entry'
+    )
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='search_entries')
+
+    # Lower case, accents and repeated spaces removed (see tripsearch.normalise_place)
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    # As written on the route, for display
+    origin_name = models.CharField(max_length=100)
+    destination_name = models.CharField(max_length=100)
+
+    # Local date of the departure
+    departure_date = models.DateField()
+    departure_time = models.DateTimeField()
+    arrival_time = models.DateTimeField()
+
+    seats_left = models.IntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.origin_name} to {self.destination_name} on {self.departure_time:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        indexes = [
+            # Origin/destination prefix and date searches, prefixes are matched as
+            # ranges so any database serves them from this index
+            models.Index(fields=['origin', 'destination', 'departure_date', 'departure_time'], name='trip_search_idx'),
+        ]
+        verbose_name = 'Trip Search Entry'
+        verbose_name_plural = 'Trip Search Entries'
+
 
 class SeatAvailability(models.Model):
     """Model tracking the real-time availability of seats for specific schedules."""
@@ -543,6 +780,103 @@ class SeatAvailability(models.Model):
     def __str__(self):
         return f"{self.schedule} - Seat {self.seat.seat_number} ({self.status})"
 
+class SeatInventory(models.Model):
+    """
+    Compact seat inventory for a schedule.
+    Stores the state of every seat as one byte in a single row, indexed by the
+    seat's position in the vehicle layout, instead of one SeatAvailability row per seat.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE, related_name='seat_inventory')
+
+    # Snapshot of the vehicle layout: [seat_id, seat_number, seat_type] per seat index
+    layout = models.JSONField(default=list)
+
+    # One status code per seat index (see bus_management.inventory.STATUS_CODES)
+    states = models.BinaryField(default=bytes)
+
+    # Incremented on every state change, used for compare-and-swap updates
+    version = models.PositiveBigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Seat Inventory'
+        verbose_name_plural = 'Seat Inventories'
+
+    def __str__(self):
+        return f"{self.schedule} - {len(self.layout)} seats (v{self.version})"
+
+class WaitlistEntry(models.Model):
+    """
+    A customer waiting for a seat on a sold-out schedule.
+    Entries are served by priority (highest first), then first come, first served.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='waitlist_entries')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='waitlist_entries')
+    priority = models.PositiveSmallIntegerField(default=0, help_text="Higher priority entries are promoted first")
+    
+    STATUS_CHOICES = [
+        ('WAITING', 'Waiting'),
+        ('PROMOTED', 'Promoted'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='WAITING')
+    
+    # The ticket reserved for the customer when the entry was promoted
+    ticket = models.OneToOneField(Ticket, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry')
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['schedule', 'status', '-priority', 'created_at'], name='waitlist_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['schedule', 'customer'],
+                condition=models.Q(status='WAITING'),
+                name='unique_waiting_entry_per_customer'
+            ),
+        ]
+        verbose_name = 'Waitlist Entry'
+        verbose_name_plural = 'Waitlist Entries'
+    
+    def __str__(self):
+        return f"{self.customer.username} waiting for {self.schedule} ({self.status})"
+
+class IdempotencyRecord(models.Model):
+    """
+    Stored outcome of a request sent with an Idempotency-Key header,
+    so a retried request gets the original response (see bus_management/idempotency.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    scope = models.CharField(max_length=50, help_text="Endpoint the key was used on")
+    owner = models.CharField(max_length=64, help_text="Customer or user that sent the request")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the request method, path and body")
+    
+    # Set once the request finished, empty while it is still being processed
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'owner', 'key'], name='unique_idempotency_key'),
+        ]
+        verbose_name = 'Idempotency Record'
+        verbose_name_plural = 'Idempotency Records'
+    
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
 class Dashboard(models.Model):
     """
     Dashboard model - just a placeholder for admin integration
@@ -0,0 +1,177 @@
+"""
+Vehicle occupancy index.
+
+Schedules and special reservations both take a vehicle for a time window.
+Instead of checking each table with three overlapping-range predicates, every
+schedule or reservation that still holds its vehicle gets one
+``VehicleOccupancy`` row with a half-open window [start_time, end_time). Two
+windows overlap when ``start_time < other_end and end_time > other_start``, a
+single range predicate served by the (vehicle, start_time, end_time) index.
+
+``available_vehicles`` answers fleet searches with one statement: a NOT EXISTS
+subquery per vehicle on that same index, capacity computed in SQL.
+
+Rows are written by the post_save signals of Schedule and SpecialReservation.
+Set-based status changes (schedule cancellation, the journey lifecycle) skip
+those signals and call ``release_schedules`` themselves.
+
+The database refuses two overlapping rows for the same vehicle (migration
+0016): a GiST exclusion constraint on PostgreSQL, insert/update triggers on
+SQLite. Saving a schedule or reservation that would double-book its vehicle
+raises an IntegrityError that ``is_overlap_error`` recognises.
+"""
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Value, When
+
+from .models import Vehicle, VehicleOccupancy
+
+
+# Schedules and reservations in these statuses hold their vehicle
+OCCUPYING_SCHEDULE_STATUSES = ('SCHEDULED', 'DELAYED', 'IN_PROGRESS')
+OCCUPYING_RESERVATION_STATUSES = ('REQUESTED', 'APPROVED')
+
+# Name of the no-overlap constraint, also the message of the SQLite triggers
+OVERLAP_CONSTRAINT = 'occupancy_no_overlap'
+
+# Vehicles in these statuses are never offered, whatever their occupancy
+UNAVAILABLE_VEHICLE_STATUSES = ('MAINTENANCE', 'INACTIVE')
+
+
+def reservation_end_time(reservation):
+    """A round trip keeps the vehicle until it returns"""
+    if reservation.is_round_trip and reservation.return_time:
+        return reservation.return_time
+    return reservation.estimated_arrival_time
+
+
+def sync_schedules(schedules):
+    """Rewrite the occupancy rows of saved schedules"""
+    schedules = list(schedules)
+    VehicleOccupancy.objects.filter(schedule__in=[schedule.pk for schedule in schedules]).delete()
+    VehicleOccupancy.objects.bulk_create([
+        VehicleOccupancy(
+            vehicle_id=schedule.vehicle_id,
+            start_time=schedule.departure_time,
+            end_time=schedule.arrival_time,
+            schedule=schedule
+        )
+        for schedule in schedules
+        if schedule.status in OCCUPYING_SCHEDULE_STATUSES
+    ])
+
+
+def sync_reservations(reservations):
+    """Rewrite the occupancy rows of saved special reservations"""
+    reservations = list(reservations)
+    VehicleOccupancy.objects.filter(
+        special_reservation__in=[reservation.pk for reservation in reservations]
+    ).delete()
+    VehicleOccupancy.objects.bulk_create([
+        VehicleOccupancy(
+            vehicle_id=reservation.vehicle_id,
+            start_time=reservation.departure_time,
+            end_time=reservation_end_time(reservation),
+            special_reservation=reservation
+        )
+        for reservation in reservations
+        if reservation.status in OCCUPYING_RESERVATION_STATUSES
+    ])
+
+
+def release_schedules(schedule_ids):
+    """Drop the occupancy rows of schedules that no longer hold their vehicle"""
+    VehicleOccupancy.objects.filter(schedule_id__in=schedule_ids).delete()
+
+
+def is_overlap_error(error):
+    """Whether a database error was raised by the no-overlap constraint"""
+    return OVERLAP_CONSTRAINT in str(error)
+
+
+def overlapping(start_time, end_time, exclude_schedule_id=None, exclude_reservation_id=None):
+    """Occupancies overlapping the half-open window [start_time, end_time)"""
+    occupancies = VehicleOccupancy.objects.filter(start_time__lt=end_time, end_time__gt=start_time)
+    if exclude_schedule_id:
+        occupancies = occupancies.exclude(schedule_id=exclude_schedule_id)
+    if exclude_reservation_id:
+        occupancies = occupancies.exclude(special_reservation_id=exclude_reservation_id)
+    return occupancies
+
+
+def find_conflict(vehicle, start_time, end_time, exclude_schedule_id=None, exclude_reservation_id=None):
+    """
+    Return the occupancy of a vehicle overlapping the window, None if the vehicle
+    is free. Schedules are reported before special reservations.
+    """
+    return overlapping(
+        start_time, end_time, exclude_schedule_id, exclude_reservation_id
+    ).filter(vehicle=vehicle).select_related(
+        'schedule__route', 'special_reservation'
+    ).order_by(F('schedule_id').asc(nulls_last=True), 'start_time').first()
+
+
+def busy_vehicle_ids(start_time, end_time, exclude_schedule_id=None, exclude_reservation_id=None):
+    """Ids of the vehicles taken during the window, as a subquery"""
+    return overlapping(
+        start_time, end_time, exclude_schedule_id, exclude_reservation_id
+    ).values('vehicle_id')
+
+
+def find_conflicts(windows):
+    """
+    Check many (vehicle_id, start_time, end_time) windows at once.
+    One indexed query reads the occupancies of all the vehicles involved between
+    the earliest start and the latest end, the windows are then matched in memory.
+
+    Returns a list with, for each window, its first overlapping occupancy or None.
+    """
+    windows = list(windows)
+    if not windows:
+        return []
+
+    occupancies = {}
+    for occupancy in VehicleOccupancy.objects.filter(
+        vehicle_id__in={vehicle_id for vehicle_id, _, _ in windows},
+        start_time__lt=max(end_time for _, _, end_time in windows),
+        end_time__gt=min(start_time for _, start_time, _ in windows)
+    ).select_related('schedule__route', 'special_reservation').order_by('start_time'):
+        occupancies.setdefault(str(occupancy.vehicle_id), []).append(occupancy)
+
+    return [
+        next((
+            occupancy for occupancy in occupancies.get(str(vehicle_id), [])
+            if occupancy.start_time < end_time and occupancy.end_time > start_time
+        ), None)
+        for vehicle_id, start_time, end_time in windows
+    ]
+
+
+def seat_capacity():
+    """SQL expression for Vehicle.capacity: two seats per row plus a back row of five"""
+    return F('row_count') * 2 + Case(
+        When(has_back_row=True, then=Value(5)),
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def available_vehicles(start_time, end_time, vehicle_type=None, vehicle_subtype=None, min_capacity=None,
+                       vehicles=None):
+    """
+    Vehicles free during the whole window [start_time, end_time), as one query.
+    Each vehicle is annotated with ``seat_capacity``. ``vehicles`` narrows the
+    search to a queryset of candidates.
+    """
+    vehicles = Vehicle.objects.all() if vehicles is None else vehicles
+    vehicles = vehicles.exclude(status__in=UNAVAILABLE_VEHICLE_STATUSES).annotate(
+        seat_capacity=seat_capacity()
+    ).filter(
+        ~Exists(overlapping(start_time, end_time).filter(vehicle=OuterRef('pk')))
+    )
+
+    if vehicle_type:
+        vehicles = vehicles.filter(vehicle_subtype__vehicle_type=vehicle_type)
+    if vehicle_subtype:
+        vehicles = vehicles.filter(vehicle_subtype=vehicle_subtype)
+    if min_capacity:
+        vehicles = vehicles.filter(seat_capacity__gte=min_capacity)
+    return vehicles
@@ -0,0 +1,111 @@
+"""
+Keyset (cursor) pagination.
+
+``PageNumberPagination`` reads page N with ``OFFSET (N - 1) * size``: the
+database still walks every skipped row, so deep pages of a large ticket table
+get slower and slower. A keyset page instead continues after the last row of
+the previous one. Rows are ordered on a (timestamp, id) pair, the id breaking
+ties between rows written in the same instant, and the next page is
+
+    WHERE (timestamp, id) < (last timestamp, last id) ORDER BY timestamp, id LIMIT size
+
+which a composite index on the same columns serves as one range scan, at the
+same cost on the first page and the thousandth.
+
+The position is handed to the client as an opaque ``cursor`` query parameter,
+the URL of the next page is returned with the results. Pages only go forward,
+a client going back keeps the cursors it was given.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(Exception):
+    """The cursor query parameter could not be decoded"""
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only pages ordered on ``ordering``: a timestamp field and the
+    primary key, both ascending or both descending (``'-booking_time', '-id'``).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.descending = ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in ordering]
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size and page_size.isdigit() and int(page_size) > 0:
+            return min(int(page_size), getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100))
+        return api_settings.PAGE_SIZE or 20
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, field) for field in self.fields]
+        position = [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        """The (timestamp, id) position in ``cursor``, as model values"""
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(position, list) or len(position) != len(self.fields):
+                raise ValueError
+            values = [
+                queryset.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, position)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor("Invalid cursor")
+        if any(value is None for value in values):
+            raise InvalidCursor("Invalid cursor")
+        return values
+
+    def after(self, queryset, values):
+        """Rows after ``values`` in the page order"""
+        (field, key), (value, key_value) = self.fields, values
+        beyond = 'lt' if self.descending else 'gt'
+        up_to = 'lte' if self.descending else 'gte'
+        # The plain bound on the timestamp lets the database start the index scan at the cursor
+        return queryset.filter(
+            Q(**{f'{field}__{up_to}': value}),
+            Q(**{f'{field}__{beyond}': value}) | Q(**{f'{key}__{beyond}': key_value})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.after(queryset, self.decode_cursor(queryset, cursor))
+
+        page_size = self.get_page_size(request)
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
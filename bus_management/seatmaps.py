@@ -0,0 +1,139 @@
+"""
+Seat-map snapshots.
+
+Every seat change bumps ``Schedule.seat_map_version`` in the same transaction
+(see ``record_status_changes`` in bus_management/inventory.py). The seat map
+of a schedule is cached together with the version it was built at, so the
+REST endpoint and every WebSocket subscriber share one snapshot and a reader
+only needs a primary-key lookup to know whether it is still current.
+
+Committed changes are also kept in a short per-schedule change log, which
+lets a client that already holds version N receive either a "not modified"
+answer or just the seats that changed since N.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .inventory import get_seat_inventory
+from .models import Schedule
+
+
+SNAPSHOT_KEY = 'bus_management:seat_map:{}'
+CHANGES_KEY = 'bus_management:seat_map_changes:{}'
+
+
+def _timeout():
+    return getattr(settings, 'SEAT_MAP_CACHE_TIMEOUT', 300)
+
+
+def _change_log_size():
+    return getattr(settings, 'SEAT_MAP_CHANGE_LOG_SIZE', 100)
+
+
+def current_version(schedule_id):
+    """Return the seat map version of a schedule, None if the schedule does not exist"""
+    return Schedule.objects.filter(pk=schedule_id).values_list('seat_map_version', flat=True).first()
+
+
+def get_seat_map(schedule_id, version=None):
+    """
+    Return the seat map snapshot of a schedule as {'version': ..., 'seats': [...]}.
+    The cached snapshot is used when it matches the current version, otherwise it
+    is rebuilt from the seat inventory. Returns None if the schedule does not exist.
+    """
+    if version is None:
+        version = current_version(schedule_id)
+        if version is None:
+            return None
+
+    key = SNAPSHOT_KEY.format(schedule_id)
+    snapshot = cache.get(key)
+    if snapshot is not None and snapshot['version'] == version:
+        return snapshot
+
+    # The version was read before the seats, so the seats are at least that recent
+    snapshot = {'version': version, 'seats': get_seat_inventory().seat_map(schedule_id)}
+    cache.set(key, snapshot, _timeout())
+    return snapshot
+
+
+def get_seat_map_changes(schedule_id, since_version, version):
+    """
+    Return {seat_id: status} for the seats that changed after ``since_version``
+    up to ``version``, or None if the change log no longer covers that range.
+    """
+    if version - since_version > _change_log_size():
+        return None
+
+    log = {entry['version']: entry['seats'] for entry in cache.get(CHANGES_KEY.format(schedule_id)) or []}
+    seats = {}
+    for entry_version in range(since_version + 1, version + 1):
+        if entry_version not in log:
+            return None
+        seats.update(log[entry_version])
+    return seats
+
+
+def sync_seat_map(schedule_id, known_version=None):
+    """
+    Return what a client holding ``known_version`` needs to catch up:
+
+    - ``{'type': 'not_modified', 'version': ...}`` when it is current
+    - ``{'type': 'delta', 'from_version': ..., 'version': ..., 'seats': [...]}``
+      with only the changed seats, when the change log covers the gap
+    - ``{'type': 'snapshot', 'version': ..., 'seats': [...]}`` otherwise
+
+    Returns None if the schedule does not exist.
+    """
+    version = current_version(schedule_id)
+    if version is None:
+        return None
+
+    if known_version is not None:
+        if known_version == version:
+            return {'type': 'not_modified', 'version': version}
+
+        if 0 <= known_version < version:
+            changes = get_seat_map_changes(schedule_id, known_version, version)
+            if changes is not None:
+                return {
+                    'type': 'delta',
+                    'from_version': known_version,
+                    'version': version,
+                    'seats': [{'seat_id': seat_id, 'status': status} for seat_id, status in changes.items()]
+                }
+
+    snapshot = get_seat_map(schedule_id, version)
+    return {'type': 'snapshot', 'version': snapshot['version'], 'seats': snapshot['seats']}
+
+
+def record_seat_map_change(schedule_id, version, seats):
+    """
+    Add a committed change ({seat_id: status} at ``version``) to the change log
+    and move the cached snapshot forward if it is exactly one version behind.
+    """
+    changes_key = CHANGES_KEY.format(schedule_id)
+    log = cache.get(changes_key) or []
+    log.append({'version': version, 'seats': seats})
+    cache.set(changes_key, log[-_change_log_size():], _timeout())
+
+    snapshot_key = SNAPSHOT_KEY.format(schedule_id)
+    snapshot = cache.get(snapshot_key)
+    if snapshot is not None and snapshot['version'] == version - 1:
+        for seat in snapshot['seats']:
+            if seat['seat_id'] in seats:
+                seat['status'] = seats[seat['seat_id']]
+        snapshot['version'] = version
+        cache.set(snapshot_key, snapshot, _timeout())
+
+
+def invalidate_seat_map(schedule_id):
+    """Drop the cached snapshot and change log of a schedule"""
+    invalidate_seat_maps([schedule_id])
+
+
+def invalidate_seat_maps(schedule_ids):
+    """Drop the cached snapshots and change logs of several schedules in one cache call"""
+    cache.delete_many([
+        key.format(schedule_id) for schedule_id in schedule_ids for key in (SNAPSHOT_KEY, CHANGES_KEY)
+    ])
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import (
     Vehicle, Route, Schedule, Seat, Customer, Offer,
-    Ticket, SpecialReservation, SeatAvailability, VehicleType, VehicleSubtype
+    Ticket, SpecialReservation, SeatAvailability, VehicleType, VehicleSubtype, WaitlistEntry,
+    TripSearchEntry, Stop
 )
 
 
@@ -31,11 +32,21 @@ class VehicleSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'capacity', 'vehicle_subtype_details')
 
 
+class StopSerializer(serializers.ModelSerializer):
+    aliases = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+    
+    class Meta:
+        model = Stop
+        fields = ('id', 'name', 'aliases', 'latitude', 'longitude', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'aliases')
+
+
 class RouteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Route
         fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        # The stops follow source and destination
+        read_only_fields = ('id', 'created_at', 'updated_at', 'origin_stop', 'destination_stop')
 
 
 class SeatSerializer(serializers.ModelSerializer):
@@ -54,7 +65,14 @@ class ScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Schedule
         fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at', 'vehicle_details', 'route_details')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'vehicle_details', 'route_details', 'timetable')
+
+
+class TripSearchEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripSearchEntry
+        fields = ('schedule', 'route', 'origin_name', 'destination_name', 'departure_date',
+                  'departure_time', 'arrival_time', 'seats_left', 'price')
 
 
 class SeatAvailabilitySerializer(serializers.ModelSerializer):
@@ -93,8 +111,26 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at', 'booking_time', 
-                           'customer_details', 'schedule_details', 'seat_details')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'booking_time', 'hold_expires_at',
+                           'refund_amount', 'customer_details', 'schedule_details', 'seat_details')
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    schedule_details = ScheduleSerializer(source='schedule', read_only=True)
+    position = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = WaitlistEntry
+        fields = '__all__'
+        read_only_fields = ('id', 'customer', 'status', 'ticket', 'promoted_at', 
+                           'created_at', 'updated_at', 'schedule_details', 'position')
+    
+    def get_position(self, obj):
+        """Position in the queue while the entry is still waiting"""
+        if obj.status != 'WAITING':
+            return None
+        from .waitlist import waitlist_position
+        return waitlist_position(obj)
 
 
 class SpecialReservationSerializer(serializers.ModelSerializer):
@@ -1,8 +1,14 @@
-from django.db.models.signals import post_save, pre_save
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Vehicle, Schedule, Seat, SeatAvailability, SpecialReservation, Ticket
-from .utils import broadcast_seat_status_update
+from .models import Route, Stop, StopAlias, Vehicle, Schedule, Seat, SeatAvailability, SeatInventory, SpecialReservation, Ticket
+from .inventory import get_seat_inventory
+from .booking import SEAT_SYNCED_FLAG, BookingService
+from .occupancy import sync_reservations, sync_schedules
+from .tripsearch import sync_route, sync_trips
+from .stops import CHANGES as STOP_CHANGES, attach_stops
 
 # Commenting out this signal as we're now handling seat creation in the admin interface
 # and utils.py to avoid conflicts
@@ -132,6 +138,61 @@ def update_vehicle_status_for_special_reservation(sender, instance, created, **k
         logger = logging.getLogger(__name__)
         logger.error(f"Error updating vehicle status for special reservation {instance.id}: {e}")
 
+@receiver(post_save, sender=Schedule)
+def update_occupancy_for_schedule(sender, instance, **kwargs):
+    """Keep the vehicle occupancy index in step with the schedule's window and status"""
+    sync_schedules([instance])
+
+@receiver(post_save, sender=SpecialReservation)
+def update_occupancy_for_special_reservation(sender, instance, **kwargs):
+    """Keep the vehicle occupancy index in step with the reservation's window and status"""
+    sync_reservations([instance])
+
+@receiver(post_save, sender=Schedule)
+def update_trip_search_for_schedule(sender, instance, **kwargs):
+    """Keep the trip search index in step with the schedule's times, price and status"""
+    sync_trips([instance])
+
+@receiver(pre_save, sender=Route)
+def attach_route_stops(sender, instance, **kwargs):
+    """Point the route at the stops named by its source and destination"""
+    attach_stops(instance, [('source', 'origin_stop'), ('destination', 'destination_stop')], create=True)
+    # Without a distance, use the straight line between the stops when both are located
+    if instance.distance_km is None and instance.origin_stop and instance.destination_stop:
+        distance = instance.origin_stop.distance_km_to(instance.destination_stop)
+        if distance is not None:
+            instance.distance_km = round(Decimal(distance), 2)
+
+@receiver(pre_save, sender=SpecialReservation)
+def attach_reservation_stops(sender, instance, **kwargs):
+    """Link the reservation to the existing stops named by its source and destination"""
+    attach_stops(instance, [('source', 'source_stop'), ('destination', 'destination_stop')])
+
+@receiver(post_save, sender=Route)
+def update_trip_search_for_route(sender, instance, created, **kwargs):
+    """Copy renamed places to the trip search entries of the route's schedules"""
+    if not created:
+        sync_route(instance)
+
+@receiver(post_save, sender=Route)
+def publish_route_stop_changes(sender, instance, **kwargs):
+    """Let the place index reload the stops of a saved route"""
+    STOP_CHANGES.record(
+        stop_id for stop_id in (instance.origin_stop_id, instance.destination_stop_id) if stop_id
+    )
+
+@receiver(post_save, sender=Stop)
+@receiver(post_delete, sender=Stop)
+def publish_stop_changes(sender, instance, **kwargs):
+    """Let the place index reload a changed stop"""
+    STOP_CHANGES.record([instance.pk])
+
+@receiver(post_save, sender=StopAlias)
+@receiver(post_delete, sender=StopAlias)
+def publish_stop_alias_changes(sender, instance, **kwargs):
+    """Let the place index reload the stop of a changed alias"""
+    STOP_CHANGES.record([instance.stop_id])
+
 @receiver(pre_save, sender=Schedule)
 def check_completed_schedule(sender, instance, **kwargs):
     """
@@ -148,41 +209,7 @@ def check_completed_schedule(sender, instance, **kwargs):
     # Check if status is being updated to COMPLETED
     if old_instance.status != 'COMPLETED' and instance.status == 'COMPLETED':
         # Reset all seat availabilities for this schedule
-        SeatAvailability.objects.filter(schedule=instance).update(status='AVAILABLE')
-
-# Automatically reset seat availability after estimated arrival time
-from django.db.models import Q
-from django.db.models.signals import post_migrate
-from django.apps import apps
-
-@receiver(post_migrate)
-def create_availability_reset_periodic_task(sender, **kwargs):
-    """
-    After migrations, set up a periodic task to reset seat availability
-    for schedules past their estimated arrival time.
-    
-    Note: This would normally use Celery or similar, but we're showing the core logic here.
-    """
-    app_config = apps.get_app_config('bus_management')
-    if sender.name == app_config.name:
-        # This would be implemented with a Celery task in a real app
-        # For demonstration, we're implementing the logic that would run periodically
-        
-        # Logic to reset availability after journey completion
-        def reset_completed_journey_availability():
-            now = timezone.now()
-            
-            # Find schedules that have passed their arrival time but aren't marked as completed
-            completed_schedules = Schedule.objects.filter(
-                Q(arrival_time__lt=now) & 
-                ~Q(status='COMPLETED') &
-                ~Q(status='CANCELLED')
-            )
-            
-            # Update their status to completed
-            for schedule in completed_schedules:
-                schedule.status = 'COMPLETED'
-                schedule.save()  # This will trigger the check_completed_schedule signal 
+        get_seat_inventory().reset(instance.pk)
 
 # New signals for ticket and seat status management
 
@@ -195,66 +222,17 @@ def update_seat_availability_on_ticket_change(sender, instance, created, **kwarg
     - When a ticket is created: Seat status -> RESERVED
     - When a ticket is confirmed: Seat status -> BOOKED
     - When a ticket is cancelled: Seat status -> AVAILABLE
+    
+    The application itself changes tickets through BookingService, this keeps
+    tickets saved directly on the model in step.
     """
+    # Tickets written through BookingService already moved their seat
+    if instance.__dict__.pop(SEAT_SYNCED_FLAG, False):
+        return
+    
     try:
-        # Get the seat availability record for this ticket
-        seat_availability = SeatAvailability.objects.get(
-            schedule=instance.schedule,
-            seat=instance.seat
-        )
-        
-        old_status = seat_availability.status
-        new_status = None
-        
-        # Set the appropriate status based on ticket status
-        if instance.status == 'RESERVED':
-            new_status = 'RESERVED'
-        elif instance.status == 'CONFIRMED':
-            new_status = 'BOOKED'
-        elif instance.status == 'CANCELLED':
-            new_status = 'AVAILABLE'
-        elif instance.status == 'COMPLETED':
-            new_status = 'AVAILABLE'
-            
-        # Only update if the status has changed
-        if new_status and old_status != new_status:
-            seat_availability.status = new_status
-            seat_availability.save()
-            
-            # Broadcast the status change via WebSockets
-            broadcast_seat_status_update(
-                str(instance.schedule.id), 
-                str(instance.seat.id), 
-                new_status
-            )
-            
-    except SeatAvailability.DoesNotExist:
+        # Only changes the seat (and broadcasts once committed) if the status is different
+        BookingService().sync_ticket_seat(instance)
+    except (SeatAvailability.DoesNotExist, SeatInventory.DoesNotExist):
         # This should not happen in normal operation
         pass
-
-# Signal to automatically confirm tickets a certain time before departure
-@receiver(pre_save, sender=Schedule)
-def auto_confirm_reserved_tickets(sender, instance, **kwargs):
-    """
-    Signal to automatically confirm tickets that are still in RESERVED status
-    when we're approaching the departure time.
-    
-    This executes when a schedule is updated, checking if we're within 30 minutes
-    of departure. If so, all RESERVED tickets are changed to CONFIRMED.
-    """
-    # Check if we're within 30 minutes of departure
-    now = timezone.now()
-    time_to_departure = instance.departure_time - now
-    
-    # If less than 30 minutes to departure and schedule is still active
-    if time_to_departure.total_seconds() < 1800 and instance.status == 'SCHEDULED':
-        # Find all reserved tickets for this schedule
-        reserved_tickets = Ticket.objects.filter(
-            schedule=instance,
-            status='RESERVED'
-        )
-        
-        # Confirm all reserved tickets
-        for ticket in reserved_tickets:
-            ticket.status = 'CONFIRMED'
-            ticket.save() 
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Stops.
+
+Routes and special reservations name their places in free text. Each distinct
+place is a ``Stop`` with a canonical name, other spellings as ``StopAlias``
+rows and optional coordinates. Names are compared on their normalised form
+(lower case, no accents, single spaces), which is unique and indexed for both
+stops and aliases.
+
+Routes are attached to their stops on save (``attach_stops``), creating the
+stops they name, so searches and filters match the typed text against the
+small stop table once and then join on the foreign keys instead of scanning
+the place names of every route with ``icontains``. Special reservations are
+typed by customers: they are only linked to stops that already exist and keep
+their text as entered.
+
+Changes to stops, their aliases and the routes using them are published in
+the ``CHANGES`` log for the in-memory place index (see
+bus_management/autocomplete.py).
+"""
+import math
+import unicodedata
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .changelog import ChangeLog
+from .models import Stop, StopAlias
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Stops whose names, aliases or routes changed
+CHANGES = ChangeLog('stops', 'PLACE_AUTOCOMPLETE')
+
+
+def normalise_place(name):
+    """Lower case place name without accents and repeated spaces"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+def prefix_range(prefix):
+    """Bounds of the strings starting with ``prefix``: [prefix, prefix with its last character incremented)"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def haversine_km(latitude, longitude, other_latitude, other_longitude):
+    """Great-circle distance between two points in km"""
+    lat1, lon1, lat2, lon2 = map(math.radians, map(float, (latitude, longitude, other_latitude, other_longitude)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def resolve_stop(name):
+    """The stop named ``name`` or known under that alias, None if there is none"""
+    normalised = normalise_place(name)
+    if not normalised:
+        return None
+    return Stop.objects.filter(
+        Q(normalised_name=normalised) | Q(aliases__normalised_name=normalised)
+    ).first()
+
+
+def stop_for(name):
+    """The stop named ``name`` or known under that alias, created if there is none"""
+    stop = resolve_stop(name)
+    if stop is not None:
+        return stop
+    try:
+        with transaction.atomic():
+            return Stop.objects.create(name=name)
+    except IntegrityError:
+        # Created concurrently under the same normalised name
+        return resolve_stop(name)
+
+
+def matching_stops(text):
+    """
+    Ids of the stops whose name or an alias contains ``text``, as a subquery.
+    The substring match scans the stop table, one row per place, rather than
+    the tables joined on the ids.
+    """
+    normalised = normalise_place(text)
+    if not normalised:
+        return Stop.objects.none().values('pk')
+    return Stop.objects.filter(
+        Q(normalised_name__contains=normalised)
+        | Q(pk__in=StopAlias.objects.filter(normalised_name__contains=normalised).values('stop_id'))
+    ).values('pk')
+
+
+def attach_stops(instance, fields, create=False):
+    """
+    Point the stop foreign keys of a route or reservation at the stops named by
+    its text fields. ``fields`` is a list of (text field, stop field) pairs.
+
+    With ``create``, missing stops are created and the text fields are rewritten
+    to the canonical names. Otherwise only existing stops are linked and the
+    text is kept as entered.
+    """
+    for text_field, stop_field in fields:
+        text = getattr(instance, text_field)
+        stop = getattr(instance, stop_field)
+        if text and not (stop and normalise_place(text) == stop.normalised_name):
+            stop = stop_for(text) if create else resolve_stop(text)
+            setattr(instance, stop_field, stop)
+        if create and stop is not None:
+            setattr(instance, text_field, stop.name)
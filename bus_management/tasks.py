@@ -0,0 +1,34 @@
+from celery import shared_task
+
+from .confirmations import confirm_due_tickets
+from .holds import get_hold_engine
+from .lifecycle import advance_lifecycle
+from .timetables import materialise_timetables
+
+
+@shared_task
+def advance_journey_lifecycle():
+    """Move schedules whose departure or arrival time passed to their next status"""
+    return advance_lifecycle()
+
+
+@shared_task
+def confirm_reserved_tickets():
+    """Confirm RESERVED tickets of schedules about to depart"""
+    return confirm_due_tickets()
+
+
+@shared_task
+def sweep_seat_holds():
+    """Release the seats of RESERVED tickets whose hold expired"""
+    engine = get_hold_engine()
+    # The in-process index only knows holds made by this worker, rebuild it from the database
+    if engine.store.in_process:
+        engine.load()
+    return engine.sweep_expired()
+
+
+@shared_task
+def materialise_timetable_schedules():
+    """Create the schedules of the timetable templates for the coming days"""
+    return materialise_timetables()
@@ -1,3 +1,1609 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .booking import BookingError, BookingService
+from .cancellations import cancel_schedules
+from .confirmations import confirm_due_tickets
+from .holds import FakeClock, InMemoryHoldStore, SeatHoldEngine
+from .inventory import BitmapSeatInventory, RowSeatInventory, SparseSeatInventory, get_seat_inventory
+from .lifecycle import advance_lifecycle, next_wake_up
+from . import timetables
+from .timetables import materialise_timetables
+from .assignment import rank_vehicles
+from .tripsearch import search_trips
+from .connections import ConnectionIndex
+from .consumers import SeatAvailabilityConsumer
+from .autocomplete import PlaceIndex
+from .occupancy import available_vehicles, find_conflicts
+from .seatmaps import get_seat_map, sync_seat_map
+from .models import (
+    Customer, IdempotencyRecord, Offer, Route, Schedule, Seat, SeatAvailability, SeatInventory, SpecialReservation, Ticket,
+    Stop, StopAlias, TimetableTemplate, TripSearchEntry, VehicleOccupancy, VehicleSubtype, VehicleType, WaitlistEntry
+)
+from .utils import create_vehicle_with_seats, initialize_seat_availability
+from .waitlist import waitlist_position
+
+
+def create_schedule(capacity=35, departure_in=timedelta(days=2)):
+    """Create a vehicle with seats, a route and a schedule with seat availability"""
+    vehicle_type = VehicleType.objects.create(name='Bus')
+    subtype = VehicleSubtype.objects.create(
+        name='Deluxe', vehicle_type=vehicle_type, rate_per_km=2, min_price=100,
+        subtype_code=f'DLX-{VehicleSubtype.objects.count()}'
+    )
+    vehicle = create_vehicle_with_seats(
+        'Bus 1', f'BA-{VehicleSubtype.objects.count()}', capacity, subtype
+    )
+    route = Route.objects.create(
+        name='Kathmandu - Pokhara', source='Kathmandu', destination='Pokhara',
+        distance_km=200, estimated_duration_minutes=420
+    )
+    departure = timezone.now() + departure_in
+    schedule = Schedule.objects.create(
+        vehicle=vehicle, route=route,
+        departure_time=departure, arrival_time=departure + timedelta(hours=7)
+    )
+    initialize_seat_availability(schedule)
+    return schedule
+
+
+class ConditionalClaimConcurrencyTest(TransactionTestCase):
+    """Many simultaneous conditional claims on the same seat must produce exactly one winner"""
+
+    claimants = 200
+
+    def test_single_winner_under_concurrent_claims(self):
+        schedule = create_schedule()
+        seat = Seat.objects.filter(vehicle=schedule.vehicle).first()
+        inventory = RowSeatInventory(strategy='conditional')
+
+        barrier = threading.Barrier(self.claimants)
+        results = []
+        errors = []
+        lock = threading.Lock()
+
+        def claim():
+            try:
+                barrier.wait()
+                won = inventory.claim(schedule.id, seat.id)
+                with lock:
+                    results.append(won)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim) for _ in range(self.claimants)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([str(e) for e in errors], [])
+        self.assertEqual(len(results), self.claimants)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(
+            SeatAvailability.objects.get(schedule=schedule, seat=seat).status,
+            'RESERVED'
+        )
+
+
+@override_settings(BOOKING_STRATEGY='conditional')
+class ConditionalClaimTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.inventory = RowSeatInventory()
+
+    def test_claim_only_succeeds_once(self):
+        self.assertTrue(self.inventory.claim(self.schedule.id, self.seats[0].id))
+        self.assertFalse(self.inventory.claim(self.schedule.id, self.seats[0].id))
+
+    def test_claim_untracked_seat_raises(self):
+        SeatAvailability.objects.filter(schedule=self.schedule, seat=self.seats[0]).delete()
+        with self.assertRaises(SeatAvailability.DoesNotExist):
+            self.inventory.claim(self.schedule.id, self.seats[0].id)
+
+    def test_claim_many_is_all_or_nothing(self):
+        self.inventory.claim(self.schedule.id, self.seats[1].id)
+        seat_ids = [self.seats[0].id, self.seats[1].id, self.seats[2].id]
+
+        unavailable = self.inventory.claim_many(self.schedule.id, seat_ids)
+
+        self.assertEqual(unavailable, [str(self.seats[1].id)])
+        self.assertEqual(
+            SeatAvailability.objects.filter(schedule=self.schedule, status='RESERVED').count(), 1
+        )
+
+
+@override_settings(SEAT_INVENTORY_BACKEND='sparse')
+class SparseSeatInventoryTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.inventory = SparseSeatInventory()
+
+    def test_initialize_writes_no_rows(self):
+        self.assertEqual(self.inventory.initialize(self.schedule), len(self.seats))
+        self.assertFalse(SeatAvailability.objects.filter(schedule=self.schedule).exists())
+        self.assertEqual(self.inventory.status_counts(self.schedule.id), {'AVAILABLE': len(self.seats)})
+
+    def test_seat_map_merges_layout_with_rows(self):
+        self.assertTrue(self.inventory.claim(self.schedule.id, self.seats[0].id))
+        self.assertFalse(self.inventory.claim(self.schedule.id, self.seats[0].id))
+
+        seat_map = self.inventory.seat_map(self.schedule.id)
+        statuses = {seat['seat_id']: seat['status'] for seat in seat_map}
+        self.assertEqual(len(seat_map), len(self.seats))
+        self.assertEqual(statuses[str(self.seats[0].id)], 'RESERVED')
+        self.assertEqual(SeatAvailability.objects.filter(schedule=self.schedule).count(), 1)
+
+    def test_release_deletes_row(self):
+        self.inventory.claim(self.schedule.id, self.seats[0].id)
+        self.assertTrue(self.inventory.transition(self.schedule.id, self.seats[0].id, 'AVAILABLE'))
+        self.assertFalse(SeatAvailability.objects.filter(schedule=self.schedule).exists())
+
+    def test_claim_many_is_all_or_nothing(self):
+        self.inventory.claim(self.schedule.id, self.seats[1].id)
+        seat_ids = [self.seats[0].id, self.seats[1].id, self.seats[2].id]
+
+        unavailable = self.inventory.claim_many(self.schedule.id, seat_ids)
+
+        self.assertEqual(unavailable, [str(self.seats[1].id)])
+        self.assertEqual(SeatAvailability.objects.filter(schedule=self.schedule).count(), 1)
+
+    def test_seat_of_other_vehicle_is_rejected(self):
+        other_seat = Seat.objects.filter(vehicle=create_schedule().vehicle).first()
+        with self.assertRaises(SeatAvailability.DoesNotExist):
+            self.inventory.claim(self.schedule.id, other_seat.id)
+
+
+@override_settings(SEAT_INVENTORY_BACKEND='bitmap')
+class BitmapSeatInventoryTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.inventory = BitmapSeatInventory()
+
+    def counters(self):
+        schedule = Schedule.objects.get(pk=self.schedule.pk)
+        return schedule.available_count, schedule.booked_count
+
+    def version(self):
+        return SeatInventory.objects.get(schedule=self.schedule).version
+
+    def seat_status(self, seat_id):
+        return {seat['seat_id']: seat['status'] for seat in self.inventory.seat_map(self.schedule.id)}[seat_id]
+
+    def test_claim_and_transition(self):
+        self.assertTrue(self.inventory.claim(self.schedule.id, self.seats[0].id))
+        self.assertFalse(self.inventory.claim(self.schedule.id, self.seats[0].id))
+        self.assertTrue(self.inventory.transition(self.schedule.id, self.seats[0].id, 'BOOKED'))
+        self.assertFalse(
+            self.inventory.transition(self.schedule.id, self.seats[0].id, 'AVAILABLE', from_statuses=('RESERVED',))
+        )
+
+        self.assertEqual(self.inventory.status_counts(self.schedule.id), {'AVAILABLE': len(self.seats) - 1, 'BOOKED': 1})
+        self.assertEqual(self.counters(), (len(self.seats) - 1, 1))
+        self.assertTrue(self.inventory.transition(self.schedule.id, self.seats[0].id, 'AVAILABLE'))
+        self.assertEqual(self.counters(), (len(self.seats), 0))
+
+    def test_claim_many_is_all_or_nothing(self):
+        self.inventory.claim(self.schedule.id, self.seats[1].id)
+        version = self.version()
+
+        unavailable = self.inventory.claim_many(self.schedule.id, [self.seats[0].id, self.seats[1].id])
+        self.assertEqual(unavailable, [str(self.seats[1].id)])
+        self.assertEqual(self.version(), version)
+
+        self.assertEqual(self.inventory.claim_many(self.schedule.id, [self.seats[0].id, self.seats[2].id]), [])
+        self.assertEqual(self.counters(), (len(self.seats) - 3, 3))
+
+    def test_seat_map_reads_one_row(self):
+        self.inventory.claim(self.schedule.id, self.seats[0].id)
+
+        with self.assertNumQueries(1):
+            seat_map = self.inventory.seat_map(self.schedule.id)
+
+        self.assertEqual(len(seat_map), len(self.seats))
+        statuses = {seat['seat_id']: seat['status'] for seat in seat_map}
+        self.assertEqual(statuses[str(self.seats[0].id)], 'RESERVED')
+        self.assertEqual(list(statuses.values()).count('AVAILABLE'), len(self.seats) - 1)
+
+    def interleave(self, seat):
+        """Make the next swap lose: another writer claims ``seat`` right after this one reads the row"""
+        load = self.inventory._load
+        calls = []
+
+        def racing_load(schedule_id):
+            row = load(schedule_id)
+            if not calls:
+                calls.append(schedule_id)
+                BitmapSeatInventory().claim(schedule_id, seat.id)
+            return row
+
+        self.inventory._load = racing_load
+        return calls
+
+    def test_stale_version_is_retried(self):
+        calls = self.interleave(self.seats[1])
+        version = self.version()
+
+        self.assertTrue(self.inventory.claim(self.schedule.id, self.seats[0].id))
+
+        self.assertEqual(calls, [self.schedule.id])
+        # Both writes landed, once each
+        self.assertEqual(self.version(), version + 2)
+        statuses = {seat['seat_id']: seat['status'] for seat in self.inventory.seat_map(self.schedule.id)}
+        self.assertEqual([statuses[str(seat.id)] for seat in self.seats[:2]], ['RESERVED', 'RESERVED'])
+        self.assertEqual(self.counters(), (len(self.seats) - 2, 2))
+
+    def test_claim_many_retry_sees_concurrent_claim(self):
+        self.interleave(self.seats[1])
+
+        unavailable = self.inventory.claim_many(self.schedule.id, [self.seats[0].id, self.seats[1].id])
+
+        self.assertEqual(unavailable, [str(self.seats[1].id)])
+        self.assertEqual(self.counters(), (len(self.seats) - 1, 1))
+
+    @override_settings(SEAT_INVENTORY_BACKEND='bitmap')
+    def test_socket_ignores_unknown_status(self):
+        consumer = SeatAvailabilityConsumer()
+        consumer.schedule_id = self.schedule.id
+        seat_id = str(self.seats[0].id)
+
+        async_to_sync(consumer.receive)(json.dumps({'seat_id': seat_id, 'status': 'BROKEN'}))
+        self.assertEqual(self.seat_status(seat_id), 'AVAILABLE')
+        async_to_sync(consumer.receive)(json.dumps({'seat_id': seat_id, 'status': 'UNAVAILABLE'}))
+        self.assertEqual(self.seat_status(seat_id), 'UNAVAILABLE')
+
+    @override_settings(ROOT_URLCONF='bus_management.urls')
+    def test_available_seats_shape_matches_rows_backend(self):
+        client = APIClient()
+        client.force_authenticate(User(username='traveller'))
+        self.inventory.claim(self.schedule.id, self.seats[0].id)
+
+        packed = client.get('/api/seat-availabilities/available_seats/', {'schedule_id': str(self.schedule.id)}).json()
+        with override_settings(SEAT_INVENTORY_BACKEND='rows'):
+            schedule = create_schedule()
+            RowSeatInventory().claim(schedule.id, Seat.objects.filter(vehicle=schedule.vehicle).first().id)
+            rows = client.get('/api/seat-availabilities/available_seats/', {'schedule_id': str(schedule.id)}).json()
+
+        self.assertEqual(len(packed), len(self.seats) - 1)
+        self.assertEqual(len(rows), len(packed))
+        self.assertEqual(set(packed[0]), set(rows[0]))
+        self.assertEqual(set(packed[0]['seat_details']), set(rows[0]['seat_details']))
+        self.assertNotIn(str(self.seats[0].id), [seat['seat'] for seat in packed])
+
+
+class SeatHoldEngineTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+        self.clock = FakeClock()
+        self.engine = SeatHoldEngine(InMemoryHoldStore(), clock=self.clock, ttl=600)
+
+    def reserve(self, seat):
+        RowSeatInventory().claim(self.schedule.id, seat.id)
+        ticket = Ticket.objects.create(
+            customer=self.customer, schedule=self.schedule, seat=seat,
+            base_price=100, final_price=100, status='RESERVED',
+            hold_expires_at=self.engine.expires_at()
+        )
+        self.engine.hold([ticket])
+        return ticket
+
+    def test_hold_is_kept_until_ttl(self):
+        ticket = self.reserve(self.seats[0])
+        self.clock.advance(seconds=599)
+
+        self.assertEqual(self.engine.sweep_expired(), 0)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'RESERVED')
+
+    def test_expired_holds_are_released(self):
+        tickets = [self.reserve(seat) for seat in self.seats[:3]]
+        self.clock.advance(seconds=601)
+
+        self.assertEqual(self.engine.sweep_expired(), 3)
+        for ticket in tickets:
+            ticket.refresh_from_db()
+            self.assertEqual(ticket.status, 'CANCELLED')
+        self.assertFalse(
+            SeatAvailability.objects.filter(schedule=self.schedule, status='RESERVED').exists()
+        )
+
+    @mock.patch('bus_management.booking.broadcast_seat_status_batch')
+    def test_release_is_broadcast_on_commit(self, broadcast):
+        tickets = [self.reserve(seat) for seat in self.seats[:2]]
+        self.clock.advance(seconds=601)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.engine.sweep_expired()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        # The caller rolled the release back, nothing is announced
+        broadcast.assert_not_called()
+
+        self.engine.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.engine.sweep_expired(), 2)
+        broadcast.assert_called_once()
+        schedule_id, seat_ids, status = broadcast.call_args.args
+        self.assertEqual((schedule_id, status), (str(self.schedule.id), 'AVAILABLE'))
+        self.assertEqual(sorted(seat_ids), sorted(str(ticket.seat_id) for ticket in tickets))
+
+    def test_confirmed_ticket_is_not_released(self):
+        ticket = self.reserve(self.seats[0])
+        ticket.status = 'CONFIRMED'
+        ticket.save()
+        self.clock.advance(seconds=601)
+
+        self.assertEqual(self.engine.sweep_expired(), 0)
+        self.assertEqual(
+            SeatAvailability.objects.get(schedule=self.schedule, seat=self.seats[0]).status,
+            'BOOKED'
+        )
+
+    def test_failed_release_keeps_holds(self):
+        ticket = self.reserve(self.seats[0])
+        self.clock.advance(seconds=601)
+
+        with mock.patch('bus_management.holds.get_seat_inventory', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                self.engine.sweep_expired()
+
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'RESERVED')
+        self.assertEqual(len(self.engine.store), 1)
+        self.assertEqual(self.engine.sweep_expired(), 1)
+
+    def test_sweep_respects_batch_size(self):
+        for seat in self.seats[:5]:
+            self.reserve(seat)
+        self.clock.advance(seconds=601)
+
+        self.assertEqual(self.engine.sweep(batch_size=2), 2)
+        self.assertEqual(self.engine.sweep_expired(), 3)
+
+    def test_released_seat_can_be_booked_again(self):
+        self.reserve(self.seats[0])
+        self.clock.advance(seconds=601)
+        self.engine.sweep_expired()
+
+        self.reserve(self.seats[0])
+        self.assertEqual(
+            Ticket.objects.filter(schedule=self.schedule, seat=self.seats[0]).count(), 2
+        )
+
+    @override_settings(SEAT_INVENTORY_BACKEND='bitmap')
+    def test_expired_holds_are_released_in_bitmap_inventory(self):
+        inventory = BitmapSeatInventory()
+        inventory.initialize(self.schedule)
+        inventory.claim(self.schedule.id, self.seats[0].id)
+        ticket = Ticket.objects.create(
+            customer=self.customer, schedule=self.schedule, seat=self.seats[0],
+            base_price=100, final_price=100, status='RESERVED',
+            hold_expires_at=self.engine.expires_at()
+        )
+        self.engine.hold([ticket])
+        self.clock.advance(seconds=601)
+
+        self.assertEqual(self.engine.sweep_expired(), 1)
+        self.assertEqual(inventory.status_counts(self.schedule.id), {'AVAILABLE': len(self.seats)})
+
+
+class ScheduleSeatCounterTest(TestCase):
+
+    backends = ['rows', 'sparse', 'bitmap']
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+
+    def assertCounts(self, schedule, available, booked):
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.available_count, schedule.booked_count), (available, booked))
+
+    def test_counters_follow_seat_changes(self):
+        for backend in self.backends:
+            with self.subTest(backend=backend), override_settings(SEAT_INVENTORY_BACKEND=backend):
+                schedule = create_schedule()
+                seats = list(Seat.objects.filter(vehicle=schedule.vehicle))
+                total = len(seats)
+                inventory = get_seat_inventory()
+                self.assertCounts(schedule, total, 0)
+
+                inventory.claim(schedule.id, seats[0].id)
+                inventory.claim_many(schedule.id, [seats[1].id, seats[2].id])
+                self.assertCounts(schedule, total - 3, 3)
+
+                ticket = Ticket.objects.create(
+                    customer=self.customer, schedule=schedule, seat=seats[0],
+                    base_price=100, final_price=100, status='RESERVED'
+                )
+                ticket.status = 'CONFIRMED'
+                ticket.save()
+                self.assertCounts(schedule, total - 3, 3)
+
+                ticket.status = 'CANCELLED'
+                ticket.save()
+                inventory.bulk_transition(schedule.id, [seats[1].id], 'AVAILABLE')
+                self.assertCounts(schedule, total - 1, 1)
+
+                inventory.reset(schedule.id)
+                self.assertCounts(schedule, total, 0)
+
+    def test_saving_schedule_keeps_counters(self):
+        schedule = create_schedule()
+        total = Seat.objects.filter(vehicle=schedule.vehicle).count()
+        stale = Schedule.objects.get(pk=schedule.pk)
+        seat = Seat.objects.filter(vehicle=schedule.vehicle).first()
+        get_seat_inventory().claim(schedule.id, seat.id)
+
+        stale.save()
+
+        self.assertCounts(schedule, total - 1, 1)
+
+    def test_reconcile_repairs_drift(self):
+        schedule = create_schedule()
+        total = Seat.objects.filter(vehicle=schedule.vehicle).count()
+        seat = Seat.objects.filter(vehicle=schedule.vehicle).first()
+        get_seat_inventory().claim(schedule.id, seat.id)
+        Schedule.objects.filter(pk=schedule.pk).update(available_count=3, booked_count=0)
+
+        out = StringIO()
+        call_command('reconcile_seat_counts', stdout=out)
+
+        self.assertCounts(schedule, total - 1, 1)
+        self.assertIn('Repaired 1', out.getvalue())
+
+
+class SeatMapSnapshotTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.version = get_seat_map(self.schedule.id)['version']
+
+    def claim(self, seat):
+        with self.captureOnCommitCallbacks(execute=True):
+            get_seat_inventory().claim(self.schedule.id, seat.id)
+
+    def test_current_version_is_not_modified(self):
+        with self.assertNumQueries(1):
+            result = sync_seat_map(self.schedule.id, self.version)
+        self.assertEqual(result, {'type': 'not_modified', 'version': self.version})
+
+    def test_delta_contains_only_changed_seats(self):
+        self.claim(self.seats[0])
+        self.claim(self.seats[1])
+
+        result = sync_seat_map(self.schedule.id, self.version)
+
+        self.assertEqual(result['type'], 'delta')
+        self.assertEqual(result['version'], self.version + 2)
+        self.assertEqual(
+            sorted(result['seats'], key=lambda seat: seat['seat_id']),
+            sorted([
+                {'seat_id': str(self.seats[0].id), 'status': 'RESERVED'},
+                {'seat_id': str(self.seats[1].id), 'status': 'RESERVED'},
+            ], key=lambda seat: seat['seat_id'])
+        )
+
+    def test_cached_snapshot_follows_changes(self):
+        self.claim(self.seats[0])
+
+        with self.assertNumQueries(1):
+            snapshot = get_seat_map(self.schedule.id)
+
+        self.assertEqual(snapshot['version'], self.version + 1)
+        statuses = {seat['seat_id']: seat['status'] for seat in snapshot['seats']}
+        self.assertEqual(statuses[str(self.seats[0].id)], 'RESERVED')
+
+    def test_unknown_version_gets_snapshot(self):
+        self.claim(self.seats[0])
+
+        result = sync_seat_map(self.schedule.id, self.version + 50)
+
+        self.assertEqual(result['type'], 'snapshot')
+        self.assertEqual(len(result['seats']), len(self.seats))
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls')
+class IdempotencyKeyTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+        token = RefreshToken.for_user(User.objects.create(username='traveller'))
+        token['customer_id'] = str(self.customer.id)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+    def book(self, seat, key):
+        return self.client.post(
+            '/api/tickets/', {'schedule': str(self.schedule.id), 'seat': str(seat.id)},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_returns_stored_response(self):
+        first = self.book(self.seats[0], 'booking-1')
+        retry = self.book(self.seats[0], 'booking-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Ticket.objects.filter(schedule=self.schedule).count(), 1)
+
+    def test_key_reused_for_other_request_is_rejected(self):
+        self.book(self.seats[0], 'booking-1')
+        response = self.book(self.seats[1], 'booking-1')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Ticket.objects.filter(schedule=self.schedule).count(), 1)
+
+    def test_payment_retry_is_applied_once(self):
+        departure = timezone.now() + timedelta(days=10)
+        reservation = SpecialReservation.objects.create(
+            customer=self.customer, vehicle=self.schedule.vehicle, source='Kathmandu', destination='Chitwan',
+            distance_km=150, departure_time=departure, estimated_arrival_time=departure + timedelta(hours=6)
+        )
+        url = f'/api/special-reservations/{reservation.pk}/make_payment/'
+
+        first = self.client.post(url, {'amount': '250.50'}, format='json', HTTP_IDEMPOTENCY_KEY='payment-1')
+        retry = self.client.post(url, {'amount': '250.50'}, format='json', HTTP_IDEMPOTENCY_KEY='payment-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.deposit_amount, Decimal('250.50'))
+        self.assertEqual(reservation.balance_amount, reservation.final_price - Decimal('250.50'))
+
+        response = self.client.post(url, {'amount': '-5'}, format='json', HTTP_IDEMPOTENCY_KEY='payment-2')
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_records_are_purged(self):
+        self.book(self.seats[0], 'booking-1')
+        IdempotencyRecord.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+
+class WaitlistTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.customers = [
+            Customer.objects.create(username=f'traveller{i}', email=f'traveller{i}@example.com', password='secret')
+            for i in range(3)
+        ]
+        self.clock = FakeClock()
+        self.engine = SeatHoldEngine(InMemoryHoldStore(), clock=self.clock, ttl=600)
+
+    def reserve(self, seat):
+        RowSeatInventory().claim(self.schedule.id, seat.id)
+        ticket = Ticket.objects.create(
+            customer=self.customers[0], schedule=self.schedule, seat=seat,
+            base_price=100, final_price=100, status='RESERVED',
+            hold_expires_at=self.engine.expires_at()
+        )
+        self.engine.hold([ticket])
+        return ticket
+
+    def test_queue_is_ordered_by_priority_then_arrival(self):
+        first = WaitlistEntry.objects.create(schedule=self.schedule, customer=self.customers[1])
+        second = WaitlistEntry.objects.create(schedule=self.schedule, customer=self.customers[2])
+        vip = WaitlistEntry.objects.create(schedule=self.schedule, customer=self.customers[0], priority=5)
+
+        self.assertEqual(
+            [waitlist_position(entry) for entry in (vip, first, second)], [1, 2, 3]
+        )
+
+    def test_expired_hold_is_given_to_head_of_queue(self):
+        ticket = self.reserve(self.seats[0])
+        entry = WaitlistEntry.objects.create(schedule=self.schedule, customer=self.customers[1])
+        self.clock.advance(seconds=601)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.engine.sweep_expired(), 1)
+
+        ticket.refresh_from_db()
+        entry.refresh_from_db()
+        self.assertEqual(ticket.status, 'CANCELLED')
+        self.assertEqual(entry.status, 'PROMOTED')
+        self.assertEqual(entry.ticket.seat_id, self.seats[0].id)
+        self.assertEqual(entry.ticket.status, 'RESERVED')
+        self.assertEqual(
+            SeatAvailability.objects.get(schedule=self.schedule, seat=self.seats[0]).status, 'RESERVED'
+        )
+        # The promoted ticket is held like any other reservation
+        self.assertEqual(len(self.engine.store), 1)
+
+    def test_freed_seat_is_released_without_waiting_customers(self):
+        self.reserve(self.seats[0])
+        self.clock.advance(seconds=601)
+
+        self.engine.sweep_expired()
+
+        self.assertEqual(
+            SeatAvailability.objects.get(schedule=self.schedule, seat=self.seats[0]).status, 'AVAILABLE'
+        )
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls')
+class WaitlistApiTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+        token = RefreshToken.for_user(User.objects.create(username='traveller'))
+        token['customer_id'] = str(customer.id)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+    def join(self):
+        return self.client.post('/api/waitlist/', {'schedule': str(self.schedule.id)}, format='json')
+
+    def test_cannot_join_while_seats_are_available(self):
+        response = self.join()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_join_and_leave_sold_out_schedule(self):
+        Schedule.objects.filter(pk=self.schedule.pk).update(available_count=0)
+
+        response = self.join()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['position'], 1)
+        self.assertEqual(self.join().status_code, 400)
+
+        response = self.client.post(f"/api/waitlist/{response.data['id']}/leave/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'CANCELLED')
+
+
+class ScheduleCancellationTest(TestCase):
+
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(username=f'traveller{i}', email=f'traveller{i}@example.com', password='secret')
+            for i in range(3)
+        ]
+
+    def book(self, schedule):
+        seats = list(Seat.objects.filter(vehicle=schedule.vehicle))
+        Ticket.objects.create(
+            customer=self.customers[0], schedule=schedule, seat=seats[0],
+            base_price=100, final_price=100, status='RESERVED'
+        )
+        Ticket.objects.create(
+            customer=self.customers[1], schedule=schedule, seat=seats[1],
+            base_price=100, final_price=90, status='CONFIRMED'
+        )
+        WaitlistEntry.objects.create(schedule=schedule, customer=self.customers[2])
+        return seats
+
+    def assertCancelled(self, schedule):
+        from notifications.models import Notification
+
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.status, 'CANCELLED')
+        self.assertEqual(schedule.booked_count, 0)
+        self.assertEqual(schedule.available_count, Seat.objects.filter(vehicle=schedule.vehicle).count())
+        self.assertEqual(get_seat_inventory().status_counts(schedule.id).keys(), {'AVAILABLE'})
+        self.assertFalse(schedule.tickets.exclude(status='CANCELLED').exists())
+        self.assertEqual(
+            dict(schedule.tickets.values_list('customer', 'refund_amount')),
+            {self.customers[0].id: None, self.customers[1].id: 90}
+        )
+        self.assertEqual(schedule.waitlist_entries.get().status, 'CANCELLED')
+        self.assertEqual(
+            set(Notification.objects.filter(notification_type='schedule_cancelled').values_list('customer', flat=True)),
+            {self.customers[0].id, self.customers[1].id}
+        )
+
+    def test_cancel_schedules_in_bulk(self):
+        schedule = create_schedule()
+        self.book(schedule)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = cancel_schedules([schedule.id])
+
+        self.assertEqual(result, {'schedules': 1, 'tickets': 2, 'refunded': 90})
+        self.assertCancelled(schedule)
+
+    @override_settings(SEAT_INVENTORY_BACKEND='bitmap')
+    def test_cancel_schedules_in_bitmap_inventory(self):
+        schedule = create_schedule()
+        self.book(schedule)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_schedules([schedule.id])
+
+        self.assertCancelled(schedule)
+
+    @override_settings(SEAT_INVENTORY_BACKEND='sparse')
+    def test_cancel_schedules_in_sparse_inventory(self):
+        schedule = create_schedule()
+        self.book(schedule)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_schedules([schedule.id])
+
+        self.assertCancelled(schedule)
+
+    def test_departed_schedule_is_not_cancelled(self):
+        schedule = create_schedule()
+        Schedule.objects.filter(pk=schedule.pk).update(status='IN_PROGRESS')
+
+        self.assertEqual(cancel_schedules([schedule.id])['schedules'], 0)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.status, 'IN_PROGRESS')
+
+
+class AutoConfirmTest(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+
+    def reserve(self, schedule, count=2):
+        seats = list(Seat.objects.filter(vehicle=schedule.vehicle)[:count])
+        for seat in seats:
+            Ticket.objects.create(
+                customer=self.customer, schedule=schedule, seat=seat,
+                base_price=100, final_price=100, status='RESERVED',
+                hold_expires_at=timezone.now() + timedelta(minutes=15)
+            )
+        return seats
+
+    def test_tickets_inside_window_are_confirmed(self):
+        soon = create_schedule(departure_in=timedelta(minutes=20))
+        later = create_schedule(departure_in=timedelta(days=2))
+        seats = self.reserve(soon)
+        self.reserve(later)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(confirm_due_tickets(), {'schedules': 1, 'tickets': 2})
+
+        self.assertEqual(set(soon.tickets.values_list('status', flat=True)), {'CONFIRMED'})
+        self.assertFalse(soon.tickets.filter(hold_expires_at__isnull=False).exists())
+        self.assertEqual(set(later.tickets.values_list('status', flat=True)), {'RESERVED'})
+        self.assertEqual(
+            set(SeatAvailability.objects.filter(schedule=soon, seat__in=seats).values_list('status', flat=True)),
+            {'BOOKED'}
+        )
+        soon.refresh_from_db()
+        self.assertEqual(soon.booked_count, 2)
+
+    def test_saving_schedule_does_not_confirm(self):
+        schedule = create_schedule(departure_in=timedelta(minutes=20))
+        self.reserve(schedule)
+
+        schedule.save()
+
+        self.assertEqual(set(schedule.tickets.values_list('status', flat=True)), {'RESERVED'})
+
+
+@override_settings(LIFECYCLE_BUCKET_SECONDS=60, LIFECYCLE_MAX_SLEEP_SECONDS=300)
+class JourneyLifecycleTest(TestCase):
+
+    def test_schedules_move_through_lifecycle(self):
+        departed = create_schedule(departure_in=-timedelta(hours=1))
+        arrived = create_schedule(departure_in=-timedelta(hours=10))
+        upcoming = create_schedule(departure_in=timedelta(days=2))
+        customer = Customer.objects.create(username='traveller', email='traveller@example.com', password='secret')
+        seat = Seat.objects.filter(vehicle=arrived.vehicle).first()
+        ticket = Ticket.objects.create(
+            customer=customer, schedule=arrived, seat=seat,
+            base_price=100, final_price=100, status='CONFIRMED'
+        )
+        held_seat = Seat.objects.filter(vehicle=arrived.vehicle).exclude(pk=seat.pk).first()
+        held = BookingService().reserve_seat(customer, arrived.id, held_seat.id)
+
+        with mock.patch('bus_management.lifecycle.get_hold_engine') as get_hold_engine:
+            with self.captureOnCommitCallbacks(execute=True):
+                metrics = advance_lifecycle(batch_size=1)
+
+        self.assertEqual(metrics['in_progress'], 1)
+        self.assertEqual(metrics['completed'], 1)
+        self.assertEqual(metrics['tickets_completed'], 1)
+        self.assertEqual(metrics['tickets_expired'], 1)
+        held.refresh_from_db()
+        self.assertEqual((held.status, held.hold_expires_at), ('CANCELLED', None))
+        get_hold_engine.return_value.release.assert_called_once_with(held.pk)
+        self.assertEqual(
+            SeatAvailability.objects.get(schedule=arrived, seat=held_seat).status, 'AVAILABLE'
+        )
+        for schedule, expected in ((departed, 'IN_PROGRESS'), (arrived, 'COMPLETED'), (upcoming, 'SCHEDULED')):
+            schedule.refresh_from_db()
+            self.assertEqual(schedule.status, expected)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'COMPLETED')
+        self.assertEqual(arrived.booked_count, 0)
+
+        # Nothing is due any more, a second run does no work
+        self.assertEqual(advance_lifecycle()['batches'], 0)
+
+    def test_wake_up_at_end_of_bucket(self):
+        schedule = create_schedule(departure_in=timedelta(minutes=2))
+        now = timezone.now()
+
+        wake_up = next_wake_up(now)
+
+        self.assertGreaterEqual(wake_up, schedule.departure_time)
+        self.assertLess(wake_up, schedule.departure_time + timedelta(seconds=60))
+        self.assertEqual(wake_up.timestamp() % 60, 0)
+
+    def test_wake_up_is_capped(self):
+        create_schedule(departure_in=timedelta(days=2))
+        now = timezone.now()
+
+        self.assertEqual(next_wake_up(now), now + timedelta(seconds=300))
+
+
+class BookingServiceTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+        self.service = BookingService(
+            hold_engine=SeatHoldEngine(InMemoryHoldStore(), clock=FakeClock(), ttl=600)
+        )
+
+    def seat_status(self, seat):
+        return SeatAvailability.objects.get(schedule=self.schedule, seat=seat).status
+
+    @mock.patch('bus_management.booking.broadcast_seat_status_update')
+    def test_broadcast_waits_for_commit(self, broadcast):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.service.reserve_seat(self.customer, self.schedule.id, self.seats[0].id)
+            broadcast.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        broadcast.assert_called_once_with(str(self.schedule.id), str(self.seats[0].id), 'RESERVED')
+
+    @mock.patch('bus_management.booking.broadcast_seat_status_update')
+    def test_refused_booking_is_never_announced(self, broadcast):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(BookingError):
+                self.service.reserve_seat(self.customer, self.schedule.id, self.seats[0].id, offer_id=9999)
+
+        self.assertEqual(callbacks, [])
+        broadcast.assert_not_called()
+        self.assertEqual(self.seat_status(self.seats[0]), 'AVAILABLE')
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_cancel_frees_seat_once(self):
+        ticket = self.service.reserve_seat(self.customer, self.schedule.id, self.seats[0].id)
+        version = Schedule.objects.get(pk=self.schedule.pk).seat_map_version
+
+        self.service.cancel_ticket(ticket, 'Change of plans')
+
+        self.assertEqual(self.seat_status(self.seats[0]), 'AVAILABLE')
+        schedule = Schedule.objects.get(pk=self.schedule.pk)
+        self.assertEqual(schedule.booked_count, 0)
+        # One seat write, one new seat map version
+        self.assertEqual(schedule.seat_map_version, version + 1)
+        with self.assertRaises(BookingError):
+            self.service.cancel_ticket(ticket, 'Again')
+
+    def test_stale_copy_cannot_cancel_twice(self):
+        ticket = self.service.reserve_seat(self.customer, self.schedule.id, self.seats[0].id)
+        stale = Ticket.objects.get(pk=ticket.pk)
+
+        with mock.patch('bus_management.waitlist.promote_waitlist', return_value=[]) as promote:
+            self.service.cancel_ticket(ticket, 'Change of plans')
+            # Read before the first cancellation, still RESERVED in memory
+            with self.assertRaises(BookingError):
+                self.service.cancel_ticket(stale, 'Twice')
+
+        promote.assert_called_once()
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).cancellation_reason, 'Change of plans')
+
+    def test_saving_ticket_moves_seat(self):
+        ticket = self.service.reserve_seat(self.customer, self.schedule.id, self.seats[0].id)
+
+        ticket.status = 'CONFIRMED'
+        self.service.save_ticket(ticket)
+        self.assertEqual(self.seat_status(self.seats[0]), 'BOOKED')
+
+        ticket.seat = self.seats[1]
+        self.service.save_ticket(ticket)
+        self.assertEqual(self.seat_status(self.seats[0]), 'AVAILABLE')
+        self.assertEqual(self.seat_status(self.seats[1]), 'BOOKED')
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls', MAX_SEATS_PER_BOOKING=4)
+class GroupBookingApiTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.seats = list(Seat.objects.filter(vehicle=self.schedule.vehicle))
+        self.customer = Customer.objects.create(
+            username='traveller', email='traveller@example.com', password='secret'
+        )
+        token = RefreshToken.for_user(User.objects.create(username='traveller'))
+        token['customer_id'] = str(self.customer.id)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+    def book(self, seats, **data):
+        return self.client.post('/api/tickets/book-multiple/', {
+            'schedule': str(self.schedule.id), 'seats': [str(seat.id) for seat in seats], **data
+        }, format='json')
+
+    def seat_status(self, seat):
+        return SeatAvailability.objects.get(schedule=self.schedule, seat=seat).status
+
+    def test_partly_unavailable_booking_is_rolled_back(self):
+        for strategy in ('locking', 'conditional'):
+            with self.subTest(strategy=strategy), override_settings(BOOKING_STRATEGY=strategy):
+                taken = Ticket.objects.create(
+                    customer=self.customer, schedule=self.schedule, seat=self.seats[0],
+                    base_price=100, final_price=100, status='RESERVED'
+                )
+
+                response = self.book([self.seats[1], self.seats[0], self.seats[2]])
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['unavailable_seats'], [str(self.seats[0].id)])
+                self.assertEqual(Ticket.objects.filter(schedule=self.schedule, status='RESERVED').count(), 1)
+                self.assertEqual([self.seat_status(seat) for seat in self.seats[1:3]], ['AVAILABLE', 'AVAILABLE'])
+                BookingService().cancel_ticket(taken, 'Reset')
+
+    def test_coupon_is_used_once_and_spread(self):
+        for strategy in ('locking', 'conditional'):
+            with self.subTest(strategy=strategy), override_settings(BOOKING_STRATEGY=strategy):
+                offer = Offer.objects.create(
+                    code=f'GROUP-{strategy}', description='Group', discount_type='FIXED', discount_value=100,
+                    valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=1)
+                )
+                seats = self.seats[:3] if strategy == 'locking' else self.seats[3:6]
+
+                response = self.book(seats, offer=str(offer.id))
+
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(Decimal(response.json()['discount_amount']), Decimal('100'))
+                discounts = [Decimal(ticket['discount_amount']) for ticket in response.json()['tickets']]
+                # The first ticket takes the rounding remainder
+                self.assertEqual(discounts, [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+                offer.refresh_from_db()
+                self.assertEqual(offer.usage_count, 1)
+                self.assertEqual([self.seat_status(seat) for seat in seats], ['RESERVED'] * 3)
+
+    def test_duplicate_and_too_many_seats_are_refused(self):
+        response = self.book([self.seats[0], self.seats[0]])
+        self.assertEqual(response.status_code, 400)
+
+        response = self.book(self.seats[:5])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertEqual(self.seat_status(self.seats[0]), 'AVAILABLE')
+
+
+class VehicleOccupancyTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.vehicle = self.schedule.vehicle
+        self.customer = Customer.objects.create(
+            username='organiser', email='organiser@example.com', password='secret'
+        )
+
+    def reserve(self, departure, hours, **kwargs):
+        return SpecialReservation.objects.create(
+            customer=self.customer, vehicle=self.vehicle, source='Kathmandu', destination='Chitwan',
+            distance_km=150, departure_time=departure,
+            estimated_arrival_time=departure + timedelta(hours=hours), **kwargs
+        )
+
+    def test_schedule_window_is_half_open(self):
+        departure, arrival = self.schedule.departure_time, self.schedule.arrival_time
+
+        available, conflict, conflict_type = self.vehicle.is_available(departure + timedelta(hours=1), arrival)
+        self.assertFalse(available)
+        self.assertEqual((conflict, conflict_type), (self.schedule, 'schedule'))
+
+        # Touching windows do not overlap
+        self.assertTrue(self.vehicle.is_available(arrival, arrival + timedelta(hours=2))[0])
+        self.assertTrue(self.vehicle.is_available(departure - timedelta(hours=2), departure)[0])
+        self.assertTrue(self.vehicle.is_available(departure, arrival, exclude_schedule_id=self.schedule.pk)[0])
+
+    def test_index_follows_status_and_time_changes(self):
+        reservation = self.reserve(
+            self.schedule.arrival_time + timedelta(days=1), 4,
+            is_round_trip=True, return_time=self.schedule.arrival_time + timedelta(days=2)
+        )
+        # A round trip holds the vehicle until it returns
+        late = self.schedule.arrival_time + timedelta(days=1, hours=10)
+        available, conflict, conflict_type = self.vehicle.is_available(late, late + timedelta(hours=1))
+        self.assertEqual((available, conflict, conflict_type), (False, reservation, 'special_reservation'))
+
+        reservation.status = 'REJECTED'
+        reservation.save()
+        self.assertTrue(self.vehicle.is_available(late, late + timedelta(hours=1))[0])
+
+        self.schedule.departure_time += timedelta(days=5)
+        self.schedule.arrival_time += timedelta(days=5)
+        self.schedule.save()
+        self.assertEqual(VehicleOccupancy.objects.get().start_time, self.schedule.departure_time)
+
+        cancel_schedules([self.schedule.pk])
+        self.assertFalse(VehicleOccupancy.objects.exists())
+
+    def test_find_conflicts_checks_many_windows(self):
+        other = create_schedule(departure_in=timedelta(days=4))
+        departure = self.schedule.departure_time
+
+        with self.assertNumQueries(1):
+            conflicts = find_conflicts([
+                (self.vehicle.pk, departure, departure + timedelta(hours=1)),
+                (self.vehicle.pk, departure + timedelta(days=1), departure + timedelta(days=1, hours=1)),
+                (other.vehicle.pk, other.departure_time, other.arrival_time),
+            ])
+
+        self.assertEqual([c.schedule if c else None for c in conflicts], [self.schedule, None, other])
+
+
+    def test_available_vehicles_in_one_query(self):
+        other = create_schedule(capacity=41, departure_in=timedelta(days=10))
+        idle = create_schedule(capacity=41, departure_in=timedelta(days=20)).vehicle
+        idle.status = 'MAINTENANCE'
+        idle.save()
+        departure = self.schedule.departure_time
+
+        with self.assertNumQueries(1):
+            free = list(available_vehicles(departure, departure + timedelta(hours=2)))
+        self.assertEqual(free, [other.vehicle])
+        self.assertEqual(free[0].seat_capacity, other.vehicle.capacity)
+
+        window = (departure + timedelta(days=30), departure + timedelta(days=31))
+        self.assertEqual(set(available_vehicles(*window)), {self.vehicle, other.vehicle})
+        self.assertEqual(list(available_vehicles(*window, min_capacity=40)), [other.vehicle])
+        self.assertEqual(
+            list(available_vehicles(*window, vehicle_subtype=self.vehicle.vehicle_subtype_id)), [self.vehicle]
+        )
+
+
+    def test_database_refuses_overlapping_trips(self):
+        departure = self.schedule.departure_time
+
+        with self.assertRaises(IntegrityError):
+            Schedule.objects.create(
+                vehicle=self.vehicle, route=self.schedule.route,
+                departure_time=departure + timedelta(hours=6), arrival_time=departure + timedelta(hours=9)
+            )
+        with self.assertRaises(IntegrityError):
+            self.reserve(departure - timedelta(hours=1), 2)
+        self.assertEqual(Schedule.objects.count(), 1)
+        self.assertFalse(SpecialReservation.objects.exists())
+
+        # Back to back trips do not overlap
+        self.reserve(self.schedule.arrival_time, 2)
+        self.assertEqual(VehicleOccupancy.objects.count(), 2)
+
+
+class TimetableTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule(departure_in=timedelta(days=3))
+        self.departure = timezone.localtime(self.schedule.departure_time)
+        self.template = TimetableTemplate.objects.create(
+            route=self.schedule.route, vehicle=self.schedule.vehicle,
+            departure_time=self.departure.time(), valid_from=timezone.localdate()
+        )
+
+    def test_materialise_is_idempotent(self):
+        result = materialise_timetables(start_date=timezone.localdate() + timedelta(days=1), days=7)
+
+        # Every day but the one where the vehicle already runs the same trip
+        self.assertEqual(result, {'created': 6, 'existing': 0, 'conflicts': 1})
+        schedules = Schedule.objects.filter(timetable=self.template)
+        self.assertEqual(schedules.count(), 6)
+        capacity = self.schedule.vehicle.capacity
+        for schedule in schedules:
+            self.assertEqual(schedule.base_price, self.schedule.base_price)
+            self.assertEqual(schedule.available_count, capacity)
+            self.assertEqual(SeatAvailability.objects.filter(schedule=schedule).count(), capacity)
+            self.assertEqual(schedule.occupancy.start_time, schedule.departure_time)
+
+        again = materialise_timetables(start_date=timezone.localdate() + timedelta(days=1), days=7)
+        self.assertEqual(again, {'created': 0, 'existing': 6, 'conflicts': 1})
+        self.assertEqual(Schedule.objects.filter(timetable=self.template).count(), 6)
+
+    def test_departures_created_concurrently_are_skipped(self):
+        start_date = timezone.localdate() + timedelta(days=4)
+        departure = timezone.make_aware(timezone.datetime.combine(start_date, self.template.departure_time))
+        without_conflicts = timetables._without_conflicts
+
+        def racing_check(candidates):
+            free = without_conflicts(candidates)
+            # Another run inserts one of the departures after this one checked them
+            Schedule.objects.create(
+                vehicle=self.schedule.vehicle, route=self.schedule.route, timetable=self.template,
+                departure_time=departure, arrival_time=departure + timedelta(hours=7)
+            )
+            return free
+
+        with mock.patch('bus_management.timetables._without_conflicts', side_effect=racing_check):
+            result = materialise_timetables(start_date=start_date, days=2)
+
+        self.assertEqual(result, {'created': 1, 'existing': 1, 'conflicts': 0})
+        self.assertEqual(Schedule.objects.filter(timetable=self.template).count(), 2)
+        self.assertEqual(VehicleOccupancy.objects.filter(schedule__timetable=self.template).count(), 2)
+
+    @override_settings(SEAT_INVENTORY_BACKEND='bitmap')
+    def test_weekdays_and_bitmap_tracking(self):
+        self.template.days_of_week = str(self.departure.weekday())
+        self.template.save()
+
+        result = materialise_timetables(start_date=timezone.localdate() + timedelta(days=4), days=14)
+
+        self.assertEqual(result['created'], 2)
+        for schedule in Schedule.objects.filter(timetable=self.template):
+            self.assertEqual(timezone.localtime(schedule.departure_time).weekday(), self.departure.weekday())
+            seat_map = get_seat_inventory().seat_map(schedule.id)
+            self.assertEqual(len(seat_map), self.schedule.vehicle.capacity)
+            self.assertTrue(all(seat['status'] == 'AVAILABLE' for seat in seat_map))
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls')
+class TripSearchTest(TestCase):
+
+    def setUp(self):
+        self.schedule = create_schedule()
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='traveller'))
+
+    def search(self, **params):
+        return self.client.get('/api/schedules/search/', params)
+
+    def test_search_is_one_indexed_query(self):
+        date = timezone.localdate(self.schedule.departure_time)
+
+        with self.assertNumQueries(1):
+            response = self.search(origin=' KATH', destination='pok', date=date.isoformat(), seats=2)
+
+        self.assertEqual(response.status_code, 200)
+        trips = response.json()['results']
+        self.assertEqual([trip['schedule'] for trip in trips], [str(self.schedule.pk)])
+        self.assertEqual(trips[0]['origin_name'], 'Kathmandu')
+        self.assertEqual(trips[0]['seats_left'], self.schedule.vehicle.capacity)
+
+        self.assertEqual(self.search(origin='mandu').json()['results'], [])
+        self.assertEqual(len(self.search(origin='mandu', match='contains').json()['results']), 1)
+        self.assertEqual(self.search(origin='kath', date=(date + timedelta(days=1)).isoformat()).json()['results'], [])
+        self.assertEqual(self.search().status_code, 400)
+        self.assertEqual(self.search(origin='kath', match='fuzzy').status_code, 400)
+
+    def test_index_follows_schedule_changes(self):
+        seat = Seat.objects.filter(vehicle=self.schedule.vehicle).first()
+        get_seat_inventory().claim(self.schedule.id, seat.id)
+        entry = TripSearchEntry.objects.get(schedule=self.schedule)
+        self.assertEqual(entry.seats_left, self.schedule.vehicle.capacity - 1)
+
+        route = self.schedule.route
+        route.source = 'Kāthmāndu  Valley'
+        route.save()
+        self.assertEqual([trip.schedule_id for trip in search_trips(origin='kathmandu v')], [self.schedule.pk])
+
+        cancel_schedules([self.schedule.pk])
+        self.assertFalse(TripSearchEntry.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls', CONNECTION_MIN_TRANSFER_MINUTES=15)
+class ConnectionSearchTest(TestCase):
+
+    def leg(self, source, destination, departure, hours=2):
+        vehicle = create_schedule(departure_in=timedelta(days=300)).vehicle
+        route = Route.objects.create(
+            name=f'{source} - {destination}', source=source, destination=destination,
+            distance_km=100, estimated_duration_minutes=hours * 60
+        )
+        schedule = Schedule.objects.create(
+            vehicle=vehicle, route=route, departure_time=departure, arrival_time=departure + timedelta(hours=hours)
+        )
+        initialize_seat_availability(schedule)
+        return schedule
+
+    def setUp(self):
+        self.first = create_schedule()
+        arrival = self.first.arrival_time
+        self.tight = self.leg('Pokhara', 'Jomsom', arrival + timedelta(minutes=5))
+        self.onward = self.leg('Pokhara', 'Jomsom', arrival + timedelta(minutes=30))
+        self.later = self.leg('Pokhara', 'Jomsom', arrival + timedelta(hours=3))
+        self.index = ConnectionIndex()
+
+    def test_earliest_arrival_with_transfer_time(self):
+        itineraries = self.index.search('kathmandu', 'JOMSOM', limit=2)
+
+        # The tight connection leaves before the minimum transfer time
+        self.assertEqual(
+            [[leg.schedule_id for leg in legs] for legs in itineraries][:1],
+            [[self.first.pk, self.onward.pk]]
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.search('Kathmandu', 'Jomsom', min_transfer=timedelta(0))[0][1].schedule_id, self.tight.pk)
+
+    def test_index_catches_up_with_changes(self):
+        self.index.search('Kathmandu', 'Jomsom')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_schedules([self.onward.pk])
+
+        # Only the changed entry is read again
+        with self.assertNumQueries(1):
+            legs = self.index.search('Kathmandu', 'Jomsom')[0]
+        self.assertEqual([leg.schedule_id for leg in legs], [self.first.pk, self.later.pk])
+
+    def test_index_rebuilt_after_refresh_interval(self):
+        self.index.search('Kathmandu', 'Jomsom')
+        # Cancelled by another process whose change log this one cannot see
+        cancel_schedules([self.onward.pk])
+
+        self.assertEqual(self.index.search('Kathmandu', 'Jomsom')[0][1].schedule_id, self.onward.pk)
+        with mock.patch('bus_management.connections.time.monotonic', return_value=time.monotonic() + 3600):
+            legs = self.index.search('Kathmandu', 'Jomsom')[0]
+        self.assertEqual([leg.schedule_id for leg in legs], [self.first.pk, self.later.pk])
+
+    def test_connections_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User(username='traveller'))
+
+        with mock.patch('bus_management.views.get_connection_index', return_value=self.index):
+            response = client.get('/api/schedules/connections/', {'origin': 'Kathmandu', 'destination': 'Jomsom', 'seats': 2})
+
+        self.assertEqual(response.status_code, 200)
+        itinerary = response.json()['itineraries'][0]
+        self.assertEqual(itinerary['transfers'], 1)
+        self.assertEqual([leg['schedule'] for leg in itinerary['legs']], [str(self.first.pk), str(self.onward.pk)])
+        self.assertEqual(Decimal(itinerary['total_price']), self.first.base_price + self.onward.base_price)
+        self.assertEqual(itinerary['seats_left'], self.first.vehicle.capacity)
+
+        response = client.get('/api/schedules/connections/', {'origin': 'Kathmandu', 'destination': 'Jomsom', 'max_legs': 9})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls')
+class StopTest(TestCase):
+
+    def test_spellings_and_aliases_share_a_stop(self):
+        schedule = create_schedule()
+        kathmandu = schedule.route.origin_stop
+        StopAlias.objects.create(stop=kathmandu, name='KTM')
+
+        for source in ('  kāthmandu ', 'ktm'):
+            route = Route.objects.create(
+                name='Valley', source=source, destination='Bhaktapur', distance_km=15, estimated_duration_minutes=45
+            )
+            self.assertEqual(route.origin_stop, kathmandu)
+            self.assertEqual(route.source, 'Kathmandu')
+        self.assertEqual(Stop.objects.count(), 3)
+
+    def test_schedule_search_joins_on_stops(self):
+        schedule = create_schedule()
+        client = APIClient()
+        client.force_authenticate(User(username='admin', is_staff=True))
+
+        response = client.get('/api/schedules/available_schedules/', {'source': 'KATH', 'destination': 'pokhara'})
+        self.assertEqual([s['id'] for s in response.json()['results']], [str(schedule.pk)])
+        response = client.get('/api/schedules/available_schedules/', {'source': 'pokhara'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_place_search_matches_within_names(self):
+        schedule = create_schedule()
+        route = Route.objects.create(
+            name='Park', source='New Kathmandu Bus Park', destination='Pokhara',
+            distance_km=200, estimated_duration_minutes=420
+        )
+        departure = schedule.departure_time + timedelta(days=1)
+        park = Schedule.objects.create(
+            vehicle=schedule.vehicle, route=route, departure_time=departure, arrival_time=departure + timedelta(hours=7)
+        )
+        client = APIClient()
+        client.force_authenticate(User(username='admin', is_staff=True))
+
+        response = client.get('/api/schedules/available_schedules/', {'source': 'kathmandu'})
+        self.assertEqual([s['id'] for s in response.json()['results']], [str(schedule.pk), str(park.pk)])
+
+    def test_reservation_links_only_known_stops(self):
+        schedule = create_schedule()
+        departure = timezone.now() + timedelta(days=10)
+        reservation = SpecialReservation.objects.create(
+            customer=Customer.objects.create(username='traveller', email='traveller@example.com', password='secret'),
+            vehicle=schedule.vehicle, source='kathmandu', destination='Pokharra lakesid',
+            distance_km=150, departure_time=departure, estimated_arrival_time=departure + timedelta(hours=6)
+        )
+
+        self.assertEqual(reservation.source_stop, schedule.route.origin_stop)
+        self.assertIsNone(reservation.destination_stop)
+        # The typed text is kept and no stop is made from it
+        self.assertEqual((reservation.source, reservation.destination), ('kathmandu', 'Pokharra lakesid'))
+        self.assertEqual(Stop.objects.count(), 2)
+
+    def test_distance_from_coordinates(self):
+        Stop.objects.create(name='Kathmandu', latitude='27.717200', longitude='85.324000')
+        Stop.objects.create(name='Pokhara', latitude='28.209600', longitude='83.985600')
+
+        route = Route.objects.create(
+            name='Tourist', source='Kathmandu', destination='Pokhara', estimated_duration_minutes=420
+        )
+        self.assertAlmostEqual(float(route.distance_km), 143, delta=2)
+
+    def test_autocomplete_from_memory(self):
+        schedule = create_schedule()
+        Stop.objects.create(name='Pokhara Lakeside')
+        airport = Stop.objects.create(name='Kathmandu Airport')
+        customer = Customer.objects.create(username='traveller', email='traveller@example.com', password='secret')
+        Ticket.objects.create(
+            customer=customer, schedule=schedule, seat=Seat.objects.filter(vehicle=schedule.vehicle).first(),
+            base_price=100, final_price=100, status='RESERVED'
+        )
+        index = PlaceIndex()
+
+        # Booked places first, later words match too
+        self.assertEqual([s['name'] for s in index.suggest('kath')], ['Kathmandu', 'Kathmandu Airport'])
+        with self.assertNumQueries(0):
+            self.assertEqual([s['name'] for s in index.suggest('LAKE')], ['Pokhara Lakeside'])
+            self.assertEqual([s['name'] for s in index.suggest('pok', limit=1)], ['Pokhara'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StopAlias.objects.create(stop=airport, name='Tribhuvan International')
+        suggestions = index.suggest('intern')
+        self.assertEqual([(s['id'], s['alias']) for s in suggestions], [(str(airport.pk), 'Tribhuvan International')])
+
+        client = APIClient()
+        client.force_authenticate(User(username='traveller'))
+        with mock.patch('bus_management.views.get_place_index', return_value=index):
+            response = client.get('/api/stops/autocomplete/', {'q': 'kathmandu a'})
+            self.assertEqual([s['name'] for s in response.json()['results']], ['Kathmandu Airport'])
+            self.assertEqual(client.get('/api/stops/autocomplete/').status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls')
+class KeysetPaginationTest(TestCase):
+
+    def test_pages_follow_cursor(self):
+        schedule = create_schedule()
+        customer = Customer.objects.create(username='traveller', email='traveller@example.com', password='secret')
+        tickets = [
+            Ticket.objects.create(
+                customer=customer, schedule=schedule, seat=seat, base_price=100, final_price=100, status='RESERVED'
+            )
+            for seat in Seat.objects.filter(vehicle=schedule.vehicle)[:5]
+        ]
+        # Tickets booked in the same instant are ordered by id
+        Ticket.objects.filter(pk__in=[t.pk for t in tickets[1:4]]).update(booking_time=tickets[1].booking_time)
+
+        token = RefreshToken.for_user(User.objects.create(username='traveller'))
+        token['customer_id'] = str(customer.id)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+        seen = []
+        url = '/api/tickets/my_tickets/?page_size=2'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json()['results']), 2)
+            seen.extend(t['id'] for t in response.json()['results'])
+            url = response.json()['next']
+
+        expected = Ticket.objects.filter(customer=customer).order_by('-booking_time', '-id')
+        self.assertEqual(seen, [str(t.pk) for t in expected])
+
+        response = client.get('/api/tickets/my_tickets/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='bus_management.urls')
+class VehicleAvailabilityApiTest(TestCase):
+
+    def test_bulk_check(self):
+        schedule = create_schedule()
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='dispatcher'))
+        departure = schedule.departure_time
+
+        response = client.post('/api/vehicles/check-availability/', {'windows': [
+            {'vehicle_id': str(schedule.vehicle.pk), 'start_time': departure.isoformat(),
+             'end_time': (departure + timedelta(hours=1)).isoformat()},
+            {'vehicle_id': str(schedule.vehicle.pk), 'start_time': schedule.arrival_time.isoformat(),
+             'end_time': (schedule.arrival_time + timedelta(hours=1)).isoformat()},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['available'] for r in results], [False, True])
+        self.assertEqual(results[0]['conflict_type'], 'schedule')
+
+        response = client.post('/api/vehicles/check-availability/', {'windows': [
+            {'vehicle_id': str(schedule.vehicle.pk), 'start_time': 'soon', 'end_time': 'later'}
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_available_vehicles_endpoint(self):
+        schedule = create_schedule()
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='dispatcher'))
+        later = schedule.arrival_time + timedelta(days=1)
+
+        response = client.get('/api/vehicles/available/', {
+            'start_time': later.isoformat(), 'end_time': (later + timedelta(hours=3)).isoformat(),
+            'min_capacity': schedule.vehicle.capacity
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v['id'] for v in response.json()['results']], [str(schedule.vehicle.pk)])
+
+        response = client.get('/api/vehicles/available/', {
+            'start_time': later.isoformat(), 'end_time': (later + timedelta(hours=3)).isoformat(),
+            'vehicle_type': 'bus'
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_reservation_race_gets_conflict_response(self):
+        schedule = create_schedule()
+        customer = Customer.objects.create(
+            username='organiser', email='organiser@example.com', password='secret'
+        )
+        token = RefreshToken.for_user(User.objects.create(username='organiser'))
+        token['customer_id'] = str(customer.id)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+        # The up-front check misses the schedule, as if it was booked concurrently
+        with mock.patch('bus_management.views.find_conflict', side_effect=[None, schedule.occupancy]):
+            response = client.post('/api/special-reservations/', {
+                'vehicle': str(schedule.vehicle.pk), 'source': 'Kathmandu', 'destination': 'Bhaktapur',
+                'departure_time': schedule.departure_time.isoformat(), 'distance_km': 60
+            }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "This vehicle has regular schedules during the requested time period")
+        self.assertFalse(SpecialReservation.objects.exists())
+
+
+    def test_reservation_vehicle_assignment(self):
+        snug = create_schedule()
+        idle = create_schedule(departure_in=timedelta(days=30)).vehicle
+        create_schedule(capacity=15, departure_in=timedelta(days=30))
+        large = create_schedule(capacity=45, departure_in=timedelta(days=30)).vehicle
+        departure = snug.arrival_time + timedelta(hours=1)
+
+        # One query, then the smallest vehicle seating the group that leaves the fewest gaps
+        with self.assertNumQueries(1):
+            ranked = rank_vehicles(departure, departure + timedelta(hours=1), 20)
+        self.assertEqual([v.pk for v in ranked], [snug.vehicle.pk, idle.pk, large.pk])
+
+        customer = Customer.objects.create(
+            username='organiser', email='organiser@example.com', password='secret'
+        )
+        token = RefreshToken.for_user(User.objects.create(username='organiser'))
+        token['customer_id'] = str(customer.id)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+        response = client.post('/api/special-reservations/', {
+            'passenger_count': 20, 'source': 'Pokhara', 'destination': 'Tansen',
+            'departure_time': departure.isoformat(), 'distance_km': 60,
+            'vehicle_subtype': str(large.vehicle_subtype_id)
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['vehicle'], str(large.pk))
+        self.assertEqual(data['passenger_count'], 20)
+        self.assertEqual(
+            [v['vehicle_id'] for v in data['alternatives']], [str(snug.vehicle.pk), str(idle.pk)]
+        )
+
+        response = client.post('/api/special-reservations/', {
+            'passenger_count': 50, 'source': 'Pokhara', 'destination': 'Tansen',
+            'departure_time': departure.isoformat(), 'distance_km': 60
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_fleet_timeline(self):
+        schedule = create_schedule()
+        idle = create_schedule(departure_in=timedelta(days=30)).vehicle
+        start = schedule.departure_time - timedelta(hours=1)
+        end = schedule.arrival_time + timedelta(hours=1)
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='dispatcher', is_staff=True))
+
+        with self.assertNumQueries(2):
+            response = client.get('/api/vehicles/timeline/', {
+                'start_time': start.isoformat(), 'end_time': end.isoformat(), 'granularity': 60
+            })
+
+        self.assertEqual(response.status_code, 200)
+        timelines = {entry['vehicle_id']: entry for entry in response.json()['vehicles']}
+        busy = timelines[str(schedule.vehicle.pk)]
+        self.assertEqual(
+            [(b['type'], b['id']) for b in busy['busy']], [('schedule', str(schedule.pk))]
+        )
+        self.assertEqual(len(busy['free']), 2)
+        # Nine hourly slots: free, seven busy, free
+        self.assertEqual(busy['bitmap']['slots'], 9)
+        self.assertEqual(base64.b64decode(busy['bitmap']['data']), bytes([0b01111111, 0b00000000]))
+        self.assertEqual(len(timelines[str(idle.pk)]['free']), 1)
+        self.assertEqual(timelines[str(idle.pk)]['busy'], [])
+
+        response = client.get('/api/vehicles/timeline/', {
+            'start_time': start.isoformat(), 'end_time': end.isoformat(), 'vehicle_ids': str(idle.pk)
+        })
+        self.assertEqual([entry['vehicle_id'] for entry in response.json()['vehicles']], [str(idle.pk)])
+        self.assertNotIn('bitmap', response.json()['vehicles'][0])
+
+
+class BookingBenchmarkCommandTest(TransactionTestCase):
+    """The booking benchmark reports its metrics and finds no double bookings"""
+
+    def test_benchmark_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_bookings', users=20, seats=10, hot_seats=3, workers=4, seed=1,
+                output=path, stdout=StringIO()
+            )
+            with open(path) as f:
+                report = json.load(f)
+
+        self.assertEqual(report['requests'], 20)
+        self.assertEqual(sum(report['outcomes'].values()), 20)
+        self.assertLessEqual(report['outcomes'].get('booked', 0), 3)
+        self.assertEqual(set(report['latency_ms']), {'mean', 'p50', 'p95', 'p99', 'max'})
+        self.assertEqual(report['violations']['total'], 0)
+        # The seeded data is removed after the run
+        self.assertFalse(Schedule.objects.exists())
+        self.assertFalse(Customer.objects.exists())
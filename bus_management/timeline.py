@@ -0,0 +1,109 @@
+"""
+Fleet free/busy timeline.
+
+For a time window, every vehicle gets its busy intervals (the schedules and
+special reservations holding it) and the free gaps between them. The vehicle
+occupancy index already merges schedules and reservations into one interval
+stream, so the whole fleet is read with a single query ordered by (vehicle,
+start_time) and each vehicle's gaps come out of one sweep over its rows.
+
+With a granularity, each vehicle also gets a bitmap of the window cut into
+slots of that many minutes: bit 1 for a slot touched by a busy interval. The
+bits are packed first slot first, most significant bit first, and sent as
+base64.
+"""
+import base64
+from itertools import groupby
+from math import ceil
+
+from .models import Vehicle, VehicleOccupancy
+from .occupancy import UNAVAILABLE_VEHICLE_STATUSES
+
+
+def fleet_timeline(start_time, end_time, vehicle_ids=None, granularity=None):
+    """
+    Return the timeline of each vehicle between start_time and end_time.
+    ``vehicle_ids`` limits the result to some vehicles, ``granularity`` is a
+    timedelta that adds a busy bitmap with slots of that length.
+    """
+    vehicles = Vehicle.objects.order_by('name', 'pk')
+    occupancies = VehicleOccupancy.objects.filter(start_time__lt=end_time, end_time__gt=start_time)
+    if vehicle_ids is not None:
+        vehicles = vehicles.filter(pk__in=vehicle_ids)
+        occupancies = occupancies.filter(vehicle_id__in=vehicle_ids)
+
+    busy_by_vehicle = {
+        vehicle_id: list(rows)
+        for vehicle_id, rows in groupby(
+            occupancies.order_by('vehicle_id', 'start_time').values_list(
+                'vehicle_id', 'start_time', 'end_time', 'schedule_id', 'special_reservation_id'
+            ).iterator(),
+            key=lambda row: row[0]
+        )
+    }
+
+    timeline = []
+    for vehicle_id, name, registration_number, vehicle_status in vehicles.values_list(
+        'pk', 'name', 'registration_number', 'status'
+    ):
+        out_of_service = vehicle_status in UNAVAILABLE_VEHICLE_STATUSES
+        entry = vehicle_timeline(
+            busy_by_vehicle.get(vehicle_id, []), start_time, end_time, out_of_service=out_of_service
+        )
+        if granularity:
+            # A vehicle out of service is busy for the whole window
+            busy = [{'start_time': start_time, 'end_time': end_time}] if out_of_service else entry['busy']
+            entry['bitmap'] = busy_bitmap(busy, start_time, end_time, granularity)
+        timeline.append({
+            'vehicle_id': str(vehicle_id),
+            'name': name,
+            'registration_number': registration_number,
+            'status': vehicle_status,
+            **entry
+        })
+    return timeline
+
+
+def vehicle_timeline(rows, start_time, end_time, out_of_service=False):
+    """
+    Sweep the occupancy rows of one vehicle, sorted by start_time, and return
+    its busy intervals and free gaps clipped to the window. A vehicle out of
+    service has no free gaps.
+    """
+    busy = []
+    free = []
+    cursor = start_time
+    for _, busy_start, busy_end, schedule_id, reservation_id in rows:
+        busy_start = max(busy_start, start_time)
+        busy_end = min(busy_end, end_time)
+        if busy_start > cursor:
+            free.append({'start_time': cursor, 'end_time': busy_start})
+        busy.append({
+            'start_time': busy_start,
+            'end_time': busy_end,
+            'type': 'schedule' if schedule_id else 'special_reservation',
+            'id': str(schedule_id or reservation_id),
+        })
+        cursor = max(cursor, busy_end)
+    if cursor < end_time:
+        free.append({'start_time': cursor, 'end_time': end_time})
+
+    if out_of_service:
+        free = []
+    return {'busy': busy, 'free': free}
+
+
+def busy_bitmap(busy, start_time, end_time, granularity):
+    """Pack the busy intervals into one bit per slot of ``granularity``, base64 encoded"""
+    slots = ceil((end_time - start_time) / granularity)
+    bits = bytearray(ceil(slots / 8))
+    for interval in busy:
+        first = int((interval['start_time'] - start_time) / granularity)
+        last = min(ceil((interval['end_time'] - start_time) / granularity), slots)
+        for slot in range(first, last):
+            bits[slot // 8] |= 0x80 >> (slot % 8)
+    return {
+        'slots': slots,
+        'slot_minutes': int(granularity.total_seconds() // 60),
+        'data': base64.b64encode(bytes(bits)).decode(),
+    }
@@ -0,0 +1,155 @@
+"""
+Timetable materialisation.
+
+A ``TimetableTemplate`` describes a recurring departure: a vehicle on a route
+at a local time on some days of the week, between two dates.
+``materialise_timetables`` turns every active template into the ``Schedule``
+rows of the coming days with a fixed number of statements per chunk:
+
+- the departures that already exist are read once and skipped, and the
+  (timetable, departure_time) unique constraint backs that up: departures
+  inserted by a concurrent run in the meantime are ignored on insert, so the
+  job is idempotent and a nightly run only adds the newest day;
+- prices are computed once per (route, vehicle subtype) instead of once per
+  schedule;
+- departures that would overlap another trip of the vehicle are skipped with
+  one occupancy lookup instead of failing the batch on the no-overlap guard;
+- schedules, their vehicle occupancy rows and their seat tracking are
+  inserted with ``bulk_create``.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .inventory import get_seat_inventory
+from .models import Schedule, TimetableTemplate
+from .occupancy import find_conflicts, sync_schedules
+from .tripsearch import sync_trips
+
+logger = logging.getLogger(__name__)
+
+
+def _horizon_days():
+    return getattr(settings, 'TIMETABLE_HORIZON_DAYS', 28)
+
+
+def _batch_size():
+    return getattr(settings, 'TIMETABLE_BATCH_SIZE', 500)
+
+
+def materialise_timetables(start_date=None, days=None, templates=None, now=None):
+    """
+    Create the schedules of active timetable templates departing from
+    ``start_date`` (today by default) over the next ``days`` days.
+    Departures in the past and departures already created are skipped.
+
+    Returns a dictionary with the number of created schedules, existing
+    departures that were skipped and departures skipped because their vehicle
+    is taken.
+    """
+    now = now or timezone.now()
+    start_date = start_date or timezone.localdate(now)
+    days = days or _horizon_days()
+    end_date = start_date + timedelta(days=days - 1)
+
+    if templates is None:
+        templates = TimetableTemplate.objects.filter(is_active=True)
+    templates = list(
+        templates.filter(valid_from__lte=end_date).filter(
+            Q(valid_until__isnull=True) | Q(valid_until__gte=start_date)
+        ).select_related('route', 'vehicle__vehicle_subtype')
+    )
+
+    result = {'created': 0, 'existing': 0, 'conflicts': 0}
+    if not templates:
+        return result
+
+    existing = set(
+        Schedule.objects.filter(
+            timetable__in=templates,
+            departure_time__gte=_departure(start_date, datetime.min.time()),
+            departure_time__lt=_departure(end_date + timedelta(days=1), datetime.min.time())
+        ).values_list('timetable_id', 'departure_time')
+    )
+
+    # Prices only depend on the route and the vehicle subtype
+    prices = {}
+    candidates = []
+    for template in templates:
+        key = (template.route_id, template.vehicle.vehicle_subtype_id)
+        if key not in prices:
+            prices[key] = Schedule.price_for(template.route, template.vehicle.vehicle_subtype)
+        duration = timedelta(minutes=template.route.estimated_duration_minutes)
+
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            if not template.runs_on(day):
+                continue
+            departure_time = _departure(day, template.departure_time)
+            if departure_time <= now:
+                continue
+            if (template.pk, departure_time) in existing:
+                result['existing'] += 1
+                continue
+            candidates.append(Schedule(
+                vehicle=template.vehicle,
+                route=template.route,
+                timetable=template,
+                departure_time=departure_time,
+                arrival_time=departure_time + duration,
+                base_price=prices[key],
+                status='SCHEDULED'
+            ))
+
+    schedules = _without_conflicts(candidates)
+    result['conflicts'] = len(candidates) - len(schedules)
+
+    batch_size = _batch_size()
+    for i in range(0, len(schedules), batch_size):
+        batch = schedules[i:i + batch_size]
+        with transaction.atomic():
+            Schedule.objects.bulk_create(batch, ignore_conflicts=True)
+            # Departures created by a concurrent run were not inserted, leave them to it
+            inserted = set(Schedule.objects.filter(pk__in=[s.pk for s in batch]).values_list('pk', flat=True))
+            result['existing'] += len(batch) - len(inserted)
+            batch = [schedule for schedule in batch if schedule.pk in inserted]
+            # bulk_create skips the post_save signals, index and track the schedules here
+            sync_schedules(batch)
+            sync_trips(batch)
+            get_seat_inventory().initialize_many(batch)
+        result['created'] += len(batch)
+
+    if result['created'] or result['conflicts']:
+        logger.info(f"Timetable materialisation: {result}")
+    return result
+
+
+def _departure(day, time):
+    """Aware datetime of a local time on a date"""
+    return timezone.make_aware(datetime.combine(day, time))
+
+
+def _without_conflicts(candidates):
+    """
+    Drop the departures whose vehicle is already taken, by an existing trip
+    (one occupancy lookup for all of them) or by an earlier candidate.
+    """
+    conflicts = find_conflicts(
+        (schedule.vehicle_id, schedule.departure_time, schedule.arrival_time)
+        for schedule in candidates
+    )
+    free = [schedule for schedule, conflict in zip(candidates, conflicts) if conflict is None]
+
+    kept = []
+    last_arrival = {}
+    for schedule in sorted(free, key=lambda schedule: (str(schedule.vehicle_id), schedule.departure_time)):
+        previous = last_arrival.get(schedule.vehicle_id)
+        if previous and schedule.departure_time < previous:
+            continue
+        kept.append(schedule)
+        last_arrival[schedule.vehicle_id] = schedule.arrival_time
+    return kept
@@ -0,0 +1,132 @@
+"""
+Trip search index.
+
+Searching schedules by ``route__source__icontains`` joins Route and runs a
+leading-wildcard LIKE that no index can serve. Every bookable schedule instead
+gets one ``TripSearchEntry`` row holding its normalised origin and destination,
+local departure date, seats left and price, indexed on (origin, destination,
+departure_date, departure_time). A search is then one indexed query on that
+table without any join:
+
+- ``prefix`` matching (the default) turns "kath" into the range
+  ["kath", "kati"), which any database serves from the index;
+- ``contains`` matching is a plain LIKE, served on PostgreSQL by the pg_trgm
+  trigram indexes created in migration 0018.
+
+Entries are written by the post_save signals of Schedule and Route. Set-based
+changes skip those signals: cancellation and the journey lifecycle call
+``drop_trips``, timetable materialisation calls ``sync_trips``, and the seat
+inventory copies its counter changes with ``refresh_seats``.
+
+Every committed change is also published in the ``CHANGES`` log (see
+bus_management/changelog.py), so in-memory copies of the index (see
+bus_management/connections.py) can catch up by reloading only those rows.
+"""
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .changelog import ChangeLog
+from .models import Schedule, TripSearchEntry
+from .stops import normalise_place, prefix_range
+
+
+# Schedules in these statuses can be found and booked
+SEARCHABLE_STATUSES = ('SCHEDULED',)
+
+MATCH_MODES = ('prefix', 'contains')
+
+# Schedules whose entries changed
+CHANGES = ChangeLog('trip_search', 'TRIP_SEARCH')
+
+
+def sync_trips(schedules):
+    """Rewrite the search entries of saved schedules"""
+    schedules = list(schedules)
+    schedule_ids = [schedule.pk for schedule in schedules]
+    TripSearchEntry.objects.filter(schedule_id__in=schedule_ids).delete()
+    TripSearchEntry.objects.bulk_create([
+        TripSearchEntry(
+            schedule=schedule,
+            route_id=schedule.route_id,
+            origin=normalise_place(schedule.route.source),
+            destination=normalise_place(schedule.route.destination),
+            origin_name=schedule.route.source,
+            destination_name=schedule.route.destination,
+            departure_date=timezone.localdate(schedule.departure_time),
+            departure_time=schedule.departure_time,
+            arrival_time=schedule.arrival_time,
+            price=schedule.base_price
+        )
+        for schedule in schedules
+        if schedule.status in SEARCHABLE_STATUSES
+    ])
+    # The counters of a loaded schedule may be stale, read them in the database
+    refresh_seats(schedule_ids)
+
+
+def sync_route(route):
+    """Copy a route's place names to the search entries of its schedules"""
+    TripSearchEntry.objects.filter(route=route).update(
+        origin=normalise_place(route.source),
+        destination=normalise_place(route.destination),
+        origin_name=route.source,
+        destination_name=route.destination
+    )
+    # The changed schedules are not known without reading them, readers rebuild
+    record_changes(None)
+
+
+def drop_trips(schedule_ids):
+    """Remove the search entries of schedules that can no longer be booked"""
+    TripSearchEntry.objects.filter(schedule_id__in=schedule_ids).delete()
+    record_changes(schedule_ids)
+
+
+def refresh_seats(schedule_ids):
+    """Copy the available_count counter of schedules to their search entries, in one UPDATE"""
+    TripSearchEntry.objects.filter(schedule_id__in=schedule_ids).update(
+        seats_left=Subquery(
+            Schedule.objects.filter(pk=OuterRef('schedule_id')).values('available_count')[:1]
+        )
+    )
+    record_changes(schedule_ids)
+
+
+def shift_seats(schedule_id, available):
+    """Apply a change of the available seat counter to a schedule's search entry"""
+    if available:
+        TripSearchEntry.objects.filter(schedule_id=schedule_id).update(seats_left=F('seats_left') + available)
+        record_changes([schedule_id])
+
+
+def record_changes(schedule_ids):
+    """Publish changed entries once the transaction commits, ``None`` when any may have changed"""
+    CHANGES.record(schedule_ids)
+
+
+def _place_filter(field, value, match):
+    value = normalise_place(value)
+    if match == 'contains':
+        return {f'{field}__contains': value}
+    lower, upper = prefix_range(value)
+    return {f'{field}__gte': lower, f'{field}__lt': upper}
+
+
+def search_trips(origin=None, destination=None, date=None, seats=None, match='prefix', now=None):
+    """
+    Upcoming bookable trips, by departure time. ``origin`` and ``destination``
+    are matched on their normalised form, as prefixes or anywhere in the name.
+    """
+    if match not in MATCH_MODES:
+        raise ValueError(f"match must be one of {', '.join(MATCH_MODES)}")
+
+    trips = TripSearchEntry.objects.filter(departure_time__gt=now or timezone.now())
+    if origin and normalise_place(origin):
+        trips = trips.filter(**_place_filter('origin', origin, match))
+    if destination and normalise_place(destination):
+        trips = trips.filter(**_place_filter('destination', destination, match))
+    if date:
+        trips = trips.filter(departure_date=date)
+    if seats:
+        trips = trips.filter(seats_left__gte=seats)
+    return trips.order_by('departure_time')
@@ -4,13 +4,14 @@ from .views import (
     VehicleViewSet, RouteViewSet, ScheduleViewSet, SeatViewSet,
     CustomerViewSet, OfferViewSet, TicketViewSet, SpecialReservationViewSet,
     SeatAvailabilityViewSet, RegisterView, TokenObtainPairForCustomerView,
-    VehicleTypeViewSet
+    VehicleTypeViewSet, WaitlistEntryViewSet, StopViewSet
 )
 
 # Setup the router for REST API viewsets
 router = DefaultRouter()
 router.register(r'vehicle-types', VehicleTypeViewSet)
 router.register(r'vehicles', VehicleViewSet)
+router.register(r'stops', StopViewSet)
 router.register(r'routes', RouteViewSet)
 router.register(r'schedules', ScheduleViewSet)
 router.register(r'seats', SeatViewSet)
@@ -26,6 +27,7 @@ router.register(r'offers', OfferViewSet)
 # 4. URL-friendly - UUIDs can be used in URLs without encoding
 router.register(r'tickets', TicketViewSet)
 router.register(r'special-reservations', SpecialReservationViewSet)
+router.register(r'waitlist', WaitlistEntryViewSet)
 
 urlpatterns = [
     # API endpoints
@@ -47,6 +49,9 @@ urlpatterns = [
     path('api/vehicles/<uuid:pk>/check-availability/', 
          VehicleViewSet.as_view({'post': 'check_availability'}), 
          name='vehicle-check-availability'),
+    path('api/vehicles/check-availability/', 
+         VehicleViewSet.as_view({'post': 'check_availability_bulk'}), 
+         name='vehicle-check-availability-bulk'),
     path('api/vehicles/available/', 
          VehicleViewSet.as_view({'get': 'available_vehicles'}), 
          name='available-vehicles'),
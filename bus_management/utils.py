@@ -12,35 +12,15 @@ from .models import (
 
 def initialize_seat_availability(schedule):
     """
-    Initialize seat availability records for a new schedule.
+    Initialize seat availability tracking for a new schedule.
     Called when creating a new schedule to set up availability tracking.
     
-    If seat availability records already exist for this schedule, they'll be
-    deleted first to avoid uniqueness constraint violations.
+    Delegates to the configured seat inventory backend (see bus_management.inventory).
+    Any existing tracking for this schedule is reset first.
     """
-    # Delete any existing seat availability records for this schedule
-    SeatAvailability.objects.filter(schedule=schedule).delete()
+    from .inventory import get_seat_inventory
     
-    # Get all seats for the vehicle
-    vehicle = schedule.vehicle
-    seats = Seat.objects.filter(vehicle=vehicle)
-    
-    # Create availability records for each seat
-    seat_availabilities = []
-    for seat in seats:
-        seat_availabilities.append(
-            SeatAvailability(
-                schedule=schedule,
-                seat=seat,
-                status='AVAILABLE'
-            )
-        )
-    
-    # Bulk create all the seat availability records
-    if seat_availabilities:
-        SeatAvailability.objects.bulk_create(seat_availabilities)
-        
-    return len(seat_availabilities)  # Return the number of records created
+    return get_seat_inventory().initialize(schedule)  # Return the number of seats tracked
 
 
 def calculate_special_reservation_price(source, destination, distance_km, departure_time):
@@ -105,6 +85,24 @@ def calculate_arrival_time(departure_time, distance_km):
     return dept_time + timezone.timedelta(minutes=duration_minutes)
 
 
+def calculate_offer_discount(offer, amount):
+    """
+    Calculate the discount an offer gives on a purchase amount.
+    Percentage discounts are capped by max_discount_amount, fixed discounts
+    never exceed the amount itself.
+    """
+    if offer.discount_type == 'PERCENTAGE':
+        discount_amount = amount * (offer.discount_value / 100)
+        if offer.max_discount_amount and discount_amount > offer.max_discount_amount:
+            discount_amount = offer.max_discount_amount
+    else:  # FIXED
+        discount_amount = offer.discount_value
+        if discount_amount > amount:
+            discount_amount = amount
+    
+    return discount_amount
+
+
 def broadcast_vehicle_status_update(vehicle_id, status):
     """
     Broadcast vehicle status updates to WebSocket clients.
@@ -213,6 +211,82 @@ def broadcast_seat_status_update(schedule_id, seat_id, status):
         # Continue with normal operation even if broadcast fails
 
 
+def broadcast_seat_status_batch(schedule_id, seat_ids, status):
+    """
+    Broadcast a status change of several seats of a schedule as one WebSocket message.
+    Will fail gracefully if Redis is not available.
+    """
+    if not seat_ids:
+        return
+    
+    try:
+        from channels.layers import get_channel_layer
+        from asgiref.sync import async_to_sync
+        
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            # Channel layer not configured
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.warning("Channel layer not configured, skipping broadcast")
+            return
+            
+        group_name = f'seat_availability_{schedule_id}'
+        
+        async_to_sync(channel_layer.group_send)(
+            group_name,
+            {
+                'type': 'seat_batch_update',
+                'seats': [{'seat_id': str(seat_id), 'status': status} for seat_id in seat_ids],
+                'timestamp': timezone.now().isoformat()
+            }
+        )
+    except Exception as e:
+        # Log the error but don't let it break the application
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Error broadcasting seat status batch: {str(e)}")
+        # Continue with normal operation even if broadcast fails
+
+
+def broadcast_seat_map_reset(schedule_id, version, status, reason=None):
+    """
+    Broadcast to WebSocket clients that every seat of a schedule changed to ``status``
+    in one step, instead of one update per seat.
+    Will fail gracefully if Redis is not available.
+    """
+    try:
+        from channels.layers import get_channel_layer
+        from asgiref.sync import async_to_sync
+        
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            # Channel layer not configured
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.warning("Channel layer not configured, skipping broadcast")
+            return
+            
+        group_name = f'seat_availability_{schedule_id}'
+        
+        async_to_sync(channel_layer.group_send)(
+            group_name,
+            {
+                'type': 'seat_map_reset',
+                'version': version,
+                'status': status,
+                'reason': reason,
+                'timestamp': timezone.now().isoformat()
+            }
+        )
+    except Exception as e:
+        # Log the error but don't let it break the application
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Error broadcasting seat map reset: {str(e)}")
+        # Continue with normal operation even if broadcast fails
+
+
 def create_vehicle_with_seats(name, registration_number, capacity, vehicle_subtype, existing_vehicle=None):
     """
     Create a new vehicle and initialize its seats.
@@ -5,23 +5,42 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import datetime
-from django.db.models import F, Case, When, Value, IntegerField
+from decimal import Decimal, InvalidOperation
+from django.db.models import F, Case, When, Value, IntegerField, BooleanField, DecimalField
+from django.db.models.functions import Greatest
 from django.utils.dateparse import parse_datetime
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.conf import settings
 
 from .models import (
     Vehicle, Route, Schedule, Seat, Customer, Offer,
-    Ticket, SpecialReservation, SeatAvailability, VehicleType, VehicleSubtype
+    Ticket, SpecialReservation, SeatAvailability, VehicleType, VehicleSubtype,
+    WaitlistEntry, Stop
 )
+from .inventory import get_seat_inventory, BitmapSeatInventory, SparseSeatInventory
+from .seatmaps import get_seat_map, sync_seat_map
+from .idempotency import idempotent
+from .pagination import InvalidCursor, KeysetPagination
+from .booking import BookingError, BookingService
+from .cancellations import cancel_schedules
+from .timeline import fleet_timeline
+from .tripsearch import search_trips
+from .stops import matching_stops
+from .connections import describe_itinerary, get_connection_index
+from .autocomplete import get_place_index
+from .assignment import describe as describe_vehicle, rank_vehicles
+from .occupancy import available_vehicles as find_available_vehicles, find_conflict, find_conflicts, is_overlap_error
 from .serializers import (
     VehicleSerializer, RouteSerializer, ScheduleSerializer, SeatSerializer,
     CustomerSerializer, OfferSerializer, TicketSerializer,
     SpecialReservationSerializer, SeatAvailabilitySerializer,
-    CustomerRegistrationSerializer, VehicleTypeSerializer, VehicleSubtypeSerializer
+    CustomerRegistrationSerializer, VehicleTypeSerializer, VehicleSubtypeSerializer,
+    WaitlistEntrySerializer, TripSearchEntrySerializer, StopSerializer
 )
 
 
@@ -67,11 +86,11 @@ class VehicleViewSet(viewsets.ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['type', 'status', 'is_active', 'subtype']
-    search_fields = ['name', 'registration_number', 'color']
+    filterset_fields = ['vehicle_subtype', 'status']
+    search_fields = ['name', 'registration_number']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'check_availability', 'available_vehicles', 'dashboard', 'dashboard_charts']:
+        if self.action in ['list', 'retrieve', 'check_availability', 'check_availability_bulk', 'available_vehicles', 'dashboard', 'dashboard_charts']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAdminUser]
@@ -109,19 +128,7 @@ class VehicleViewSet(viewsets.ModelViewSet):
                     {"available": True, "message": "Vehicle is available for the specified time period"}
                 )
             else:
-                if conflict_type == 'vehicle_status':
-                    message = f"Vehicle is not available due to its status: {vehicle.get_status_display()}"
-                elif conflict_type == 'schedule':
-                    message = (f"Vehicle is already scheduled for a regular route from "
-                              f"{conflict.route.source} to {conflict.route.destination} "
-                              f"({conflict.departure_time} to {conflict.arrival_time})")
-                elif conflict_type == 'special_reservation':
-                    message = (f"Vehicle is already reserved for a special trip from "
-                              f"{conflict.source} to {conflict.destination} "
-                              f"({conflict.departure_time} to {conflict.estimated_arrival_time})")
-                else:
-                    message = "Vehicle is not available for the specified time period"
-                    
+                message = self._conflict_message(vehicle, conflict, conflict_type)
                 return Response(
                     {"available": False, "message": message, "conflict_type": conflict_type},
                     status=status.HTTP_200_OK
@@ -152,7 +159,140 @@ class VehicleViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['post'], url_path='check-availability')
+    def check_availability_bulk(self, request):
+        """
+        Check many vehicle time windows at once.
+        Body: {"windows": [{"vehicle_id": ..., "start_time": ..., "end_time": ...}, ...]}
+        """
+        windows = request.data.get('windows')
+        if not isinstance(windows, list) or not windows:
+            return Response(
+                {"error": "windows must be a non-empty list of {vehicle_id, start_time, end_time}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_windows = getattr(settings, 'AVAILABILITY_CHECK_MAX_WINDOWS', 200)
+        if len(windows) > max_windows:
+            return Response(
+                {"error": f"A maximum of {max_windows} windows can be checked at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        parsed = []
+        for index, window in enumerate(windows):
+            try:
+                start_time = parse_datetime(window.get('start_time'))
+                end_time = parse_datetime(window.get('end_time'))
+            except (AttributeError, TypeError, ValueError):
+                start_time = end_time = None
+            if not start_time or not end_time or start_time >= end_time or not window.get('vehicle_id'):
+                return Response(
+                    {"error": f"Window {index} needs a vehicle_id and an ISO start_time before its end_time"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            parsed.append((str(window['vehicle_id']), start_time, end_time))
+        
+        try:
+            vehicles = {str(pk): vehicle for pk, vehicle in Vehicle.objects.in_bulk({v for v, _, _ in parsed}).items()}
+        except DjangoValidationError:
+            return Response({"error": "Invalid vehicle_id"}, status=status.HTTP_400_BAD_REQUEST)
+        missing = sorted({v for v, _, _ in parsed} - set(vehicles))
+        if missing:
+            return Response({"error": f"Vehicles not found: {', '.join(missing)}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = []
+        for (vehicle_id, start_time, end_time), occupancy in zip(parsed, find_conflicts(parsed)):
+            vehicle = vehicles[vehicle_id]
+            if vehicle.status in ['MAINTENANCE', 'INACTIVE']:
+                conflict, conflict_type = None, 'vehicle_status'
+            elif occupancy:
+                conflict, conflict_type = occupancy.source, occupancy.conflict_type
+            else:
+                conflict, conflict_type = None, None
+            
+            result = {
+                "vehicle_id": vehicle_id,
+                "start_time": start_time,
+                "end_time": end_time,
+                "available": conflict_type is None,
+            }
+            if conflict_type:
+                result["conflict_type"] = conflict_type
+                result["message"] = self._conflict_message(vehicle, conflict, conflict_type)
+            results.append(result)
+        
+        return Response({"results": results})
+    
     @action(detail=False, methods=['get'])
+    def timeline(self, request):
+        """
+        Busy intervals and free gaps of every vehicle for a time window.
+        Optional: vehicle_ids (comma separated) and granularity (minutes) for a busy bitmap.
+        """
+        start_time = parse_datetime(request.query_params.get('start_time') or '')
+        end_time = parse_datetime(request.query_params.get('end_time') or '')
+        if not start_time or not end_time:
+            return Response(
+                {"error": "Both start_time and end_time parameters are required in ISO format (YYYY-MM-DDThh:mm:ss)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start_time >= end_time:
+            return Response(
+                {"error": "start_time must be before end_time"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_days = getattr(settings, 'TIMELINE_MAX_DAYS', 31)
+        if end_time - start_time > timezone.timedelta(days=max_days):
+            return Response(
+                {"error": f"The window can be at most {max_days} days long"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        vehicle_ids = request.query_params.get('vehicle_ids')
+        if vehicle_ids:
+            vehicle_ids = [vehicle_id.strip() for vehicle_id in vehicle_ids.split(',') if vehicle_id.strip()]
+        
+        granularity = request.query_params.get('granularity')
+        if granularity:
+            min_granularity = getattr(settings, 'TIMELINE_MIN_GRANULARITY_MINUTES', 5)
+            try:
+                granularity = int(granularity)
+            except ValueError:
+                granularity = 0
+            if granularity < min_granularity:
+                return Response(
+                    {"error": f"granularity must be a number of minutes, at least {min_granularity}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            granularity = timezone.timedelta(minutes=granularity)
+        
+        try:
+            vehicles = fleet_timeline(start_time, end_time, vehicle_ids=vehicle_ids or None, granularity=granularity)
+        except DjangoValidationError:
+            return Response({"error": "vehicle_ids must be valid IDs"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "start_time": start_time,
+            "end_time": end_time,
+            "vehicles": vehicles
+        })
+    
+    def _conflict_message(self, vehicle, conflict, conflict_type):
+        if conflict_type == 'vehicle_status':
+            return f"Vehicle is not available due to its status: {vehicle.get_status_display()}"
+        elif conflict_type == 'schedule':
+            return (f"Vehicle is already scheduled for a regular route from "
+                    f"{conflict.route.source} to {conflict.route.destination} "
+                    f"({conflict.departure_time} to {conflict.arrival_time})")
+        elif conflict_type == 'special_reservation':
+            return (f"Vehicle is already reserved for a special trip from "
+                    f"{conflict.source} to {conflict.destination} "
+                    f"({conflict.departure_time} to {conflict.estimated_arrival_time})")
+        return "Vehicle is not available for the specified time period"
+    
+    @action(detail=False, methods=['get'], url_path='available')
     def available_vehicles(self, request):
         """
         Find all available vehicles for a specific time period
@@ -176,51 +316,40 @@ class VehicleViewSet(viewsets.ModelViewSet):
                 
             # Get optional filter parameters
             vehicle_type = request.query_params.get('vehicle_type')
+            vehicle_subtype = request.query_params.get('vehicle_subtype')
             min_capacity = request.query_params.get('min_capacity')
             
-            # Start with all vehicles
-            queryset = Vehicle.objects.filter(is_active=True)
-            
-            # Apply optional filters
-            if vehicle_type:
-                queryset = queryset.filter(vehicle_type=vehicle_type)
-                
             if min_capacity:
                 try:
                     min_capacity = int(min_capacity)
-                    queryset = queryset.filter(capacity__gte=min_capacity)
                 except ValueError:
                     return Response(
                         {"error": "min_capacity must be a valid integer"},
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
-            # Filter out vehicles with conflicting schedules
-            # Vehicles with schedules where: 
-            # 1. The start time of the schedule is before the end time of our period AND
-            # 2. The end time of the schedule is after the start time of our period
-            conflicts_with_schedules = Schedule.objects.filter(
-                Q(start_time__lt=end_time) & Q(end_time__gt=start_time),
-                is_active=True
-            ).values_list('vehicle_id', flat=True)
-            
-            # Filter out vehicles with conflicting special reservations
-            # Similar logic as schedules
-            conflicts_with_reservations = SpecialReservation.objects.filter(
-                Q(start_time__lt=end_time) & Q(end_time__gt=start_time),
-                status__in=['approved', 'pending'],
-                vehicle__isnull=False
-            ).values_list('vehicle_id', flat=True)
-            
-            # Exclude all vehicles with conflicts
-            queryset = queryset.exclude(
-                id__in=list(conflicts_with_schedules) + list(conflicts_with_reservations)
-            )
-            
-            # Serialize and return the filtered list
+            # One query: free vehicles are the ones with no overlapping occupancy (NOT EXISTS)
+            queryset = find_available_vehicles(
+                start_time, end_time,
+                vehicle_type=vehicle_type,
+                vehicle_subtype=vehicle_subtype,
+                min_capacity=min_capacity
+            ).select_related('vehicle_subtype__vehicle_type').order_by('name', 'pk')
+            
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = VehicleSerializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            
             serializer = VehicleSerializer(queryset, many=True)
             return Response(serializer.data)
             
+        except DjangoValidationError:
+            return Response(
+                {"error": "vehicle_type and vehicle_subtype must be valid IDs"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
         except (ValueError, TypeError) as e:
             return Response(
                 {"error": f"Invalid date format: {str(e)}"},
@@ -416,6 +545,44 @@ class VehicleViewSet(viewsets.ModelViewSet):
             )
 
 
+class StopViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for managing stops.
+    """
+    queryset = Stop.objects.prefetch_related('aliases')
+    serializer_class = StopSerializer
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'aliases__name']
+    ordering_fields = ['name']
+    
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve', 'autocomplete']:
+            permission_classes = [permissions.IsAuthenticated]
+        else:
+            permission_classes = [permissions.IsAdminUser]
+        return [permission() for permission in permission_classes]
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Suggest stops for a partly typed place name, most popular first"""
+        text = request.query_params.get('q', '')
+        if not text.strip():
+            return Response(
+                {"error": "q is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        limit = request.query_params.get('limit', '10')
+        if not limit.isdigit() or int(limit) < 1:
+            return Response(
+                {"error": "limit must be a positive number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(int(limit), getattr(settings, 'PLACE_AUTOCOMPLETE_MAX_RESULTS', 20))
+        
+        return Response({"results": get_place_index().suggest(text, limit)})
+
+
 class RouteViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing routes.
@@ -423,7 +590,7 @@ class RouteViewSet(viewsets.ModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['source', 'destination']
+    filterset_fields = ['source', 'destination', 'origin_stop', 'destination_stop']
     search_fields = ['name', 'source', 'destination']
     ordering_fields = ['name', 'distance_km', 'estimated_duration_minutes']
     
@@ -447,35 +614,195 @@ class ScheduleViewSet(viewsets.ModelViewSet):
     ordering_fields = ['departure_time', 'arrival_time', 'base_price']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'search', 'connections']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
     
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError as e:
+            if not is_overlap_error(e):
+                raise
+            return Response(
+                {"error": "This vehicle is already in use during the requested time period"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except IntegrityError as e:
+            if not is_overlap_error(e):
+                raise
+            return Response(
+                {"error": "This vehicle is already in use during the requested time period"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
     @action(detail=False, methods=['get'])
     def available_schedules(self, request):
-        """Get all available future schedules"""
+        """Get available future schedules, earliest first, one keyset page at a time"""
         now = timezone.now()
         schedules = Schedule.objects.filter(
             departure_time__gt=now,
             status='SCHEDULED'
-        ).order_by('departure_time')
+        ).select_related('vehicle', 'route')
         
+        # Places are resolved to stops first, schedules are then joined on the stop ids
         source = request.query_params.get('source')
         if source:
-            schedules = schedules.filter(route__source__icontains=source)
+            schedules = schedules.filter(route__origin_stop__in=matching_stops(source))
             
         destination = request.query_params.get('destination')
         if destination:
-            schedules = schedules.filter(route__destination__icontains=destination)
+            schedules = schedules.filter(route__destination_stop__in=matching_stops(destination))
         
         date = request.query_params.get('date')
         if date:
             schedules = schedules.filter(departure_time__date=date)
-            
-        serializer = self.get_serializer(schedules, many=True)
-        return Response(serializer.data)
+        
+        # Only schedules with enough free seats, read from the schedule's own counter
+        seats = request.query_params.get('seats')
+        if seats and seats.isdigit():
+            schedules = schedules.filter(available_count__gte=int(seats))
+        
+        paginator = KeysetPagination(('departure_time', 'id'))
+        try:
+            page = paginator.paginate_queryset(schedules, request, view=self)
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Search upcoming trips by origin, destination and date on the trip search index"""
+        origin = request.query_params.get('origin')
+        destination = request.query_params.get('destination')
+        if not (origin or destination):
+            return Response(
+                {"error": "origin or destination is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        date = request.query_params.get('date')
+        if date:
+            try:
+                date = timezone.datetime.strptime(date, '%Y-%m-%d').date()
+            except ValueError:
+                return Response(
+                    {"error": "date must be in YYYY-MM-DD format"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        seats = request.query_params.get('seats')
+        if seats and not seats.isdigit():
+            return Response(
+                {"error": "seats must be a positive number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            trips = search_trips(
+                origin=origin,
+                destination=destination,
+                date=date,
+                seats=int(seats) if seats else None,
+                match=request.query_params.get('match', 'prefix')
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        limit = getattr(settings, 'TRIP_SEARCH_MAX_RESULTS', 100)
+        serializer = TripSearchEntrySerializer(trips[:limit], many=True)
+        return Response({"results": serializer.data})
+    
+    @action(detail=False, methods=['get'])
+    def connections(self, request):
+        """Find itineraries from origin to destination, changing vehicles on the way if needed"""
+        origin = request.query_params.get('origin')
+        destination = request.query_params.get('destination')
+        if not origin or not destination:
+            return Response(
+                {"error": "origin and destination are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        departure_after = None
+        if request.query_params.get('departure_after'):
+            departure_after = parse_datetime(request.query_params['departure_after'])
+            if departure_after is None:
+                return Response(
+                    {"error": "departure_after must be an ISO 8601 date and time"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(departure_after):
+                departure_after = timezone.make_aware(departure_after)
+        
+        numbers = {}
+        for name in ('seats', 'min_transfer', 'max_legs', 'limit'):
+            value = request.query_params.get(name)
+            if value is not None and not value.isdigit():
+                return Response(
+                    {"error": f"{name} must be a positive number"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            numbers[name] = int(value) if value is not None else None
+        
+        max_legs = getattr(settings, 'CONNECTION_MAX_LEGS', 3)
+        if numbers['max_legs'] is not None and not 1 <= numbers['max_legs'] <= max_legs:
+            return Response(
+                {"error": f"max_legs must be between 1 and {max_legs}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        itineraries = get_connection_index().search(
+            origin,
+            destination,
+            departure_after=departure_after,
+            seats=numbers['seats'] or 1,
+            min_transfer=timezone.timedelta(minutes=numbers['min_transfer']) if numbers['min_transfer'] is not None else None,
+            max_legs=numbers['max_legs'],
+            limit=min(numbers['limit'] or 3, getattr(settings, 'CONNECTION_MAX_ITINERARIES', 10))
+        )
+        return Response({"itineraries": [describe_itinerary(legs) for legs in itineraries]})
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a schedule together with its tickets"""
+        schedule = self.get_object()
+        
+        result = cancel_schedules([schedule.pk], request.data.get('reason'))
+        if not result['schedules']:
+            return Response(
+                {"error": f"Cannot cancel schedule with status '{schedule.status}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(result)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-cancel')
+    def bulk_cancel(self, request):
+        """Cancel several schedules and all their tickets at once"""
+        schedule_ids = request.data.get('schedule_ids')
+        if not schedule_ids or not isinstance(schedule_ids, list):
+            return Response(
+                {"error": "schedule_ids must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = cancel_schedules(schedule_ids, request.data.get('reason'))
+        except DjangoValidationError:
+            return Response(
+                {"error": "schedule_ids contains an invalid schedule id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(result)
 
 
 class SeatViewSet(viewsets.ModelViewSet):
@@ -506,7 +833,7 @@ class SeatAvailabilityViewSet(viewsets.ModelViewSet):
     filterset_fields = ['schedule', 'seat', 'status']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'available_seats', 'seat_map']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAdminUser]
@@ -522,13 +849,74 @@ class SeatAvailabilityViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        inventory = get_seat_inventory()
+        if isinstance(inventory, (BitmapSeatInventory, SparseSeatInventory)):
+            # Packed or sparse inventory: available seats have no row of their own,
+            # they come from the cached seat map and are returned in the shape of
+            # a serialized SeatAvailability row, without the row's id and timestamps
+            seat_map = get_seat_map(schedule_id)
+            seat_ids = [
+                seat['seat_id'] for seat in (seat_map['seats'] if seat_map else [])
+                if seat['status'] == 'AVAILABLE'
+            ]
+            seats = {str(seat.pk): seat for seat in Seat.objects.filter(pk__in=seat_ids)}
+            return Response([
+                {
+                    'id': None,
+                    'seat_details': SeatSerializer(seats[seat_id]).data,
+                    'schedule': str(schedule_id),
+                    'seat': seat_id,
+                    'status': 'AVAILABLE',
+                    'created_at': None,
+                    'updated_at': None,
+                }
+                for seat_id in seat_ids
+                if seat_id in seats
+            ])
+        
         available_seats = SeatAvailability.objects.filter(
             schedule_id=schedule_id,
             status='AVAILABLE'
-        )
+        ).select_related('seat')
         
         serializer = self.get_serializer(available_seats, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def seat_map(self, request):
+        """
+        Get the seat map snapshot of a schedule.
+        
+        Clients pass the ``version`` they already hold and get a 304 when it is
+        still current, only the changed seats when possible, or the full seat map.
+        """
+        schedule_id = request.query_params.get('schedule_id')
+        if not schedule_id:
+            return Response(
+                {"error": "Schedule ID is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        known_version = request.query_params.get('version')
+        if known_version is not None and not known_version.isdigit():
+            return Response(
+                {"error": "Version must be a non-negative integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = sync_seat_map(schedule_id, int(known_version) if known_version is not None else None)
+        if result is None:
+            return Response(
+                {"error": "Schedule not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if result['type'] == 'not_modified':
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(result)
+        response['ETag'] = f'"{result["version"]}"'
+        return response
 
 
 class CustomerViewSet(viewsets.ModelViewSet):
@@ -659,7 +1047,7 @@ class TicketViewSet(viewsets.ModelViewSet):
     ordering_fields = ['booking_time', 'final_price']
     
     def get_permissions(self):
-        if self.action in ['create', 'my_tickets', 'cancel_ticket']:
+        if self.action in ['create', 'book_multiple', 'my_tickets', 'cancel_ticket']:
             permission_classes = [permissions.IsAuthenticated]
         elif self.action in ['list', 'retrieve', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAdminUser]
@@ -667,6 +1055,7 @@ class TicketViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
     
+    @idempotent('tickets.create')
     def create(self, request, *args, **kwargs):
         """Create a new ticket booking"""
         try:
@@ -691,107 +1080,82 @@ class TicketViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Check if there's already a ticket for this seat and schedule
-            existing_ticket = Ticket.objects.filter(
-                schedule_id=schedule_id,
-                seat_id=seat_id,
-                status__in=['RESERVED', 'CONFIRMED']  # Only active tickets
-            ).exists()
+            ticket = BookingService().reserve_seat(
+                customer, schedule_id, seat_id, offer_id=request.data.get('offer')
+            )
+            
+            # Return ticket data
+            serializer = self.get_serializer(ticket)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            
+        except BookingError as e:
+            return Response(
+                {"error": e.message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Customer.DoesNotExist:
+            return Response(
+                {"error": "Customer profile not found"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Schedule.DoesNotExist:
+            return Response(
+                {"error": "Schedule not found"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    @action(detail=False, methods=['post'], url_path='book-multiple')
+    @idempotent('tickets.book_multiple')
+    def book_multiple(self, request):
+        """
+        Book several seats on one schedule in a single all-or-nothing request.
+        
+        Expects ``schedule``, a list of ``seats`` and an optional ``offer``.
+        All requested seats are claimed together, the tickets are bulk-inserted
+        and the coupon is applied once to the whole booking.
+        """
+        try:
+            # Extract customer_id from token
+            customer_id = request.auth.payload.get('customer_id')
+            if not customer_id:
+                return Response(
+                    {"error": "Invalid authentication token"},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+                
+            customer = Customer.objects.get(id=customer_id)
+            
+            schedule_id = request.data.get('schedule')
+            seat_ids = request.data.get('seats')
             
-            if existing_ticket:
+            if not schedule_id or not seat_ids or not isinstance(seat_ids, list):
                 return Response(
-                    {"error": "This seat is already booked"},
+                    {"error": "Schedule and a list of seats are required"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Check seat availability using select_for_update to prevent race conditions
-            with transaction.atomic():
-                try:
-                    seat_availability = SeatAvailability.objects.select_for_update().get(
-                        schedule_id=schedule_id,
-                        seat_id=seat_id
-                    )
-                    
-                    if seat_availability.status != 'AVAILABLE':
-                        return Response(
-                            {"error": "This seat is not available"},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                        
-                    # Get schedule for pricing
-                    schedule = Schedule.objects.get(id=schedule_id)
-                    base_price = schedule.base_price
-                    
-                    # Check for offer/coupon
-                    offer_id = request.data.get('offer')
-                    discount_amount = 0
-                    offer = None
-                    
-                    if offer_id:
-                        try:
-                            now = timezone.now()
-                            offer = Offer.objects.select_for_update().get(
-                                id=offer_id,
-                                is_active=True,
-                                valid_from__lte=now,
-                                valid_until__gte=now,
-                                min_purchase_amount__lte=base_price
-                            )
-                            
-                            if offer.usage_limit and offer.usage_count >= offer.usage_limit:
-                                return Response(
-                                    {"error": "This coupon has reached its usage limit"},
-                                    status=status.HTTP_400_BAD_REQUEST
-                                )
-                            
-                            if offer.discount_type == 'PERCENTAGE':
-                                discount_amount = base_price * (offer.discount_value / 100)
-                                if offer.max_discount_amount and discount_amount > offer.max_discount_amount:
-                                    discount_amount = offer.max_discount_amount
-                            else:  # FIXED
-                                discount_amount = offer.discount_value
-                                if discount_amount > base_price:
-                                    discount_amount = base_price
-                            
-                            # Update offer usage count
-                            offer.usage_count += 1
-                            offer.save()
-                            
-                        except Offer.DoesNotExist:
-                            return Response(
-                                {"error": "Invalid or expired coupon"},
-                                status=status.HTTP_400_BAD_REQUEST
-                            )
-                    
-                    # Calculate final price
-                    final_price = base_price - discount_amount
-                    
-                    # Create ticket
-                    ticket = Ticket.objects.create(
-                        customer=customer,
-                        schedule=schedule,
-                        seat_id=seat_id,
-                        base_price=base_price,
-                        discount_amount=discount_amount,
-                        final_price=final_price,
-                        offer=offer,
-                        status='RESERVED'
-                    )
-                    
-                    # Update seat availability
-                    seat_availability.status = 'RESERVED'
-                    seat_availability.save()
-                    
-                except SeatAvailability.DoesNotExist:
-                    return Response(
-                        {"error": "Seat availability record not found"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
+            tickets, total_price, discount_amount = BookingService().reserve_seats(
+                customer, schedule_id, seat_ids, offer_id=request.data.get('offer')
+            )
             
-            # Return ticket data
-            serializer = self.get_serializer(ticket)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            serializer = self.get_serializer(tickets, many=True)
+            return Response({
+                "tickets": serializer.data,
+                "total_price": total_price,
+                "discount_amount": discount_amount,
+                "final_price": total_price - discount_amount
+            }, status=status.HTTP_201_CREATED)
             
+        except BookingError as e:
+            error = {"error": e.message}
+            if e.unavailable_seats:
+                error["unavailable_seats"] = e.unavailable_seats
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
         except Customer.DoesNotExist:
             return Response(
                 {"error": "Customer profile not found"},
@@ -810,7 +1174,7 @@ class TicketViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def my_tickets(self, request):
-        """Get current user's tickets"""
+        """Get current user's tickets, latest booking first, one keyset page at a time"""
         try:
             # Extract customer_id from token
             customer_id = request.auth.payload.get('customer_id')
@@ -821,21 +1185,25 @@ class TicketViewSet(viewsets.ModelViewSet):
                 )
                 
             customer = Customer.objects.get(id=customer_id)
-            tickets = Ticket.objects.filter(customer=customer).order_by('-booking_time')
+            tickets = Ticket.objects.filter(customer=customer)
             
             # Filter by status if provided
             status_param = request.query_params.get('status')
             if status_param:
                 tickets = tickets.filter(status=status_param)
-                
-            serializer = self.get_serializer(tickets, many=True)
-            return Response(serializer.data)
+            
+            paginator = KeysetPagination(('-booking_time', '-id'))
+            page = paginator.paginate_queryset(tickets, request, view=self)
+            serializer = self.get_serializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
             
         except Customer.DoesNotExist:
             return Response(
                 {"error": "Customer profile not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=True, methods=['post'])
     def cancel_ticket(self, request, pk=None):
@@ -859,31 +1227,114 @@ class TicketViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Check if the ticket can be cancelled
-            if ticket.status != 'RESERVED' and ticket.status != 'CONFIRMED':
+            BookingService().cancel_ticket(ticket, request.data.get('reason', 'Cancelled by user'))
+            
+            serializer = self.get_serializer(ticket)
+            return Response(serializer.data)
+            
+        except BookingError as e:
+            return Response(
+                {"error": e.message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Customer.DoesNotExist:
+            return Response(
+                {"error": "Customer profile not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+
+class WaitlistEntryViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for waitlists of sold-out schedules.
+    Customers are given a RESERVED ticket automatically when a seat frees up.
+    """
+    queryset = WaitlistEntry.objects.all()
+    serializer_class = WaitlistEntrySerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'schedule', 'customer']
+    ordering_fields = ['priority', 'created_at']
+    
+    def get_permissions(self):
+        if self.action in ['create', 'my_waitlist', 'leave']:
+            permission_classes = [permissions.IsAuthenticated]
+        else:
+            permission_classes = [permissions.IsAdminUser]
+        return [permission() for permission in permission_classes]
+    
+    def create(self, request, *args, **kwargs):
+        """Join the waitlist of a sold-out schedule"""
+        try:
+            customer_id = request.auth.payload.get('customer_id')
+            if not customer_id:
+                return Response(
+                    {"error": "Invalid authentication token"},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            
+            customer = Customer.objects.get(id=customer_id)
+            schedule = Schedule.objects.get(id=request.data.get('schedule'))
+            
+            if schedule.status != 'SCHEDULED' or schedule.departure_time <= timezone.now():
                 return Response(
-                    {"error": f"Cannot cancel ticket with status '{ticket.status}'"},
+                    {"error": "This schedule is not open for booking"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Update ticket status
-            ticket.status = 'CANCELLED'
-            ticket.cancellation_time = timezone.now()
-            ticket.cancellation_reason = request.data.get('reason', 'Cancelled by user')
-            ticket.save()
+            if schedule.available_count > 0:
+                return Response(
+                    {"error": "Seats are still available for this schedule"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Update seat availability
-            try:
-                seat_availability = SeatAvailability.objects.get(
-                    schedule=ticket.schedule,
-                    seat=ticket.seat
+            if WaitlistEntry.objects.filter(schedule=schedule, customer=customer, status='WAITING').exists():
+                return Response(
+                    {"error": "You are already on the waitlist for this schedule"},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                seat_availability.status = 'AVAILABLE'
-                seat_availability.save()
-            except SeatAvailability.DoesNotExist:
-                pass
             
-            serializer = self.get_serializer(ticket)
+            # Only staff can move customers ahead in the queue
+            priority = request.data.get('priority', 0) if request.user.is_staff else 0
+            
+            entry = WaitlistEntry.objects.create(
+                schedule=schedule,
+                customer=customer,
+                priority=priority
+            )
+            
+            serializer = self.get_serializer(entry)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            
+        except Customer.DoesNotExist:
+            return Response(
+                {"error": "Customer profile not found"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except (Schedule.DoesNotExist, ValueError, DjangoValidationError):
+            return Response(
+                {"error": "Schedule not found"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    @action(detail=False, methods=['get'])
+    def my_waitlist(self, request):
+        """Get the current user's waitlist entries"""
+        try:
+            customer_id = request.auth.payload.get('customer_id')
+            if not customer_id:
+                return Response(
+                    {"error": "Invalid authentication token"},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            
+            customer = Customer.objects.get(id=customer_id)
+            entries = WaitlistEntry.objects.filter(customer=customer).order_by('-created_at')
+            
+            status_param = request.query_params.get('status')
+            if status_param:
+                entries = entries.filter(status=status_param)
+            
+            serializer = self.get_serializer(entries, many=True)
             return Response(serializer.data)
             
         except Customer.DoesNotExist:
@@ -891,6 +1342,36 @@ class TicketViewSet(viewsets.ModelViewSet):
                 {"error": "Customer profile not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+    
+    @action(detail=True, methods=['post'])
+    def leave(self, request, pk=None):
+        """Leave a waitlist"""
+        try:
+            entry = WaitlistEntry.objects.get(pk=pk)
+        except (WaitlistEntry.DoesNotExist, DjangoValidationError):
+            return Response(
+                {"error": "Waitlist entry not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        customer_id = request.auth.payload.get('customer_id')
+        if str(entry.customer_id) != str(customer_id) and not request.user.is_staff:
+            return Response(
+                {"error": "You don't have permission to change this waitlist entry"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if entry.status != 'WAITING':
+            return Response(
+                {"error": f"Cannot leave a waitlist entry with status '{entry.status}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        entry.status = 'CANCELLED'
+        entry.save(update_fields=['status', 'updated_at'])
+        
+        serializer = self.get_serializer(entry)
+        return Response(serializer.data)
 
 
 class SpecialReservationViewSet(viewsets.ModelViewSet):
@@ -934,12 +1415,26 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
             departure_time = request.data.get('departure_time')
             distance_km = request.data.get('distance_km')
             
-            if not all([vehicle_id, source, destination, departure_time, distance_km]):
+            passenger_count = request.data.get('passenger_count')
+            
+            # Without a vehicle, one is assigned from the passenger count
+            if not all([vehicle_id or passenger_count, source, destination, departure_time, distance_km]):
                 return Response(
-                    {"error": "Vehicle, source, destination, departure time, and distance are required"},
+                    {"error": "Vehicle or passenger count, source, destination, departure time, and distance are required"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+            if passenger_count:
+                try:
+                    passenger_count = int(passenger_count)
+                    if passenger_count < 1:
+                        raise ValueError
+                except (TypeError, ValueError):
+                    return Response(
+                        {"error": "Passenger count must be a positive number"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            
             # Check if the vehicle is already assigned to another special reservation for the requested time
             with transaction.atomic():
                 # Parse the departure time
@@ -966,47 +1461,33 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
                 duration_minutes = int(duration_hours * 60)
                 est_arrival_time = dept_time + timezone.timedelta(minutes=duration_minutes)
                 
-                # Check vehicle status and availability
-                vehicle = Vehicle.objects.select_for_update().get(id=vehicle_id)
-                
-                # Check if vehicle is available (not in maintenance or inactive)
-                if vehicle.status not in ['ACTIVE', 'RESERVED']:
-                    return Response(
-                        {"error": f"Vehicle is not available. Current status: {vehicle.get_status_display()}"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                # Check for overlapping special reservations
-                overlapping_reservations = SpecialReservation.objects.filter(
-                    vehicle_id=vehicle_id,
-                    status__in=['REQUESTED', 'APPROVED'],
-                    # Check if requested time overlaps with existing reservations
-                    # Either: 1) New departure is during existing reservation
-                    #        2) New arrival is during existing reservation
-                    #        3) New reservation completely encompasses existing one
-                    departure_time__lte=est_arrival_time,
-                    estimated_arrival_time__gte=dept_time
-                ).exists()
-                
-                if overlapping_reservations:
-                    return Response(
-                        {"error": "This vehicle is already reserved for the requested time period"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                # Check for regular schedules during the requested time
-                overlapping_schedules = Schedule.objects.filter(
-                    vehicle_id=vehicle_id,
-                    status__in=['SCHEDULED', 'IN_PROGRESS'],
-                    departure_time__lte=est_arrival_time,
-                    arrival_time__gte=dept_time
-                ).exists()
-                
-                if overlapping_schedules:
-                    return Response(
-                        {"error": "This vehicle has regular schedules during the requested time period"},
-                        status=status.HTTP_400_BAD_REQUEST
+                if vehicle_id:
+                    # Check vehicle status, the vehicle is not locked: overlapping
+                    # reservations are refused by the occupancy constraint
+                    vehicle = Vehicle.objects.get(id=vehicle_id)
+                    
+                    # Check if vehicle is available (not in maintenance or inactive)
+                    if vehicle.status not in ['ACTIVE', 'RESERVED']:
+                        return Response(
+                            {"error": f"Vehicle is not available. Current status: {vehicle.get_status_display()}"},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    
+                    # Report known conflicts up front with one query on the occupancy index
+                    if find_conflict(vehicle, dept_time, est_arrival_time):
+                        return self._vehicle_conflict_response(vehicle, dept_time, est_arrival_time)
+                    candidates = [vehicle]
+                else:
+                    # Free vehicles seating the group, best fit first
+                    candidates = rank_vehicles(
+                        dept_time, est_arrival_time, passenger_count,
+                        vehicle_subtype=request.data.get('vehicle_subtype')
                     )
+                    if not candidates:
+                        return Response(
+                            {"error": "No vehicle is available for this many passengers during the requested time period"},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
                 
                 # Base pricing logic
                 base_price = distance_km * 5  # $5 per km
@@ -1031,25 +1512,50 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
                 # Calculate final price
                 final_price = base_price + distance_surcharge + time_surcharge + demand_surcharge
                 
-                # Create special reservation
-                reservation = SpecialReservation.objects.create(
-                    customer=customer,
-                    vehicle=vehicle,
-                    source=source,
-                    destination=destination,
-                    distance_km=distance_km,
-                    departure_time=dept_time,
-                    estimated_arrival_time=est_arrival_time,
-                    base_price=base_price,
-                    distance_surcharge=distance_surcharge,
-                    time_surcharge=time_surcharge,
-                    demand_surcharge=demand_surcharge,
-                    final_price=final_price,
-                    status='REQUESTED'
-                )
+                # Create special reservation, on the next ranked vehicle if
+                # another booking takes one after the checks above
+                reservation = None
+                for vehicle in candidates:
+                    try:
+                        reservation = SpecialReservation.objects.create(
+                            customer=customer,
+                            vehicle=vehicle,
+                            source=source,
+                            destination=destination,
+                            distance_km=distance_km,
+                            departure_time=dept_time,
+                            estimated_arrival_time=est_arrival_time,
+                            passenger_count=passenger_count or 1,
+                            base_price=base_price,
+                            distance_surcharge=distance_surcharge,
+                            time_surcharge=time_surcharge,
+                            demand_surcharge=demand_surcharge,
+                            final_price=final_price,
+                            status='REQUESTED'
+                        )
+                        break
+                    except IntegrityError as e:
+                        if not is_overlap_error(e):
+                            raise
+                
+                if reservation is None:
+                    if vehicle_id:
+                        return self._vehicle_conflict_response(vehicle, dept_time, est_arrival_time)
+                    return Response(
+                        {"error": "No vehicle is available for this many passengers during the requested time period"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
             
             serializer = self.get_serializer(reservation)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            data = serializer.data
+            if not vehicle_id:
+                # The other vehicles that fit, best first
+                limit = getattr(settings, 'VEHICLE_ASSIGNMENT_ALTERNATIVES', 3)
+                data['alternatives'] = [
+                    describe_vehicle(candidate) for candidate in candidates
+                    if candidate.pk != reservation.vehicle_id
+                ][:limit]
+            return Response(data, status=status.HTTP_201_CREATED)
             
         except Vehicle.DoesNotExist:
             return Response(
@@ -1067,9 +1573,28 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except IntegrityError as e:
+            if not is_overlap_error(e):
+                raise
+            return Response(
+                {"error": "This vehicle is already in use during the requested time period"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def _vehicle_conflict_response(self, vehicle, start_time, end_time):
+        conflict = find_conflict(vehicle, start_time, end_time)
+        if conflict and conflict.conflict_type == 'schedule':
+            message = "This vehicle has regular schedules during the requested time period"
+        else:
+            message = "This vehicle is already reserved for the requested time period"
+        return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def my_reservations(self, request):
-        """Get current user's special reservations"""
+        """Get current user's special reservations, latest first, one keyset page at a time"""
         try:
             # Extract customer_id from token
             customer_id = request.auth.payload.get('customer_id')
@@ -1080,21 +1605,25 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
                 )
                 
             customer = Customer.objects.get(id=customer_id)
-            reservations = SpecialReservation.objects.filter(customer=customer).order_by('-created_at')
+            reservations = SpecialReservation.objects.filter(customer=customer)
             
             # Filter by status if provided
             status_param = request.query_params.get('status')
             if status_param:
                 reservations = reservations.filter(status=status_param)
-                
-            serializer = self.get_serializer(reservations, many=True)
-            return Response(serializer.data)
+            
+            paginator = KeysetPagination(('-created_at', '-id'))
+            page = paginator.paginate_queryset(reservations, request, view=self)
+            serializer = self.get_serializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
             
         except Customer.DoesNotExist:
             return Response(
                 {"error": "Customer profile not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=True, methods=['post'])
     def approve_reservation(self, request, pk=None):
@@ -1131,6 +1660,7 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
+    @idempotent('special_reservations.make_payment')
     def make_payment(self, request, pk=None):
         """
         Record a payment for a special reservation
@@ -1138,55 +1668,46 @@ class SpecialReservationViewSet(viewsets.ModelViewSet):
         special_reservation = self.get_object()
         
         # Verify this is the customer's own reservation
-        if request.user.is_staff or getattr(request.auth.payload.get('customer_id'), None) == str(special_reservation.customer.id):
-            try:
-                amount = float(request.data.get('amount', 0))
-                if amount <= 0:
-                    return Response(
-                        {"error": "Payment amount must be greater than zero"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                # Record the payment
-                special_reservation.deposit_amount += amount
-                special_reservation.deposit_paid_date = timezone.now()
-                
-                # Update balance and payment status
-                special_reservation.balance_amount = max(0, special_reservation.final_price - special_reservation.deposit_amount)
-                special_reservation.is_fully_paid = special_reservation.balance_amount <= 0
-                
-                special_reservation.save()
-                
-                return Response({
-                    "message": f"Payment of {amount} recorded successfully",
-                    "deposit_amount": special_reservation.deposit_amount,
-                    "balance_amount": special_reservation.balance_amount,
-                    "is_fully_paid": special_reservation.is_fully_paid
-                })
-                
-            except ValueError as e:
-                return Response(
-                    {"error": f"Invalid payment amount: {str(e)}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            except (TypeError, AttributeError) as e:
-                return Response(
-                    {"error": f"Parameter error: {str(e)}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Unexpected error in make_payment: {str(e)}")
-                return Response(
-                    {"error": "An unexpected error occurred while processing payment"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-        else:
+        customer_id = request.auth.payload.get('customer_id') if request.auth else None
+        if not (request.user.is_staff or str(customer_id) == str(special_reservation.customer_id)):
             return Response(
                 {"error": "You do not have permission to make a payment for this reservation"},
                 status=status.HTTP_403_FORBIDDEN
             )
+        
+        try:
+            amount = Decimal(str(request.data.get('amount', 0)))
+        except InvalidOperation:
+            return Response(
+                {"error": "Invalid payment amount"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not amount.is_finite() or amount <= 0:
+            return Response(
+                {"error": "Payment amount must be greater than zero"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Applied in one UPDATE, a concurrent payment is never overwritten by a stale copy
+        paid = F('deposit_amount') + amount
+        SpecialReservation.objects.filter(pk=special_reservation.pk).update(
+            deposit_amount=paid,
+            deposit_paid_date=timezone.now(),
+            balance_amount=Greatest(F('final_price') - paid, Value(Decimal('0')), output_field=DecimalField()),
+            is_fully_paid=Case(
+                When(final_price__lte=paid, then=Value(True)), default=Value(False), output_field=BooleanField()
+            )
+        )
+        special_reservation.refresh_from_db(
+            fields=['deposit_amount', 'deposit_paid_date', 'balance_amount', 'is_fully_paid']
+        )
+        
+        return Response({
+            "message": f"Payment of {amount} recorded successfully",
+            "deposit_amount": special_reservation.deposit_amount,
+            "balance_amount": special_reservation.balance_amount,
+            "is_fully_paid": special_reservation.is_fully_paid
+        })
     
     @action(detail=True, methods=['post'])
     def mark_completed(self, request, pk=None):
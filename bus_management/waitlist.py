@@ -0,0 +1,103 @@
+"""
+Waitlist for sold-out schedules.
+
+Customers join the waitlist of a schedule instead of polling for free seats.
+Whenever a seat is freed (a cancelled ticket or an expired seat hold),
+``promote_waitlist`` hands it to the head of the queue as a RESERVED ticket
+in the same transaction and notifies the customer once it commits.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .booking import save_synced_ticket
+from .holds import get_hold_engine
+from .inventory import get_seat_inventory
+from .models import Schedule, Ticket, WaitlistEntry
+from .utils import broadcast_seat_status_update
+
+logger = logging.getLogger(__name__)
+
+
+def waiting_entries(schedule_id):
+    """Return the waiting entries of a schedule in the order they are served"""
+    return WaitlistEntry.objects.filter(
+        schedule_id=schedule_id,
+        status='WAITING'
+    ).order_by('-priority', 'created_at')
+
+
+def waitlist_position(entry):
+    """Return the 1-based position of a waiting entry in its queue"""
+    ahead = Q(priority__gt=entry.priority) | Q(priority=entry.priority, created_at__lt=entry.created_at)
+    return waiting_entries(entry.schedule_id).filter(ahead).count() + 1
+
+
+def promote_waitlist(schedule_id, seat_ids, hold_engine=None):
+    """
+    Give freed seats to the customers at the head of the waitlist.
+    Must be called inside the transaction that freed the seats, so a seat is
+    never visible as available in between.
+
+    Returns the list of seat ids that were handed to waiting customers.
+    """
+    promoted = []
+    if not seat_ids or not waiting_entries(schedule_id).exists():
+        return promoted
+
+    schedule = Schedule.objects.get(pk=schedule_id)
+    inventory = get_seat_inventory()
+    hold_engine = hold_engine or get_hold_engine()
+
+    with transaction.atomic():
+        for seat_id in seat_ids:
+            entry = waiting_entries(schedule_id).select_for_update(skip_locked=True).select_related('customer').first()
+            if entry is None:
+                break
+
+            if not inventory.claim(schedule_id, seat_id):
+                continue
+
+            # The seat is already marked RESERVED by the claim
+            ticket = save_synced_ticket(Ticket(
+                customer=entry.customer,
+                schedule=schedule,
+                seat_id=seat_id,
+                base_price=schedule.base_price,
+                final_price=schedule.base_price,
+                status='RESERVED',
+                hold_expires_at=hold_engine.expires_at()
+            ))
+
+            entry.status = 'PROMOTED'
+            entry.ticket = ticket
+            entry.promoted_at = timezone.now()
+            entry.save(update_fields=['status', 'ticket', 'promoted_at', 'updated_at'])
+
+            promoted.append(str(seat_id))
+            transaction.on_commit(lambda ticket=ticket: _announce_promotion(ticket, hold_engine))
+
+    return promoted
+
+
+def _announce_promotion(ticket, hold_engine):
+    """Track the new seat hold, broadcast the seat and notify the customer"""
+    hold_engine.hold([ticket])
+    broadcast_seat_status_update(str(ticket.schedule_id), str(ticket.seat_id), 'RESERVED')
+
+    try:
+        from notifications.services import send_notification
+
+        send_notification(
+            ticket.customer,
+            'waitlist_promoted',
+            'A seat is reserved for you',
+            f"Seat {ticket.seat.seat_number} on {ticket.schedule} is now reserved for you. "
+            f"Complete your booking before {ticket.hold_expires_at:%Y-%m-%d %H:%M} to keep it."
+            if ticket.hold_expires_at else
+            f"Seat {ticket.seat.seat_number} on {ticket.schedule} is now reserved for you."
+        )
+    except Exception as e:
+        logger.error(f"Error notifying customer about waitlist promotion for ticket {ticket.id}: {e}")
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_remove_notification_notificatio_recipie_4e3567_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('reservation_created', 'Reservation Created'), ('reservation_approved', 'Reservation Approved'), ('reservation_rejected', 'Reservation Rejected'), ('payment_received', 'Payment Received'), ('reservation_completed', 'Reservation Completed'), ('waitlist_promoted', 'Waitlist Promoted'), ('schedule_conflict', 'Schedule Conflict'), ('vehicle_maintenance', 'Vehicle Maintenance'), ('system', 'System Message')], max_length=50),
+        ),
+    ]
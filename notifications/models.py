@@ -15,6 +15,8 @@ class Notification(models.Model):
         ('reservation_rejected', 'Reservation Rejected'),
         ('payment_received', 'Payment Received'),
         ('reservation_completed', 'Reservation Completed'),
+        ('waitlist_promoted', 'Waitlist Promoted'),
+        ('schedule_cancelled', 'Schedule Cancelled'),
         ('schedule_conflict', 'Schedule Conflict'),
         ('vehicle_maintenance', 'Vehicle Maintenance'),
         ('system', 'System Message'),
@@ -43,15 +43,7 @@ def send_notification(recipient, notification_type, title, message, related_obj=
             prefs = NotificationPreference.objects.get(customer_id=recipient_id)
             
         # Check if the recipient wants this type of notification
-        if notification_type.startswith('reservation_') and not prefs.reservation_notifications:
-            return None
-        elif notification_type.startswith('payment_') and not prefs.payment_notifications:
-            return None
-        elif notification_type == 'system' and not prefs.system_notifications:
-            return None
-            
-        # Check if in-app notifications are enabled
-        if not prefs.in_app_notifications:
+        if not _wants_notification(prefs, notification_type):
             return None
     except NotificationPreference.DoesNotExist:
         # If no preferences exist, proceed with default values (all enabled)
@@ -99,15 +91,86 @@ def send_bulk_notifications(recipients, notification_type, title, message, relat
     Returns:
         List of created Notification objects
     """
+    return send_notification_batch(
+        notification_type,
+        [(recipient, title, message) for recipient in recipients],
+        related_obj
+    )
+
+def send_notification_batch(notification_type, messages, related_obj=None):
+    """
+    Send notifications of one type to many recipients at once.
+    Preferences are read with one query per recipient type and the notifications
+    are inserted with a single bulk insert before being pushed over WebSocket.
+    
+    Args:
+        notification_type: The type of notification
+        messages: List of (recipient, title, message) tuples, recipients are User or Customer objects
+        related_obj: The related object (optional)
+    
+    Returns:
+        List of created Notification objects
+    """
+    user_ids = [recipient.id for recipient, _, _ in messages if isinstance(recipient, User)]
+    customer_ids = [recipient.id for recipient, _, _ in messages if isinstance(recipient, Customer)]
+    
+    # Recipients without preferences get every notification
+    user_prefs = {
+        prefs.user_id: prefs for prefs in NotificationPreference.objects.filter(user_id__in=user_ids)
+    } if user_ids else {}
+    customer_prefs = {
+        prefs.customer_id: prefs for prefs in NotificationPreference.objects.filter(customer_id__in=customer_ids)
+    } if customer_ids else {}
+    
+    content_type = ContentType.objects.get_for_model(related_obj) if related_obj else None
+    
     notifications = []
+    for recipient, title, message in messages:
+        if isinstance(recipient, User):
+            prefs = user_prefs.get(recipient.id)
+        elif isinstance(recipient, Customer):
+            prefs = customer_prefs.get(recipient.id)
+        else:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Invalid recipient type for notification: {type(recipient)}")
+            continue
+        
+        if prefs is not None and not _wants_notification(prefs, notification_type):
+            continue
+        
+        notification = Notification(
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            content_type=content_type,
+            object_id=related_obj.id if related_obj else None
+        )
+        if isinstance(recipient, User):
+            notification.user = recipient
+        else:
+            notification.customer = recipient
+        notifications.append(notification)
+    
+    Notification.objects.bulk_create(notifications)
     
-    for recipient in recipients:
-        notification = send_notification(recipient, notification_type, title, message, related_obj)
-        if notification:
-            notifications.append(notification)
+    for notification in notifications:
+        _send_ws_notification(notification)
     
     return notifications
 
+def _wants_notification(prefs, notification_type):
+    """Whether the recipient's preferences allow an in-app notification of this type"""
+    if notification_type.startswith('reservation_') and not prefs.reservation_notifications:
+        return False
+    elif notification_type.startswith('payment_') and not prefs.payment_notifications:
+        return False
+    elif notification_type == 'system' and not prefs.system_notifications:
+        return False
+    
+    # Check if in-app notifications are enabled
+    return prefs.in_app_notifications
+
 def _send_ws_notification(notification):
     """
     Send a notification to a recipient via WebSocket